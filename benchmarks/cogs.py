@@ -0,0 +1,413 @@
+"""
+Replays chat against the cogs with in-memory stand-ins for Discord and reports
+throughput, p50/p99 latency and peak RSS per scenario.
+
+Run with `python -m benchmarks.cogs`. Pass `--corpus` to replay recorded chat
+instead of synthetic messages, and `--compare` with a previous results file to
+see what changed.
+"""
+import argparse
+import atexit
+import json
+import os
+import random
+import tempfile
+from typing import Any, List, Tuple
+
+from benchmarks import harness
+from benchmarks.fakes import FakeBot, FakeChannel, FakeContext, FakeGuild, \
+    FakeUser
+from benchmarks.harness import Scenario
+from benchmarks.matchers import make_corpus, random_word
+
+RESULTS_DIRECTORY = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def load_corpus(args: argparse.Namespace) -> List[Tuple[str, str]]:
+    """
+    Reads or generates `args.messages` messages as pairs of author names and
+    contents.
+
+    A recorded corpus is either a JSON Lines file of objects with `content`
+    and optionally `author`, or a text file with one message per line. It is
+    repeated as needed.
+    """
+    rng = random.Random(args.seed)
+    authors = [f'user{i}' for i in range(args.authors)]
+
+    if args.corpus is None:
+        vocabulary = list({random_word(rng) for _ in range(5000)})
+        blacklist = get_blacklist(args)
+        contents = make_corpus(
+            rng,
+            vocabulary,
+            list(blacklist),
+            args.messages,
+            args.hit_rate
+        )
+        return [(rng.choice(authors), content) for content in contents]
+
+    with open(args.corpus, encoding='utf-8') as file:
+        lines = [line.rstrip('\n') for line in file if line.strip()]
+
+    if args.corpus.endswith('.jsonl'):
+        records = [json.loads(line) for line in lines]
+        corpus = [
+            (r.get('author') or rng.choice(authors), r['content'])
+            for r in records
+        ]
+    else:
+        corpus = [(rng.choice(authors), line) for line in lines]
+
+    return [corpus[i % len(corpus)] for i in range(args.messages)]
+
+
+def get_blacklist(args: argparse.Namespace) -> dict:
+    """Generates the Word Police words and their suggestions."""
+    rng = random.Random(args.seed + 1)
+    words = {random_word(rng) for _ in range(args.words)}
+    return {word: [random_word(rng) for _ in range(4)] for word in words}
+
+
+def configure(sections: dict):
+    """
+    Points the shared configuration at a temporary file with `sections`.
+
+    Must be called before anything reads the configuration.
+    """
+    from brotherchris.config import configuration
+
+    file = tempfile.NamedTemporaryFile(
+        'w',
+        suffix='.json',
+        delete=False
+    )
+    with file:
+        json.dump({'Bot': {'prefixes': ['!']}, **sections}, file)
+
+    configuration.path = file.name
+    atexit.register(os.remove, file.name)
+
+
+def make_bot(args: argparse.Namespace) -> FakeBot:
+    from brotherchris.router import MessageRouter
+
+    bot = FakeBot(args.latency / 1000)
+    bot.router = MessageRouter(bot)
+    return bot
+
+
+def fill(
+    channel: FakeChannel,
+    corpus: List[Tuple[str, str]]
+) -> List[FakeUser]:
+    """Adds the corpus to the history of `channel` and returns its authors."""
+    users = {}
+    for author, content in corpus:
+        if author not in users:
+            users[author] = FakeUser(author)
+
+        channel.add(users[author], content)
+
+    return list(users.values())
+
+
+async def word_police(args: argparse.Namespace) -> Scenario:
+    """Scans every message for blacklisted words."""
+    guild = FakeGuild('Guild')
+    channel = FakeChannel(guild, 'general', args.latency / 1000)
+
+    configure({'WordPolice': {
+        'server_ids': [guild.id],
+        'thumbnail': '',
+        'words': get_blacklist(args),
+        'matcher': args.matcher
+    }})
+    from brotherchris.cogs.word_police import WordPolice
+
+    fill(channel, load_corpus(args))
+    cog = WordPolice(make_bot(args))
+
+    return Scenario(channel.messages, cog.on_message, cog.cog_unload)
+
+
+async def welcome(args: argparse.Namespace) -> Scenario:
+    """Looks for Dyno's welcome messages among ordinary chat."""
+    guild = FakeGuild('Guild')
+    channel = FakeChannel(guild, 'welcome', args.latency / 1000)
+    dyno = FakeUser('Dyno', bot=True)
+    dyno_msg = 'joined the server! Give them a welcome!'
+
+    configure({'Welcome': {
+        'dyno_id': dyno.id,
+        'channels': [channel.id],
+        'dyno_msg': dyno_msg
+    }})
+    from brotherchris.cogs.welcome import Welcome
+
+    users = fill(channel, load_corpus(args))
+
+    # One in 20 messages is a welcome.
+    for msg in channel.messages[::20]:
+        msg.author = dyno
+        msg.mentions = [users[0]]
+        msg.content = f'{users[0].mention} {dyno_msg}'
+
+    cog = Welcome(make_bot(args))
+    return Scenario(channel.messages, cog.on_message, cog.cog_unload)
+
+
+async def router(args: argparse.Namespace) -> Scenario:
+    """
+    Routes messages from many guilds, only one of which Word Police and
+    Welcome are configured for.
+    """
+    guilds = [FakeGuild(f'Guild {i}') for i in range(args.guilds)]
+    channels = [
+        FakeChannel(guild, 'general', args.latency / 1000) for guild in guilds
+    ]
+
+    configure({
+        'WordPolice': {
+            'server_ids': [guilds[0].id],
+            'thumbnail': '',
+            'words': get_blacklist(args),
+            'matcher': args.matcher
+        },
+        'Welcome': {
+            'dyno_id': 0,
+            'channels': [channels[0].id],
+            'dyno_msg': 'joined the server! Give them a welcome!'
+        }
+    })
+    from brotherchris.cogs.welcome import Welcome
+    from brotherchris.cogs.word_police import WordPolice
+
+    rng = random.Random(args.seed)
+    users = {}
+    msgs = []
+    for author, content in load_corpus(args):
+        if author not in users:
+            users[author] = FakeUser(author)
+
+        msgs.append(rng.choice(channels).add(users[author], content))
+
+    bot = make_bot(args)
+    cogs = [WordPolice(bot), Welcome(bot)]
+
+    def cleanup():
+        for cog in cogs:
+            cog.cog_unload()
+
+    return Scenario(msgs, bot.router.dispatch, cleanup)
+
+
+async def react(args: argparse.Namespace) -> Scenario:
+    """Runs react over the channel history, `args.limit` messages at a time."""
+    guild = FakeGuild('Guild')
+    channel = FakeChannel(guild, 'general', args.latency / 1000)
+
+    configure({'Commands': {
+        'react_concurrency': args.concurrency,
+        # Only the fake API's latency should limit the rate.
+        'react_rate': 1e9
+    }})
+    from brotherchris.cogs.commands import Commands
+
+    users = fill(channel, load_corpus(args))
+    bot = make_bot(args)
+    cog = Commands(bot)
+
+    async def handle(user: FakeUser):
+        ctx = FakeContext(bot, channel, user)
+        await cog.react.callback(cog, ctx, '\N{THUMBS UP SIGN}', args.limit)
+
+    events = [users[i % len(users)] for i in range(args.calls)]
+    return Scenario(events, handle, cog.cog_unload)
+
+
+async def permissions(args: argparse.Namespace) -> Scenario:
+    """Lists and formats random permissions, as perms does."""
+    import discord
+    from brotherchris.cogs.permissions import Permissions
+    from brotherchris.permission_analysis import ALL, Category
+
+    rng = random.Random(args.seed)
+
+    async def handle(value: int):
+        perms = Permissions.get_list(discord.Permissions(value))
+        width = Permissions.get_max_width(perms, 4)
+        for category in Category:
+            Permissions.get_string(perms, category, width)
+
+    events = [rng.getrandbits(64) & ALL for _ in range(args.messages)]
+    return Scenario(events, handle)
+
+
+async def perms_audit(args: argparse.Namespace) -> Scenario:
+    """Audits a synthetic guild with `args.members` members."""
+    from brotherchris.permission_analysis import ALL, GuildSnapshot, \
+        Overwrites, find_anomalies
+
+    rng = random.Random(args.seed)
+    member_ids = list(range(1, args.members + 1))
+    role_ids = list(range(10 ** 6, 10 ** 6 + 50))
+
+    def overwrite() -> Tuple[int, int]:
+        allow = rng.getrandbits(64) & ALL & rng.getrandbits(64)
+        deny = rng.getrandbits(64) & ALL & ~allow & rng.getrandbits(64)
+        return allow, deny
+
+    snapshot = GuildSnapshot(
+        member_ids,
+        member_ids[0],
+        role_ids,
+        [rng.getrandbits(64) & ALL & rng.getrandbits(64) for _ in role_ids],
+        [
+            (row, column)
+            for row in range(len(member_ids))
+            for column in rng.sample(range(len(role_ids)), 3)
+        ],
+        [
+            Overwrites(
+                channel_id,
+                overwrite(),
+                [(r, *overwrite()) for r in rng.sample(role_ids, 5)],
+                [(m, *overwrite()) for m in rng.sample(member_ids, 5)]
+            )
+            for channel_id in range(100)
+        ]
+    )
+
+    async def handle(_: Any):
+        find_anomalies(snapshot)
+
+    return Scenario([None] * args.calls, handle)
+
+
+async def wc_frequencies(args: argparse.Namespace) -> Scenario:
+    """Counts a user's words by paging through the channel history."""
+    guild = FakeGuild('Guild')
+    channel = FakeChannel(guild, 'general', args.latency / 1000)
+
+    configure({})
+    from brotherchris.cogs.word_cloud import WordCloud
+
+    users = fill(channel, load_corpus(args))
+    cog = WordCloud(make_bot(args))
+
+    async def handle(user: FakeUser):
+        await cog.get_frequencies(channel, user, args.limit)
+
+    events = [users[i % len(users)] for i in range(args.calls)]
+    return Scenario(events, handle, cog.cog_unload)
+
+
+async def wc_render(args: argparse.Namespace) -> Scenario:
+    """Renders word clouds of the whole corpus in the worker processes."""
+    from brotherchris import tokens
+
+    guild = FakeGuild('Guild')
+    channel = FakeChannel(guild, 'general', args.latency / 1000)
+
+    configure({'WordCloud': {'queue_size': max(args.calls, 8)}})
+    from brotherchris.cogs.word_cloud import WordCloud
+
+    frequencies = tokens.fold(
+        tokens.count(content for _, content in load_corpus(args))
+    )
+    bot = make_bot(args)
+    cog = WordCloud(bot)
+    ctx = FakeContext(bot, channel, FakeUser('user'))
+
+    async def handle(_: Any):
+        await cog.generate_image(ctx, frequencies, None)
+
+    return Scenario([None] * args.calls, handle, cog.cog_unload)
+
+
+SCENARIOS = {
+    'word_police': word_police,
+    'welcome': welcome,
+    'router': router,
+    'react': react,
+    'permissions': permissions,
+    'perms_audit': perms_audit,
+    'wc_frequencies': wc_frequencies,
+    'wc_render': wc_render
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument(
+        'scenarios',
+        nargs='*',
+        help=f'scenarios to run, out of {", ".join(SCENARIOS)}; all of them '
+             f'by default'
+    )
+    parser.add_argument('--corpus', help='a recorded corpus to replay')
+    parser.add_argument(
+        '--messages',
+        type=int,
+        default=10000,
+        help='number of messages to replay or keep in history'
+    )
+    parser.add_argument(
+        '--rate',
+        type=float,
+        default=0,
+        help='messages per second to replay at; 0 for as fast as possible'
+    )
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0,
+        help='milliseconds each fake API call takes'
+    )
+    parser.add_argument(
+        '--calls',
+        type=int,
+        default=20,
+        help='number of invocations of react, perms audit and wc'
+    )
+    parser.add_argument('--limit', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--authors', type=int, default=50)
+    parser.add_argument('--guilds', type=int, default=1000)
+    parser.add_argument('--members', type=int, default=5000)
+    parser.add_argument('--words', type=int, default=500)
+    parser.add_argument('--hit-rate', type=float, default=0.05)
+    parser.add_argument('--matcher', default='aho-corasick')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--output',
+        default=RESULTS_DIRECTORY,
+        help='directory in which to save the results'
+    )
+    parser.add_argument(
+        '--compare',
+        help='a previous results file to compare against'
+    )
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - SCENARIOS.keys()
+    if unknown:
+        parser.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+
+    baseline = harness.load(args.compare) if args.compare else None
+    results = []
+
+    for name in args.scenarios or SCENARIOS:
+        print(f'Running {name}...')
+        results.append(harness.run_isolated(name, SCENARIOS[name], args))
+
+    print()
+    harness.print_results(results, baseline)
+
+    path = harness.save(results, vars(args), args.output)
+    print(f'\nSaved to {path}.')
+
+
+if __name__ == '__main__':
+    main()
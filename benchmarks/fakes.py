@@ -0,0 +1,215 @@
+"""
+In-memory stand-ins for the parts of discord.py which the cogs use, so cogs
+can be driven without a connection to Discord.
+
+Only the attributes and methods the cogs actually touch are provided. API calls
+can be given an artificial latency to approximate round trips.
+"""
+import asyncio
+import bisect
+import itertools
+from typing import AsyncIterator, Dict, List, Optional
+
+# Starts from a realistic snowflake so IDs look like Discord's.
+_ids = itertools.count(175928847299117063)
+
+
+def make_id() -> int:
+    """Generates increasing IDs, like snowflakes."""
+    return next(_ids)
+
+
+class FakeObject:
+    def __init__(self, id: int = None):
+        self.id: int = make_id() if id is None else id
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, FakeObject) and other.id == self.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+
+class FakeUser(FakeObject):
+    def __init__(self, name: str, bot: bool = False, id: int = None):
+        super().__init__(id)
+        self.name: str = name
+        self.bot: bool = bot
+
+    def __str__(self) -> str:
+        return self.name
+
+    @property
+    def mention(self) -> str:
+        return f'<@{self.id}>'
+
+
+class FakeGuild(FakeObject):
+    def __init__(self, name: str, id: int = None):
+        super().__init__(id)
+        self.name: str = name
+        self.channels: List['FakeChannel'] = []
+
+
+class FakeMessage(FakeObject):
+    def __init__(
+        self,
+        channel: 'FakeChannel',
+        author: FakeUser,
+        content: str,
+        mentions: List[FakeUser] = None,
+        id: int = None
+    ):
+        super().__init__(id)
+        self.channel: FakeChannel = channel
+        self.guild: Optional[FakeGuild] = channel.guild
+        self.author: FakeUser = author
+        self.content: str = content
+        self.mentions: List[FakeUser] = mentions or []
+
+    async def delete(self):
+        await self.channel.latency()
+
+    async def edit(self, content: str = None, **kwargs):
+        await self.channel.latency()
+        if content is not None:
+            self.content = content
+
+
+class FakeChannel(FakeObject):
+    """
+    A text channel whose history is a list of messages, oldest first.
+
+    Parameters
+    ----------
+    guild: FakeGuild
+        The guild the channel belongs to.
+    name: str
+        The name of the channel.
+    latency: float
+        The number of seconds each API call takes.
+    """
+
+    def __init__(self, guild: FakeGuild, name: str, latency: float = 0):
+        super().__init__()
+        self.guild: FakeGuild = guild
+        self.name: str = name
+        self.delay: float = latency
+        self.messages: List[FakeMessage] = []
+        self.ids: List[int] = []
+        self.sent: int = 0
+        self.pages: int = 0
+
+        guild.channels.append(self)
+
+    @property
+    def mention(self) -> str:
+        return f'<#{self.id}>'
+
+    async def latency(self):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        else:
+            # Still yields to the event loop, as a real request would.
+            await asyncio.sleep(0)
+
+    def add(self, author: FakeUser, content: str) -> FakeMessage:
+        """Appends a message to the history without sending it."""
+        msg = FakeMessage(self, author, content)
+        self.messages.append(msg)
+        self.ids.append(msg.id)
+        return msg
+
+    async def send(self, content: str = None, **kwargs) -> FakeMessage:
+        await self.latency()
+        self.sent += 1
+        return FakeMessage(self, BOT_USER, content or '')
+
+    async def history(
+        self,
+        limit: int = 100,
+        before: FakeObject = None,
+        after: FakeObject = None,
+        around: FakeObject = None
+    ) -> AsyncIterator[FakeMessage]:
+        """Yields one page of history, as a single API call would return."""
+        await self.latency()
+        self.pages += 1
+
+        if around is not None:
+            index = bisect.bisect_left(self.ids, around.id)
+            half = limit // 2
+            page = self.messages[max(0, index - half):index + half][::-1]
+        else:
+            start = 0 if after is None else \
+                bisect.bisect_right(self.ids, after.id)
+            end = len(self.ids) if before is None else \
+                bisect.bisect_left(self.ids, before.id)
+
+            # Without `before`, `after` pages go oldest first.
+            if after is not None and before is None:
+                page = self.messages[start:min(end, start + limit)]
+            else:
+                page = self.messages[max(start, end - limit):end][::-1]
+
+        for msg in page:
+            yield msg
+
+
+class FakeHTTP:
+    """Records reactions instead of sending them."""
+
+    def __init__(self, latency: float = 0):
+        self.latency: float = latency
+        self.reactions: int = 0
+
+    async def add_reaction(self, channel_id: int, message_id: int, emoji: str):
+        await asyncio.sleep(self.latency)
+        self.reactions += 1
+
+
+class FakeContext:
+    """The context of a command invoked by `author` in `channel`."""
+
+    def __init__(self, bot: 'FakeBot', channel: FakeChannel, author: FakeUser):
+        self.bot: FakeBot = bot
+        self.channel: FakeChannel = channel
+        self.guild: FakeGuild = channel.guild
+        self.author: FakeUser = author
+        self.message: FakeMessage = FakeMessage(channel, author, '')
+        self.valid: bool = False
+
+    async def send(self, content: str = None, **kwargs) -> FakeMessage:
+        return await self.channel.send(content, **kwargs)
+
+
+class FakeBot:
+    """
+    A bot which is always ready and for which no message is a command unless
+    it starts with `prefix`.
+    """
+
+    def __init__(self, http_latency: float = 0, prefix: str = '!'):
+        self.loop: asyncio.AbstractEventLoop = asyncio.get_event_loop()
+        self.http: FakeHTTP = FakeHTTP(http_latency)
+        self.prefix: str = prefix
+        self.user: FakeUser = BOT_USER
+        self.guilds: List[FakeGuild] = []
+        self.cogs: Dict[str, object] = {}
+
+    async def get_context(self, msg: FakeMessage) -> FakeContext:
+        ctx = FakeContext(self, msg.channel, msg.author)
+        ctx.message = msg
+        ctx.valid = msg.content.startswith(self.prefix)
+        return ctx
+
+    @staticmethod
+    def is_ready() -> bool:
+        return True
+
+    @staticmethod
+    def is_closed() -> bool:
+        return False
+
+
+BOT_USER = FakeUser('Brother Chris', bot=True)
@@ -0,0 +1,259 @@
+"""
+Replays events against a handler and measures throughput, latency and memory.
+
+Each scenario runs in a fresh process so that its peak RSS is its own, and
+results are saved as JSON so that runs can be compared.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+Handle = Callable[[Any], Awaitable[Any]]
+
+
+class Scenario(NamedTuple):
+    """
+    The events to replay, the coroutine function which handles each of them,
+    and optionally a function to call once all events have been handled.
+    """
+    events: List[Any]
+    handle: Handle
+    cleanup: Optional[Callable[[], Any]] = None
+
+
+class Result(NamedTuple):
+    scenario: str
+    events: int
+    seconds: float
+    throughput: float
+    p50_ms: float
+    p99_ms: float
+    max_ms: float
+    peak_rss_mib: float
+    children_rss_mib: float
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Finds the `q` quantile of sorted values by the nearest-rank method."""
+    if not ordered:
+        return 0
+
+    rank = max(1, round(q * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def get_peak_rss(who: int = resource.RUSAGE_SELF) -> float:
+    """Retrieves the peak resident set size in MiB."""
+    peak = resource.getrusage(who).ru_maxrss
+
+    # Linux reports KiB but macOS reports bytes.
+    if sys.platform == 'darwin':
+        return peak / 1024 ** 2
+
+    return peak / 1024
+
+
+async def replay(
+    events: List[Any],
+    handle: Handle,
+    rate: float
+) -> List[float]:
+    """
+    Handles `events` and measures the latency of each in seconds.
+
+    If `rate` is 0, events are handled one after another as fast as possible.
+    Otherwise, events arrive at `rate` per second and each is handled in its
+    own task, as the gateway dispatches them, so latencies include any time
+    spent waiting behind earlier events.
+    """
+    loop = asyncio.get_event_loop()
+    latencies: List[float] = []
+
+    if not rate:
+        for event in events:
+            start = loop.time()
+            await handle(event)
+            latencies.append(loop.time() - start)
+
+        return latencies
+
+    async def handle_at(event: Any, arrival: float):
+        await handle(event)
+        latencies.append(loop.time() - arrival)
+
+    tasks = []
+    start = loop.time()
+    for i, event in enumerate(events):
+        arrival = start + i / rate
+        delay = arrival - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        tasks.append(asyncio.ensure_future(handle_at(event, arrival)))
+
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+async def measure(name: str, setup: Callable, args: Any) -> Result:
+    """Sets up the scenario `name` with `setup(args)` and replays it."""
+    scenario: Scenario = await setup(args)
+
+    try:
+        start = time.perf_counter()
+        latencies = await replay(scenario.events, scenario.handle, args.rate)
+        seconds = time.perf_counter() - start
+    finally:
+        if scenario.cleanup is not None:
+            scenario.cleanup()
+
+    latencies.sort()
+    return Result(
+        name,
+        len(latencies),
+        seconds,
+        len(latencies) / seconds if seconds else 0,
+        percentile(latencies, 0.5) * 1000,
+        percentile(latencies, 0.99) * 1000,
+        (latencies[-1] if latencies else 0) * 1000,
+        get_peak_rss(),
+        get_peak_rss(resource.RUSAGE_CHILDREN)
+    )
+
+
+def _run_in_child(name: str, setup: Callable, args: Any, conn):
+    try:
+        conn.send(asyncio.run(measure(name, setup, args)))
+    except BaseException as e:
+        conn.send(e)
+        raise
+    finally:
+        conn.close()
+
+
+def run_isolated(name: str, setup: Callable, args: Any) -> Result:
+    """
+    Runs :func:`measure` in a new process.
+
+    Raises
+    ------
+    Exception
+        Whatever the scenario raised.
+    """
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_run_in_child,
+        args=(name, setup, args, sender)
+    )
+    process.start()
+    sender.close()
+
+    try:
+        outcome = receiver.recv()
+    except EOFError:
+        outcome = RuntimeError(f'{name} exited with code {process.exitcode}.')
+    finally:
+        process.join()
+
+    if isinstance(outcome, BaseException):
+        raise outcome
+
+    return outcome
+
+
+def get_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True,
+            check=True,
+            text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save(results: List[Result], arguments: Dict, directory: str) -> str:
+    """
+    Writes `results` to a new JSON file in `directory`, along with the
+    arguments and the environment they were measured in.
+
+    Returns
+    -------
+    str
+        The path of the file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(
+        directory,
+        time.strftime('%Y%m%d-%H%M%S', time.gmtime()) + '.json'
+    )
+
+    with open(path, 'w') as file:
+        json.dump(
+            {
+                'revision': get_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'arguments': arguments,
+                'results': [result._asdict() for result in results]
+            },
+            file,
+            indent=4
+        )
+
+    return path
+
+
+def load(path: str) -> Dict[str, Result]:
+    """Reads results written by :func:`save`, by scenario."""
+    with open(path) as file:
+        data = json.load(file)
+
+    return {r['scenario']: Result(**r) for r in data['results']}
+
+
+def print_results(
+    results: List[Result],
+    baseline: Optional[Dict[str, Result]] = None
+):
+    """
+    Prints a table of `results`, with the change in throughput and p99
+    latency from `baseline` if specified.
+    """
+    print(
+        f'{"scenario":<22} {"events":>7} {"events/s":>10} {"p50 ms":>8} '
+        f'{"p99 ms":>8} {"max ms":>8} {"RSS MiB":>8}'
+        + (f' {"Δ events/s":>10} {"Δ p99":>7}' if baseline else '')
+    )
+
+    for r in results:
+        line = (
+            f'{r.scenario:<22} {r.events:>7} {r.throughput:>10.1f} '
+            f'{r.p50_ms:>8.2f} {r.p99_ms:>8.2f} {r.max_ms:>8.2f} '
+            f'{r.peak_rss_mib:>8.1f}'
+        )
+
+        old = (baseline or {}).get(r.scenario)
+        if old is not None:
+            line += (
+                f' {change(old.throughput, r.throughput):>10} '
+                f'{change(old.p99_ms, r.p99_ms):>7}'
+            )
+
+        print(line)
+
+
+def change(old: float, new: float) -> str:
+    if not old:
+        return 'n/a'
+
+    return f'{(new - old) / old:+.0%}'
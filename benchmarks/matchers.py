@@ -0,0 +1,160 @@
+"""
+Compares the WordPolice matcher backends on synthetic chat messages.
+
+Run with `python -m benchmarks.matchers`.
+"""
+import argparse
+import random
+import string
+import timeit
+from typing import List
+
+from brotherchris.matching import MATCHERS
+from brotherchris.normalise import NormalisingMatcher
+
+# Ordinary messages which must not be mistaken for a word once normalised, as
+# pairs of the word and the message.
+FALSE_POSITIVES = (
+    ('ass', 'as you wish'),
+    ('god', 'he was good'),
+    ('good', 'god is great'),
+    ('hell', 'hel'),
+)
+
+# Messages which stretch a word's letters, and which must be matched once
+# normalised, as pairs of the word and the message.
+STRETCHED = (
+    ('book', 'boooook'),
+    ('shit', 'shiiiit'),
+    ('hell', 'heeeell'),
+    ('hell', 'heeeeelll'),
+)
+
+
+def random_word(rng: random.Random) -> str:
+    return ''.join(
+        rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 10))
+    )
+
+
+def make_corpus(
+    rng: random.Random,
+    vocabulary: List[str],
+    blacklist: List[str],
+    size: int,
+    hit_rate: float
+) -> List[str]:
+    """
+    Generates chat-like messages of 1 to 30 words with mixed case and
+    punctuation, in which `hit_rate` of messages contain a blacklisted word.
+    """
+    messages = []
+
+    for _ in range(size):
+        words = rng.choices(vocabulary, k=rng.randint(1, 30))
+        if rng.random() < hit_rate:
+            words[rng.randrange(len(words))] = rng.choice(blacklist).upper()
+
+        messages.append(
+            ' '.join(w + rng.choice(('', '', '', ',', '!', '?')) for w in words)
+        )
+
+    return messages
+
+
+def check_normalisation():
+    """
+    Warns about ordinary messages which a normalising backend matches, and
+    about stretched words which it misses.
+    """
+    for name in MATCHERS:
+        for word, msg in FALSE_POSITIVES:
+            if NormalisingMatcher(name, [word]).find(msg):
+                print(f'WARNING: {name} found "{word}" in "{msg}"')
+
+        for word, msg in STRETCHED:
+            if not NormalisingMatcher(name, [word]).find(msg):
+                print(f'WARNING: {name} did not find "{word}" in "{msg}"')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=[10, 100, 1000, 5000],
+        help='blacklist sizes to benchmark'
+    )
+    parser.add_argument(
+        '--messages',
+        type=int,
+        default=2000,
+        help='number of messages per corpus'
+    )
+    parser.add_argument(
+        '--normalise',
+        action='store_true',
+        help='normalise messages ahead of matching, as the WordPolice does by '
+             'default'
+    )
+    parser.add_argument('--hit-rate', type=float, default=0.05)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.normalise:
+        check_normalisation()
+
+    rng = random.Random(args.seed)
+    vocabulary = list({random_word(rng) for _ in range(20000)})
+
+    print(f'{"words":>6} {"backend":>13} {"build ms":>9} {"µs/msg":>8}')
+
+    for size in args.sizes:
+        blacklist = rng.sample(vocabulary, size)
+        corpus = make_corpus(
+            rng,
+            vocabulary,
+            blacklist,
+            args.messages,
+            args.hit_rate
+        )
+
+        results = {}
+        for name, cls in MATCHERS.items():
+            if args.normalise:
+                # Binds the current name rather than the loop variable.
+                def cls(words, name=name):
+                    return NormalisingMatcher(name, words)
+
+            build = min(timeit.repeat(
+                lambda: cls(blacklist),
+                number=1,
+                repeat=args.repeat
+            ))
+
+            matcher = cls(blacklist)
+            scan = min(timeit.repeat(
+                lambda: [matcher.find(m) for m in corpus],
+                number=1,
+                repeat=args.repeat
+            ))
+
+            results[name] = [
+                {m.word for m in matcher.find(msg)} for msg in corpus
+            ]
+            print(
+                f'{size:>6} {name:>13} {build * 1e3:>9.2f} '
+                f'{scan / len(corpus) * 1e6:>8.2f}'
+            )
+
+        # The backends may only disagree on overlapping matches, which the
+        # corpus does not produce.
+        first, *rest = results.values()
+        if any(r != first for r in rest):
+            print(f'{size:>6} WARNING: backends found different words')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,4 @@
 import logging
-import sys
-
-logging.basicConfig(
-    format='%(asctime)s - [%(levelname)s] %(name)s: %(message)s',
-    level=logging.INFO,
-    handlers=[logging.StreamHandler(stream=sys.stdout)]
-)
 
 logging.getLogger('discord').setLevel(logging.ERROR)
 logging.getLogger('websockets').setLevel(logging.ERROR)
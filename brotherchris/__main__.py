@@ -1,17 +1,88 @@
+import argparse
 import logging
+from typing import List, Tuple
 
-from brotherchris.bot import BrotherChris
+from brotherchris import logs
+from brotherchris.bot import BrotherChris, import_extensions
 from brotherchris.cogs import utils
+from brotherchris.memory import CacheProfile
 
 log: logging.Logger = logging.getLogger('brotherchris')
-config: dict = utils.load_config('Bot')
-bot = BrotherChris()
 
-for extension in config['extensions']:
-    try:
-        bot.load_extension(extension)
-        log.info(f'{extension} loaded successfully.')
-    except Exception as e:
-        log.error(f'{extension} failed to load.\n{type(e).__name__}: {e}')
 
-bot.run(config['token'])
+def profile(bot: BrotherChris, timings: List[Tuple[str, float, float]]):
+    """Prints the cost of loading and warming up each extension."""
+    print(f'{"extension":<40} {"import ms":>10} {"setup ms":>10}')
+    for extension, imported, loaded in sorted(timings, key=lambda t: -t[1]):
+        print(
+            f'{extension:<40} {imported * 1000:>10.1f} '
+            f'{loaded * 1000:>10.1f}'
+        )
+
+    total = sum(imported + loaded for _, imported, loaded in timings)
+    print(f'{"total":<40} {total * 1000:>21.1f}\n')
+
+    # Done before logging in when the bot runs normally.
+    warm_ups = bot.loop.run_until_complete(bot.warm_up())
+
+    print(f'{"cog":<40} {"warm-up ms":>10}')
+    for name, elapsed in warm_ups:
+        print(f'{name:<40} {elapsed * 1000:>10.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='brotherchris')
+    parser.add_argument(
+        '--profile-startup',
+        action='store_true',
+        help='report how long each extension takes to import, set up and warm '
+             'up, then exit without logging in'
+    )
+    parser.add_argument(
+        '--processes',
+        type=int,
+        help='run as a cluster of this many processes, each connecting a range '
+             'of shards'
+    )
+    parser.add_argument(
+        '--shards',
+        type=int,
+        help='the total number of shards in a cluster; by default, the number '
+             'Discord recommends'
+    )
+    args = parser.parse_args()
+
+    if args.processes is not None and args.processes < 1:
+        parser.error('--processes must be at least 1')
+    if args.shards is not None and args.shards < 1:
+        parser.error('--shards must be at least 1')
+    if args.shards is not None and args.processes is None:
+        parser.error('--shards requires --processes')
+
+    if args.processes is not None:
+        # Imported here so the discord.py sharding code is only loaded when
+        # used.
+        from brotherchris import cluster
+        cluster.main(args.processes, args.shards)
+        return
+
+    logs.configure(utils.load_config('Logging', {}))
+
+    config: dict = utils.load_config('Bot')
+    modules = import_extensions(config['extensions'])
+    bot = BrotherChris(CacheProfile.from_extensions(
+        (module for module, _ in modules.values()),
+        config
+    ))
+    timings = bot.load_extensions(modules)
+
+    if args.profile_startup:
+        profile(bot, timings)
+        bot.loop.run_until_complete(bot.close())
+    else:
+        bot.run(config['token'])
+
+
+# Cluster processes are spawned, and re-import this module when they start.
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional, Tuple
+
+from brotherchris import metrics
+
+log: logging.Logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS triggers (
+    hour INTEGER NOT NULL,
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    word TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (hour, guild_id, channel_id, user_id, word)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS triggers_guild
+    ON triggers (guild_id, hour);
+
+CREATE TABLE IF NOT EXISTS commands (
+    hour INTEGER NOT NULL,
+    command TEXT NOT NULL,
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    failed INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (hour, command, guild_id, user_id, failed)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS commands_user
+    ON commands (user_id, hour);
+'''
+
+HOUR = 3600
+
+FLUSH_SECONDS = metrics.histogram(
+    'brotherchris_analytics_flush_seconds',
+    'How long writing a batch of analytics to the database takes.'
+)
+
+
+def get_hour(timestamp: float = None) -> int:
+    """Returns the number of hours since the Unix epoch of a timestamp."""
+    if timestamp is None:
+        timestamp = time.time()
+
+    return int(timestamp // HOUR)
+
+
+class Ranking(NamedTuple):
+    key: Any
+    count: int
+
+
+class AnalyticsStore:
+    """
+    Counts Word Police triggers and command invocations in a local SQLite
+    database, rolled up by hour.
+
+    Recording an event only increments a counter in memory, so it costs next
+    to nothing on the message path. The counters are written in one
+    transaction every `flush_interval` seconds, or sooner once `flush_size`
+    distinct rows are waiting. Repeated events within the same hour therefore
+    become a single row update.
+
+    All database access happens on a single background thread so writes and
+    queries never block the event loop.
+
+    Parameters
+    ----------
+    path: str
+        The path of the SQLite database file.
+    flush_interval: float
+        The maximum number of seconds events wait in memory.
+    flush_size: int
+        The number of distinct rows in memory which causes an early flush.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval: float = 60,
+        flush_size: int = 1000
+    ):
+        self.flush_interval: float = flush_interval
+        self.flush_size: int = flush_size
+
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+
+        # Keyed by the primary key of each table, less the count.
+        self._triggers: Counter = Counter()
+        self._commands: Counter = Counter()
+
+        self._flushing: Optional[asyncio.Task] = None
+        self._timer: Optional[asyncio.Task] = None
+
+        metrics.gauge(
+            'brotherchris_analytics_pending_rows',
+            'The number of aggregated analytics rows waiting to be written.',
+            self.pending
+        )
+
+    def pending(self) -> int:
+        """Returns the number of rows waiting to be written."""
+        return len(self._triggers) + len(self._commands)
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Starts flushing on a timer."""
+        self._timer = loop.create_task(self._flush_periodically())
+
+    def close(self):
+        """Writes any events still in memory and closes the database."""
+        if self._timer is not None:
+            self._timer.cancel()
+
+        # Runs after any flush already submitted to the executor.
+        triggers, commands = self._take()
+        future = self._executor.submit(self._write, triggers, commands)
+        self._executor.shutdown(wait=True)
+        self._db.close()
+
+        e = future.exception()
+        if e is not None:
+            log.error(
+                f'Failed to write analytics on close, losing '
+                f'{len(triggers) + len(commands)} rows.\n'
+                f'{type(e).__name__}: {e}'
+            )
+
+    def record_trigger(
+        self,
+        guild_id: int,
+        channel_id: int,
+        user_id: int,
+        words: Iterable[str]
+    ):
+        """Counts a message in which the Word Police found `words`."""
+        hour = get_hour()
+        for word in words:
+            self._triggers[hour, guild_id, channel_id, user_id, word] += 1
+
+        self._check_size()
+
+    def record_command(
+        self,
+        command: str,
+        guild_id: Optional[int],
+        user_id: int,
+        failed: bool
+    ):
+        """
+        Counts an invocation of `command`. Commands in direct messages have no
+        guild and are stored with a guild ID of 0.
+        """
+        key = (get_hour(), command, guild_id or 0, user_id, int(failed))
+        self._commands[key] += 1
+
+        self._check_size()
+
+    def _check_size(self):
+        if self.pending() >= self.flush_size and self._flushing is None:
+            self._flushing = asyncio.ensure_future(self.flush())
+            self._flushing.add_done_callback(self._flushed)
+
+    def _flushed(self, task: asyncio.Task):
+        self._flushing = None
+
+        if not task.cancelled() and task.exception() is not None:
+            e = task.exception()
+            log.error(f'Failed to write analytics.\n{type(e).__name__}: {e}')
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+
+            # Any error must not stop the counters from being written later.
+            try:
+                await self.flush()
+            except Exception as e:
+                log.error(
+                    f'Failed to write analytics.\n{type(e).__name__}: {e}'
+                )
+
+    async def flush(self):
+        """
+        Writes the events recorded so far. If the write fails, the events are
+        merged back into the counters to be retried by the next flush.
+        """
+        if not self.pending():
+            return
+
+        triggers, commands = self._take()
+        try:
+            await self._run(self._write, triggers, commands)
+        except sqlite3.Error:
+            # The transaction was rolled back. Counter.update adds to the
+            # events recorded in the meantime.
+            self._triggers.update(triggers)
+            self._commands.update(commands)
+            raise
+
+    def _take(self) -> Tuple[Counter, Counter]:
+        """Hands over the counters, so new events go to fresh ones."""
+        triggers, self._triggers = self._triggers, Counter()
+        commands, self._commands = self._commands, Counter()
+
+        return triggers, commands
+
+    async def _run(self, func: Callable, *args: Any) -> Any:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _write(self, triggers: Counter, commands: Counter):
+        if not triggers and not commands:
+            return
+
+        start = time.perf_counter()
+
+        with self._db:
+            self._db.executemany(
+                'INSERT INTO triggers '
+                '(hour, guild_id, channel_id, user_id, word, count) '
+                'VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (hour, guild_id, channel_id, user_id, word) '
+                'DO UPDATE SET count = count + excluded.count',
+                (key + (n,) for key, n in triggers.items())
+            )
+            self._db.executemany(
+                'INSERT INTO commands '
+                '(hour, command, guild_id, user_id, failed, count) '
+                'VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (hour, command, guild_id, user_id, failed) '
+                'DO UPDATE SET count = count + excluded.count',
+                (key + (n,) for key, n in commands.items())
+            )
+
+        FLUSH_SECONDS.observe(time.perf_counter() - start)
+
+    async def top_words(
+        self,
+        guild_id: int,
+        since: Optional[int],
+        limit: int
+    ) -> List[Ranking]:
+        """
+        Ranks the words which triggered the Word Police most often in a guild.
+
+        Parameters
+        ----------
+        guild_id: int
+            The ID of the guild.
+        since: Optional[int]
+            The hour, as returned by :func:`get_hour`, from which to count. If
+            None, all recorded triggers are counted.
+        limit: int
+            The maximum number of words to return.
+
+        Returns
+        -------
+        List[Ranking]
+            The words and their counts, most frequent first.
+        """
+        return await self._top('triggers', 'word', guild_id, since, limit)
+
+    async def top_triggerers(
+        self,
+        guild_id: int,
+        since: Optional[int],
+        limit: int
+    ) -> List[Ranking]:
+        """
+        Ranks the IDs of the users who triggered the Word Police most often in
+        a guild, like :meth:`top_words`.
+        """
+        return await self._top('triggers', 'user_id', guild_id, since, limit)
+
+    async def top_commands(
+        self,
+        since: Optional[int],
+        limit: int
+    ) -> List[Ranking]:
+        """
+        Ranks the commands invoked most often across all guilds, like
+        :meth:`top_words`.
+        """
+        return await self._top('commands', 'command', None, since, limit)
+
+    async def top_command_users(
+        self,
+        since: Optional[int],
+        limit: int
+    ) -> List[Ranking]:
+        """
+        Ranks the IDs of the users who invoke commands most often across all
+        guilds, like :meth:`top_words`.
+        """
+        return await self._top('commands', 'user_id', None, since, limit)
+
+    async def _top(
+        self,
+        table: str,
+        column: str,
+        guild_id: Optional[int],
+        since: Optional[int],
+        limit: int
+    ) -> List[Ranking]:
+        # Includes the events which have not been written yet.
+        await self.flush()
+
+        return await self._run(
+            self._query,
+            table,
+            column,
+            guild_id,
+            since,
+            limit
+        )
+
+    def _query(
+        self,
+        table: str,
+        column: str,
+        guild_id: Optional[int],
+        since: Optional[int],
+        limit: int
+    ) -> List[Ranking]:
+        # The table and column names only ever come from this module.
+        conditions = ['hour >= ?']
+        params: List[Any] = [since or 0]
+
+        if guild_id is not None:
+            conditions.append('guild_id = ?')
+            params.append(guild_id)
+
+        rows = self._db.execute(
+            f'SELECT {column}, SUM(count) AS total FROM {table} '
+            f'WHERE {" AND ".join(conditions)} '
+            f'GROUP BY {column} ORDER BY total DESC LIMIT ?',
+            (*params, limit)
+        )
+
+        return [Ranking(*row) for row in rows]
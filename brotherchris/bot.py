@@ -1,25 +1,83 @@
+import asyncio
+import importlib
 import logging
+import time
 import traceback
+from types import ModuleType
+from typing import Dict, List, Optional, Tuple
 
 import discord
 from discord.ext import commands
 
+from brotherchris import metrics
 from brotherchris.cogs import utils
+from brotherchris.config import configuration
+from brotherchris.emoji_index import EmojiIndex
+from brotherchris.memory import CacheProfile, describe_cache_sizes, \
+    get_cache_sizes
+from brotherchris.router import MessageRouter
 
 log: logging.Logger = logging.getLogger(__name__)
-config: dict = utils.load_config('Bot')
+
+COMMAND_SECONDS = metrics.histogram(
+    'brotherchris_command_seconds',
+    'How long commands take, by command and whether they failed.'
+)
+CACHED_OBJECTS = metrics.gauge(
+    'brotherchris_cached_objects',
+    'The number of objects in the client\'s caches, by cache.'
+)
 
 
 class BrotherChris(commands.Bot):
-    def __init__(self):
+    """
+    Parameters
+    ----------
+    profile: CacheProfile
+        What to receive from the gateway and cache, usually derived from the
+        extensions which will be loaded. By default, only what the bot itself
+        needs.
+    """
+
+    def __init__(self, profile: CacheProfile = None, **options):
+        config = utils.load_config('Bot')
+
+        if profile is None:
+            profile = CacheProfile.from_extensions([], config)
+
         super().__init__(
-            command_prefix=config['prefixes'],
+            command_prefix=self.get_prefixes,
             description=config['name'],
             pm_help=None,
-            help_attrs=dict(hidden=True)
+            help_attrs=dict(hidden=True),
+            intents=profile.intents,
+            member_cache_flags=profile.member_cache_flags,
+            max_messages=profile.max_messages,
+            # Extensions which need every member of a guild request them
+            # when they need them.
+            chunk_guilds_at_startup=False,
+            **options
         )
+        log.info(profile.describe())
 
         self.add_check(self.global_user_check)
+        self.before_invoke(self.start_timer)
+        self.after_invoke(self.stop_timer)
+
+        # Shared by every cog which resolves custom emojis.
+        self.emoji_index = EmojiIndex()
+
+        # Cogs register message handlers here rather than listening to every
+        # message themselves.
+        self.router = MessageRouter(self)
+
+        self.warm_up_task: Optional[asyncio.Task] = None
+        self.cache_report_task: Optional[asyncio.Task] = None
+
+        # Picks up changes to Configuration.json without a restart.
+        self.loop.create_task(
+            configuration.watch(config.get('reload_interval', 5))
+        )
 
     async def on_ready(self):
         """
@@ -38,10 +96,106 @@ class BrotherChris(commands.Bot):
         -------
         None
         """
+        self.emoji_index.build(self.guilds)
+
         log.info(
             f'{self.description} logged in as {self.user} ({self.user.id}).'
         )
 
+        log.info(describe_cache_sizes(self))
+
+        if self.warm_up_task is None:
+            self.warm_up_task = self.loop.create_task(self.warm_up())
+
+        if self.cache_report_task is None:
+            self.cache_report_task = self.loop.create_task(
+                self.report_caches()
+            )
+
+    async def report_caches(self):
+        """
+        Periodically logs the sizes of the caches and records them as metrics.
+        """
+        while True:
+            for name, count in get_cache_sizes(self).items():
+                CACHED_OBJECTS.set(count, cache=name)
+
+            config = utils.load_config('Bot')
+            await asyncio.sleep(config.get('cache_report_interval', 600))
+
+            log.info(describe_cache_sizes(self))
+
+    def load_extensions(
+        self,
+        modules: Dict[str, Tuple[ModuleType, float]]
+    ) -> List[Tuple[str, float, float]]:
+        """
+        Loads the extensions imported by :func:`import_extensions`, logging
+        those which fail.
+
+        Returns
+        -------
+        List[Tuple[str, float, float]]
+            The name of each extension which was loaded and the number of
+            seconds it took to import it and to set it up.
+        """
+        timings = []
+
+        for extension, (_, imported) in modules.items():
+            try:
+                # The module is already imported, so this only runs its setup.
+                start = time.perf_counter()
+                self.load_extension(extension)
+                loaded = time.perf_counter() - start
+
+                timings.append((extension, imported, loaded))
+                log.info(
+                    f'{extension} loaded successfully in '
+                    f'{(imported + loaded) * 1000:.0f} ms.'
+                )
+            except Exception as e:
+                log.error(
+                    f'{extension} failed to load.\n{type(e).__name__}: {e}'
+                )
+
+        return timings
+
+    async def warm_up(self) -> List[Tuple[str, float]]:
+        """
+        Calls the `warm_up` coroutine of every cog which has one.
+
+        Cogs import heavy dependencies on first use rather than when they are
+        loaded, so that the bot is ready sooner. Warming up afterwards keeps
+        the first use from being slow.
+
+        Returns
+        -------
+        List[Tuple[str, float]]
+            The name of each cog which was warmed up and the number of seconds
+            it took.
+        """
+        timings = []
+
+        for name, cog in tuple(self.cogs.items()):
+            warm_up = getattr(cog, 'warm_up', None)
+            if warm_up is None:
+                continue
+
+            start = time.perf_counter()
+            try:
+                await warm_up()
+            except Exception as e:
+                log.error(
+                    f'{name} failed to warm up.\n{type(e).__name__}: {e}'
+                )
+                continue
+
+            elapsed = time.perf_counter() - start
+            timings.append((name, elapsed))
+            log.info(f'{name} warmed up in {elapsed * 1000:.0f} ms.')
+
+        return timings
+
     async def on_resumed(self):
         """
         Called when the :class:`client<discord.Client>` has resumed a session.
@@ -52,11 +206,71 @@ class BrotherChris(commands.Bot):
         """
         log.info(f'{self.description} resumed.')
 
+    async def on_guild_join(self, guild: discord.Guild):
+        """
+        Called when the :class:`client<discord.Client>` joins a
+        :class:`guild<discord.Guild>`.
+
+        Parameters
+        ----------
+        guild: discord.Guild
+            The guild that was joined.
+
+        Returns
+        -------
+        None
+        """
+        self.emoji_index.add_guild(guild)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        """
+        Called when the :class:`client<discord.Client>` leaves a
+        :class:`guild<discord.Guild>`, e.g. by being kicked or the guild being
+        deleted.
+
+        Parameters
+        ----------
+        guild: discord.Guild
+            The guild that was left.
+
+        Returns
+        -------
+        None
+        """
+        self.emoji_index.remove_guild(guild.id)
+
+    async def on_guild_emojis_update(
+        self,
+        guild: discord.Guild,
+        before: List[discord.Emoji],
+        after: List[discord.Emoji]
+    ):
+        """
+        Called when a :class:`guild<discord.Guild>` adds or removes emojis.
+
+        Parameters
+        ----------
+        guild: discord.Guild
+            The guild whose emojis were updated.
+        before: List[discord.Emoji]
+            The emojis before the update.
+        after: List[discord.Emoji]
+            The emojis after the update.
+
+        Returns
+        -------
+        None
+        """
+        self.emoji_index.add_guild(guild)
+
     async def on_message(self, msg: discord.Message):
         """
         Called when a :class:`message<discord.Message>` is created and sent to a
         server.
 
+        Routes the message to the interested handlers and processes any command
+        it invokes.
+
         Parameters
         ----------
         msg: discord.Message
@@ -66,8 +280,14 @@ class BrotherChris(commands.Bot):
         -------
         None
         """
-        if not msg.author.bot:
-            await self.process_commands(msg)
+        # Parsed once for both the router and the command, as
+        # process_commands would parse it again.
+        ctx = None if msg.author.bot else await self.get_context(msg)
+
+        await self.router.dispatch(msg, ctx)
+
+        if ctx is not None:
+            await self.invoke(ctx)
 
     async def on_command_error(
         self,
@@ -136,6 +356,33 @@ class BrotherChris(commands.Bot):
                 f'{"".join(traceback.format_tb(error.original.__traceback__))}'
             )
 
+    @staticmethod
+    async def start_timer(ctx: commands.Context):
+        """Records when a command started, once its checks have passed."""
+        ctx.started = time.perf_counter()
+
+    @staticmethod
+    async def stop_timer(ctx: commands.Context):
+        """Records how long a command took, whether or not it failed."""
+        # Groups only call the hooks for the subcommand which was invoked.
+        command = ctx.invoked_subcommand or ctx.command
+        started = getattr(ctx, 'started', None)
+
+        if started is not None:
+            COMMAND_SECONDS.observe(
+                time.perf_counter() - started,
+                command=command.qualified_name,
+                failed=str(ctx.command_failed).lower()
+            )
+
+    @staticmethod
+    def get_prefixes(bot: commands.Bot, msg: discord.Message) -> List[str]:
+        """
+        Retrieves the command prefixes from the configuration, so that changes
+        to them apply immediately.
+        """
+        return utils.load_config('Bot')['prefixes']
+
     @staticmethod
     async def global_user_check(ctx: commands.Context) -> bool:
         """
@@ -156,9 +403,37 @@ class BrotherChris(commands.Bot):
         commands.CheckFailure
             If the invoking user is not permitted.
         """
-        if ctx.message.author.id not in config['user_ids']:
+        if ctx.message.author.id not in utils.load_config('Bot')['user_ids']:
             raise commands.CheckFailure(
                 'Sorry, you are not whitelisted to use commands.'
             )
 
         return True
+
+
+def import_extensions(
+    extensions: List[str]
+) -> Dict[str, Tuple[ModuleType, float]]:
+    """
+    Imports `extensions` ahead of loading them, so the bot can be configured
+    for what they declare they need. Extensions which fail are logged.
+
+    Returns
+    -------
+    Dict[str, Tuple[ModuleType, float]]
+        The module of each extension which was imported and the number of
+        seconds it took to import it.
+    """
+    modules = {}
+
+    for extension in extensions:
+        try:
+            start = time.perf_counter()
+            module = importlib.import_module(extension)
+            modules[extension] = (module, time.perf_counter() - start)
+        except Exception as e:
+            log.error(
+                f'{extension} failed to import.\n{type(e).__name__}: {e}'
+            )
+
+    return modules
@@ -0,0 +1,424 @@
+"""
+Runs the bot as several processes, each of which connects a range of shards.
+
+A supervisor in the parent process starts the processes, restarts any which
+exit or stop responding, prints their logs, and serves their combined metrics.
+Every process reads the same configuration file.
+"""
+import asyncio
+import logging
+import multiprocessing
+import queue
+import signal
+import time
+from logging.handlers import QueueListener
+from typing import Dict, List, Optional
+
+import discord
+from aiohttp import web
+from discord.ext import commands
+
+from brotherchris import logs, metrics
+from brotherchris.bot import BrotherChris, import_extensions
+from brotherchris.cogs import utils
+from brotherchris.memory import CacheProfile
+
+log: logging.Logger = logging.getLogger(__name__)
+
+# Seconds between the metrics, and thereby heartbeats, sent by each process.
+HEARTBEAT_INTERVAL = 5
+
+# Records of the processes are written by the supervisor, labelled by process.
+LOG_FORMAT = (
+    '%(asctime)s - [%(levelname)s] %(processName)s %(name)s: %(message)s'
+)
+
+# Discord allows one identify per 5 seconds, across all processes.
+IDENTIFY_INTERVAL = 5.5
+
+RESTARTS = metrics.counter(
+    'brotherchris_cluster_restarts_total',
+    'The number of times each cluster process was restarted.'
+)
+
+
+def get_shard_ranges(shard_count: int, processes: int) -> List[List[int]]:
+    """Splits the shards into `processes` contiguous ranges of similar sizes."""
+    processes = min(processes, shard_count)
+    return [
+        list(range(
+            i * shard_count // processes,
+            (i + 1) * shard_count // processes
+        ))
+        for i in range(processes)
+    ]
+
+
+async def get_shard_count(token: str) -> int:
+    """Retrieves the number of shards Discord recommends for the bot."""
+    http = discord.http.HTTPClient()
+
+    try:
+        await http.static_login(token, bot=True)
+        shards, _ = await http.get_bot_gateway()
+    finally:
+        await http.close()
+
+    return shards
+
+
+class ShardedBrotherChris(BrotherChris, commands.AutoShardedBot):
+    """
+    A bot which connects a range of shards in one process of a cluster.
+
+    Parameters
+    ----------
+    cluster_id: int
+        The index of the process in the cluster.
+    shard_ids: List[int]
+        The IDs of the shards to connect.
+    shard_count: int
+        The total number of shards across the cluster.
+    heartbeats: multiprocessing.Queue
+        The queue to which to send the process's metrics, which doubles as a
+        heartbeat for the supervisor.
+    identify_lock: multiprocessing.Lock
+        Held while identifying, so processes take turns.
+    last_identify: multiprocessing.Value
+        When a shard last identified, across all processes.
+    profile: CacheProfile
+        What to receive from the gateway and cache.
+    """
+
+    def __init__(
+        self,
+        cluster_id: int,
+        shard_ids: List[int],
+        shard_count: int,
+        heartbeats: multiprocessing.Queue,
+        identify_lock: multiprocessing.Lock,
+        last_identify: multiprocessing.Value,
+        profile: CacheProfile = None
+    ):
+        super().__init__(
+            profile,
+            shard_ids=shard_ids,
+            shard_count=shard_count
+        )
+
+        self.cluster_id: int = cluster_id
+        self.identify_lock = identify_lock
+        self.last_identify = last_identify
+
+        self.loop.create_task(self.send_heartbeats(heartbeats))
+
+    async def before_identify_hook(self, shard_id: int, *, initial=False):
+        """Waits until no shard in the cluster has identified for a while."""
+        # A process which died while holding the lock must not stall the
+        # others forever.
+        acquired = await self.loop.run_in_executor(
+            None,
+            lambda: self.identify_lock.acquire(timeout=30)
+        )
+
+        try:
+            delay = self.last_identify.value + IDENTIFY_INTERVAL - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            self.last_identify.value = time.time()
+        finally:
+            if acquired:
+                self.identify_lock.release()
+
+    async def send_heartbeats(self, heartbeats: multiprocessing.Queue):
+        # Sent from the event loop, so a blocked loop stops the heartbeats.
+        while True:
+            heartbeats.put((self.cluster_id, metrics.render()))
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+
+def run_process(
+    cluster_id: int,
+    shard_ids: List[int],
+    shard_count: int,
+    records: multiprocessing.Queue,
+    heartbeats: multiprocessing.Queue,
+    identify_lock: multiprocessing.Lock,
+    last_identify: multiprocessing.Value
+):
+    """Runs a :class:`ShardedBrotherChris` in a process of the cluster."""
+    # Everything is written by the supervisor instead.
+    logs.forward(records, utils.load_config('Logging', {}))
+
+    config = utils.load_config('Bot')
+    modules = import_extensions(config['extensions'])
+    bot = ShardedBrotherChris(
+        cluster_id,
+        shard_ids,
+        shard_count,
+        heartbeats,
+        identify_lock,
+        last_identify,
+        CacheProfile.from_extensions(
+            (module for module, _ in modules.values()),
+            config
+        )
+    )
+    bot.load_extensions(modules)
+
+    log.info(f'Connecting shards {shard_ids[0]} to {shard_ids[-1]}.')
+    bot.run(config['token'])
+
+
+class Worker:
+    """A process of the cluster, as tracked by the supervisor."""
+
+    def __init__(self, cluster_id: int, shard_ids: List[int]):
+        self.cluster_id: int = cluster_id
+        self.shard_ids: List[int] = shard_ids
+        self.process: Optional[multiprocessing.Process] = None
+        self.started: float = 0
+        self.last_heartbeat: float = 0
+        self.failures: int = 0
+        self.restart_at: Optional[float] = None
+        self.metrics: str = ''
+
+    @property
+    def name(self) -> str:
+        return f'cluster-{self.cluster_id}'
+
+
+class Supervisor:
+    """
+    Starts a process for each range of shards and keeps it running.
+
+    A process which exits, or which sends no heartbeat for `timeout` seconds,
+    is restarted. Restarts of a process which keeps failing are delayed
+    exponentially, up to a minute.
+
+    Parameters
+    ----------
+    processes: int
+        The number of processes to run.
+    shard_count: int
+        The total number of shards.
+    timeout: float
+        The number of seconds without a heartbeat after which a process is
+        considered stuck.
+    """
+
+    def __init__(self, processes: int, shard_count: int, timeout: float):
+        self.shard_count: int = shard_count
+        self.timeout: float = timeout
+        self.workers: List[Worker] = [
+            Worker(i, shard_ids) for i, shard_ids
+            in enumerate(get_shard_ranges(shard_count, processes))
+        ]
+
+        self.context = multiprocessing.get_context('spawn')
+        self.records: multiprocessing.Queue = self.context.Queue(
+            utils.load_config('Logging', {}).get('queue_size', 10000)
+        )
+        self.heartbeats: multiprocessing.Queue = self.context.Queue()
+        self.identify_lock = self.context.Lock()
+        self.last_identify = self.context.Value('d', 0, lock=False)
+        self.stopping: asyncio.Event = asyncio.Event()
+
+        self.up: metrics.Gauge = metrics.gauge(
+            'brotherchris_cluster_processes_up',
+            'The number of cluster processes which are running.',
+            lambda: sum(
+                w.process is not None and w.process.is_alive()
+                for w in self.workers
+            )
+        )
+
+    def start(self, worker: Worker):
+        worker.process = self.context.Process(
+            name=worker.name,
+            target=run_process,
+            args=(
+                worker.cluster_id,
+                worker.shard_ids,
+                self.shard_count,
+                self.records,
+                self.heartbeats,
+                self.identify_lock,
+                self.last_identify
+            ),
+            daemon=True
+        )
+        worker.process.start()
+        worker.started = worker.last_heartbeat = time.monotonic()
+        worker.restart_at = None
+
+        log.info(
+            f'Started {worker.name} (PID {worker.process.pid}) for shards '
+            f'{worker.shard_ids[0]} to {worker.shard_ids[-1]}.'
+        )
+
+    async def stop(self, worker: Worker):
+        process = worker.process
+        if process is None or not process.is_alive():
+            return
+
+        # Joined in the executor, so heartbeats and metrics are still served
+        # while the process shuts down.
+        loop = asyncio.get_event_loop()
+        process.terminate()
+        await loop.run_in_executor(None, process.join, 10)
+        if process.is_alive():
+            process.kill()
+            await loop.run_in_executor(None, process.join)
+
+    async def check(self, worker: Worker):
+        """Restarts `worker` if it exited or is stuck."""
+        now = time.monotonic()
+
+        if worker.restart_at is not None:
+            if now >= worker.restart_at:
+                RESTARTS.inc(cluster=str(worker.cluster_id))
+                self.start(worker)
+            return
+
+        if worker.process.is_alive():
+            if now - worker.last_heartbeat < self.timeout:
+                return
+
+            log.error(
+                f'{worker.name} sent no heartbeat for {self.timeout:.0f}s; '
+                f'killing it.'
+            )
+            await self.stop(worker)
+        else:
+            log.error(
+                f'{worker.name} exited with code {worker.process.exitcode}.'
+            )
+
+        # Failures soon after starting suggest the process will keep failing.
+        if now - worker.started < 60:
+            worker.failures += 1
+        else:
+            worker.failures = 0
+
+        delay = min(60, 2 ** worker.failures)
+        worker.restart_at = now + delay
+        log.info(f'Restarting {worker.name} in {delay}s.')
+
+    def receive_heartbeats(self):
+        while True:
+            try:
+                cluster_id, text = self.heartbeats.get_nowait()
+            except queue.Empty:
+                return
+
+            worker = self.workers[cluster_id]
+            worker.last_heartbeat = time.monotonic()
+            worker.metrics = text
+
+    def get_metrics(self) -> str:
+        """Merges the metrics of every process with the supervisor's own."""
+        merged = metrics.merge(
+            {str(w.cluster_id): w.metrics for w in self.workers},
+            'cluster'
+        )
+        # Rendering every metric would repeat the families of the processes,
+        # which are registered here too but never updated.
+        own = RESTARTS.render() + self.up.render()
+        return merged + '\n'.join(own) + '\n'
+
+    async def serve_metrics(self, host: str, port: int) -> web.AppRunner:
+        async def handle(request: web.Request) -> web.Response:
+            return web.Response(
+                text=self.get_metrics(),
+                content_type='text/plain',
+                charset='utf-8'
+            )
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+
+        log.info(f'Serving cluster metrics on http://{host}:{port}/metrics.')
+        return runner
+
+    async def run(self):
+        """Runs the cluster until the supervisor is interrupted."""
+        loop = asyncio.get_event_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stopping.set)
+            except NotImplementedError:
+                # Windows; KeyboardInterrupt still stops the supervisor.
+                pass
+
+        # Processes log through the supervisor, so their lines are
+        # interleaved rather than garbled.
+        listener = QueueListener(
+            self.records,
+            *logging.getLogger().handlers,
+            respect_handler_level=True
+        )
+        listener.start()
+
+        config = utils.load_config('Stats', {})
+        runner = None
+        if config.get('port') is not None:
+            runner = await self.serve_metrics(
+                config.get('host', '127.0.0.1'),
+                config['port']
+            )
+
+        try:
+            for worker in self.workers:
+                self.start(worker)
+
+            while not self.stopping.is_set():
+                self.receive_heartbeats()
+                for worker in self.workers:
+                    await self.check(worker)
+
+                try:
+                    await asyncio.wait_for(self.stopping.wait(), 1)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            log.info('Stopping the cluster.')
+            await asyncio.gather(*map(self.stop, self.workers))
+
+            if runner is not None:
+                await runner.cleanup()
+
+            listener.stop()
+
+
+def main(processes: int, shard_count: Optional[int]):
+    """
+    Runs the bot as `processes` processes.
+
+    Parameters
+    ----------
+    processes: int
+        The number of processes.
+    shard_count: Optional[int]
+        The total number of shards. If None, Discord's recommendation is used.
+    """
+    logs.configure(utils.load_config('Logging', {}), LOG_FORMAT)
+
+    config: Dict = utils.load_config('Bot')
+    loop = asyncio.get_event_loop()
+
+    if shard_count is None:
+        shard_count = loop.run_until_complete(get_shard_count(config['token']))
+        log.info(f'Discord recommends {shard_count} shards.')
+
+    supervisor = Supervisor(
+        processes,
+        shard_count,
+        config.get('heartbeat_timeout', 60)
+    )
+    loop.run_until_complete(supervisor.run())
@@ -0,0 +1,195 @@
+import logging
+import re
+from typing import Dict, List, Optional
+
+import discord
+from discord.ext import commands
+
+from brotherchris.analytics import AnalyticsStore, Ranking, get_hour
+from brotherchris.cogs import utils
+
+log: logging.Logger = logging.getLogger(__name__)
+
+INTENTS: discord.Intents = discord.Intents.none()
+
+PERIOD_PATTERN = re.compile(r'(\d+)([hdw])')
+HOURS = {'h': 1, 'd': 24, 'w': 24 * 7}
+
+# The most rows a top-N query may return, to keep the embed within limits.
+MAX_COUNT = 25
+
+
+def parse_period(argument: str) -> Optional[int]:
+    """Converts a period such as "24h", "7d" or "4w" to hours, or "all"."""
+    if argument.lower() == 'all':
+        return None
+
+    match = PERIOD_PATTERN.fullmatch(argument.lower())
+    if match is None or int(match.group(1)) < 1:
+        raise commands.BadArgument(
+            f'The period must be a number of hours, days or weeks, such as '
+            f'"24h", "7d" or "4w", or "all", not "{argument}".'
+        )
+
+    return int(match.group(1)) * HOURS[match.group(2)]
+
+
+def describe_period(hours: Optional[int]) -> str:
+    if hours is None:
+        return 'all time'
+
+    for unit, name in (('w', 'week'), ('d', 'day'), ('h', 'hour')):
+        if hours % HOURS[unit] == 0:
+            n = hours // HOURS[unit]
+            return f'the last {name}' if n == 1 else f'the last {n} {name}s'
+
+
+def parse_count(argument: str) -> int:
+    """Converts the number of rows of a top-N query."""
+    try:
+        count = int(argument)
+    except ValueError:
+        raise commands.BadArgument(
+            f'The count must be a number, not "{argument}".'
+        )
+
+    if not 1 <= count <= MAX_COUNT:
+        raise commands.BadArgument(
+            f'The count must be between 1 and {MAX_COUNT}.'
+        )
+
+    return count
+
+
+def format_rankings(rankings: List[Ranking], mentions: bool = False) -> str:
+    return '\n'.join(
+        f'{i}. {f"<@{r.key}>" if mentions else f"`{r.key}`"}: {r.count}'
+        for i, r in enumerate(rankings, 1)
+    ) or 'None yet'
+
+
+class Analytics(commands.Cog):
+    """
+    Records how often each command is used and how often each word triggers
+    the Word Police. The store is shared as `bot.analytics`.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot: commands.Bot = bot
+        self.config: Dict = utils.load_config('Analytics', {})
+        self.store = AnalyticsStore(
+            utils.get_process_path(
+                bot,
+                self.config.get('path', 'Analytics.sqlite3')
+            ),
+            self.config.get('flush_interval', 60),
+            self.config.get('flush_size', 1000)
+        )
+        self.store.start(bot.loop)
+
+        bot.analytics = self.store
+
+    def cog_unload(self):
+        del self.bot.analytics
+        self.store.close()
+
+    @commands.Cog.listener()
+    async def on_command_completion(self, ctx: commands.Context):
+        self.record(ctx, False)
+
+    @commands.Cog.listener()
+    async def on_command_error(
+        self,
+        ctx: commands.Context,
+        error: commands.CommandError
+    ):
+        # Only errors raised by the command itself mean it was used; the
+        # others mean it never ran.
+        if isinstance(error, commands.CommandInvokeError):
+            self.record(ctx, True)
+
+    def record(self, ctx: commands.Context, failed: bool):
+        # Groups only call the hooks for the subcommand which was invoked.
+        command = ctx.invoked_subcommand or ctx.command
+
+        self.store.record_command(
+            command.qualified_name,
+            ctx.guild and ctx.guild.id,
+            ctx.author.id,
+            failed
+        )
+
+    @staticmethod
+    def get_since(hours: Optional[int]) -> Optional[int]:
+        """Returns the first hour of the last `hours`, or None for all."""
+        return None if hours is None else get_hour() - hours + 1
+
+    @commands.group(invoke_without_command=True)
+    @commands.is_owner()
+    async def top(self, ctx: commands.Context):
+        await ctx.send(
+            'Use `top words <period> <count>` or '
+            '`top commands <period> <count>`.'
+        )
+
+    @top.command(name='words')
+    @commands.is_owner()
+    @commands.guild_only()
+    async def top_words(
+        self,
+        ctx: commands.Context,
+        period: parse_period = 7 * 24,
+        count: parse_count = 10
+    ):
+        """
+        Shows the words which triggered the Word Police most often in the
+        current server, and who triggered it most often.
+        """
+        since = self.get_since(period)
+        words = await self.store.top_words(ctx.guild.id, since, count)
+        users = await self.store.top_triggerers(ctx.guild.id, since, count)
+
+        embed = discord.Embed()
+        embed.title = 'Top Word Police Triggers'
+        embed.description = \
+            f'In {ctx.guild.name} over {describe_period(period)}.'
+        embed.colour = discord.Colour(utils.get_random_colour())
+        embed.add_field(name='Words', value=format_rankings(words))
+        embed.add_field(
+            name='Users',
+            value=format_rankings(users, mentions=True)
+        )
+
+        await ctx.send(embed=embed)
+
+    @top.command(name='commands')
+    @commands.is_owner()
+    async def top_commands(
+        self,
+        ctx: commands.Context,
+        period: parse_period = 7 * 24,
+        count: parse_count = 10
+    ):
+        """
+        Shows the commands used most often across all servers, and who used
+        them most often.
+        """
+        since = self.get_since(period)
+        names = await self.store.top_commands(since, count)
+        users = await self.store.top_command_users(since, count)
+
+        embed = discord.Embed()
+        embed.title = 'Top Commands'
+        embed.description = f'Over {describe_period(period)}.'
+        embed.colour = discord.Colour(utils.get_random_colour())
+        embed.add_field(name='Commands', value=format_rankings(names))
+        embed.add_field(
+            name='Users',
+            value=format_rankings(users, mentions=True)
+        )
+
+        await ctx.send(embed=embed)
+
+
+def setup(bot: commands.Bot):
+    bot.add_cog(Analytics(bot))
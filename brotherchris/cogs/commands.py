@@ -1,21 +1,60 @@
+import asyncio
 import logging
 import re
-from typing import Pattern
+from typing import AsyncGenerator, Dict, Optional
 
 import discord
 from discord.ext import commands
-from emoji import unicode_codes
 
+from brotherchris import unicode_emoji
 from brotherchris.cogs import utils
+from brotherchris.reactions import ReactionJob
 
 log: logging.Logger = logging.getLogger(__name__)
 
+INTENTS: discord.Intents = discord.Intents(guild_messages=True)
+
 
 class Commands(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot: commands.Bot = bot
-        self.emoji_pattern = self.get_emoji_pattern()
         self.emoji_custom_pattern = re.compile(r'<:[a-zA-Z0-9_]+:([0-9]+)>$')
+        self.config: Dict = utils.load_config('Commands', {})
+        self.jobs: Dict[int, ReactionJob] = {}
+
+        # Set while the bot is connected to the gateway, so reaction jobs can
+        # wait out a disconnection. Client.wait_until_ready cannot be used for
+        # this, since it is never cleared once the bot is first ready.
+        self.connected: asyncio.Event = asyncio.Event()
+        if bot.is_ready() and not bot.is_closed():
+            self.connected.set()
+
+        utils.watch_config('Commands', self.load_config)
+
+    def cog_unload(self):
+        utils.unwatch_config('Commands', self.load_config)
+
+        for job in self.jobs.values():
+            job.cancel()
+
+    def load_config(self):
+        self.config = utils.load_config('Commands', {})
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self.connected.set()
+
+    @commands.Cog.listener()
+    async def on_resumed(self):
+        self.connected.set()
+
+    @commands.Cog.listener()
+    async def on_disconnect(self):
+        self.connected.clear()
+
+    async def warm_up(self):
+        """Builds the set of Unicode emojis ahead of the first react."""
+        await self.bot.loop.run_in_executor(None, unicode_emoji.get_emojis)
 
     @commands.command()
     @commands.guild_only()
@@ -104,7 +143,7 @@ class Commands(commands.Cog):
             f'{ctx.author} retrieved IDs in {ctx.guild.name} '
             f'#{ctx.channel.name}.')
 
-    @commands.command()
+    @commands.group(invoke_without_command=True)
     @commands.guild_only()
     async def react(
             self,
@@ -115,27 +154,67 @@ class Commands(commands.Cog):
     ):
         await ctx.message.delete()
 
-        if user is None:
-            check = None
-        else:
-            def check(message: discord.Message) -> bool:
-                return message.author == user
-
         async def add_reactions(isCustom: bool = False):
-            async for message in utils.get_messages(ctx.channel, limit, check):
-                await message.add_reaction(emoji)
+            if ctx.channel.id in self.jobs:
+                await ctx.send(
+                    'Already reacting to messages in this channel. Use '
+                    '`react cancel` to stop.',
+                    delete_after=10
+                )
+                return
+
+            status = await ctx.send(f'Reacting with {emoji}...')
+            job = ReactionJob(
+                self.bot,
+                ctx.channel,
+                emoji,
+                self.get_message_ids(ctx.channel, limit, user, status.id),
+                self.config.get('react_concurrency', 4),
+                self.config.get('react_rate', 4),
+                self.connected
+            )
+
+            self.jobs[ctx.channel.id] = job
+            reporter = asyncio.ensure_future(self.report(job, status, limit))
+
+            try:
+                await job.run()
+            except asyncio.CancelledError:
+                if not job.cancelled:
+                    raise
+            finally:
+                del self.jobs[ctx.channel.id]
+                reporter.cancel()
+
+            outcome = 'Cancelled after reacting' if job.cancelled else 'Reacted'
+            content = f'{outcome} with {emoji} to {job.done} messages.'
+            if job.failed:
+                content += f' Failed to react to {job.failed}.'
+            if job.skipped:
+                content += f' Skipped {job.skipped} deleted messages.'
+
+            try:
+                await status.edit(content=content, delete_after=10)
+            except discord.NotFound:
+                # Someone deleted the status message.
+                pass
 
             if isCustom:
                 emoji_string = emoji
             else:
                 emoji_string = emoji.encode('unicode_escape').decode('utf-8')
 
+            # Formatted lazily, off the event loop.
             log.info(
-                f'{ctx.author} reacted with {emoji_string} to {limit} messages '
-                f'in {ctx.guild.name} #{ctx.channel.name}.'
+                '%s reacted with %s to %d messages in %s #%s.',
+                ctx.author,
+                emoji_string,
+                job.done,
+                ctx.guild.name,
+                ctx.channel.name
             )
 
-        if self.emoji_pattern.fullmatch(emoji):
+        if unicode_emoji.is_emoji(emoji):
             await add_reactions()
         else:
             match = self.emoji_custom_pattern.fullmatch(emoji)
@@ -156,26 +235,70 @@ class Commands(commands.Cog):
                     f'Unicode emoji.'
                 )
 
+    @react.command(name='cancel')
+    @commands.guild_only()
+    async def react_cancel(self, ctx: commands.Context):
+        await ctx.message.delete()
+
+        job = self.jobs.get(ctx.channel.id)
+        if job is not None:
+            job.cancel()
+            log.info(
+                f'{ctx.author} cancelled reacting in {ctx.guild.name} '
+                f'#{ctx.channel.name}.'
+            )
+
+    async def get_message_ids(
+        self,
+        channel: discord.TextChannel,
+        limit: int,
+        user: Optional[discord.User],
+        exclude: int
+    ) -> AsyncGenerator[int, None]:
+        """
+        Yields the IDs of the messages to which `react` reacts, apart from the
+        message with the ID `exclude`.
+        """
+        store = getattr(self.bot, 'message_store', None)
+
+        if store is not None:
+            author_id = None if user is None else user.id
+            msgs = await store.messages(channel, limit + 1, author_id)
+
+            for message in [m for m in msgs if m.id != exclude][:limit]:
+                yield message.id
+        else:
+            # Searches at least the 1000 most recent messages of the channel.
+            async for message in utils.get_messages(
+                channel,
+                limit,
+                lambda m: m.id != exclude,
+                author=user,
+                scan_limit=max(limit, 1000)
+            ):
+                yield message.id
+
     @staticmethod
-    def get_emoji_pattern() -> Pattern:
-        emojis = sorted(
-            unicode_codes.EMOJI_UNICODE.values(),
-            key=len,
-            reverse=True
-        )
+    async def report(job: ReactionJob, status: discord.Message, limit: int):
+        """Periodically edits `status` to show the progress of `job`."""
+        while True:
+            await asyncio.sleep(2)
 
-        pattern = (
-            u'('
-            + u'|'.join(re.escape(e.replace(u' ', u'')) for e in emojis)
-            + u')'
-        )
+            total = job.queued if job.exhausted else f'up to {limit}'
 
-        return re.compile(pattern)
+            try:
+                await status.edit(
+                    content=f'Reacting with {job.emoji}: {job.done} of '
+                            f'{total} messages done.'
+                )
+            except discord.NotFound:
+                # Someone deleted the status message.
+                return
 
     def get_custom_emoji(self, emojiID: str) -> discord.Emoji:
-        for emoji in self.bot.emojis:
-            if emoji.id == emojiID:
-                return emoji
+        emoji = self.bot.emoji_index.get(int(emojiID))
+        if emoji is not None:
+            return emoji
 
         raise discord.InvalidArgument(
             f'Argument "emojiID" ({emojiID}) does not reference a valid custom '
@@ -0,0 +1,78 @@
+import logging
+from typing import Dict
+
+import discord
+from discord.ext import commands
+
+from brotherchris.cogs import utils
+from brotherchris.store import MessageStore
+
+log: logging.Logger = logging.getLogger(__name__)
+
+# Edits and deletions arrive as raw events, so no messages need to be cached.
+INTENTS: discord.Intents = discord.Intents(guild_messages=True)
+
+
+class History(commands.Cog):
+    """
+    Keeps a local copy of channel histories up to date so other cogs need not
+    page through the API. The store is shared as `bot.message_store`.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot: commands.Bot = bot
+        self.config: Dict = utils.load_config('History', {})
+        self.store = MessageStore(utils.get_process_path(
+            bot,
+            self.config.get('path', 'History.sqlite3')
+        ))
+
+        bot.message_store = self.store
+
+        # Command invocations are stored too, so the store mirrors the channel.
+        # Those which delete themselves are removed again by the deletion
+        # event, which cannot overtake the insert, since both run in order on
+        # the store's single thread.
+        bot.router.register(self.on_message, bots=True, commands=True)
+
+    def cog_unload(self):
+        self.bot.router.unregister(self.on_message)
+        del self.bot.message_store
+        self.store.close()
+
+    async def on_message(self, msg: discord.Message):
+        await self.store.add(msg)
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        # Edits which only add embeds do not carry any content.
+        if 'content' in payload.data:
+            await self.store.edit(
+                payload.channel_id,
+                payload.message_id,
+                payload.data['content']
+            )
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(
+        self,
+        payload: discord.RawMessageDeleteEvent
+    ):
+        await self.store.delete(payload.channel_id, (payload.message_id,))
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(
+        self,
+        payload: discord.RawBulkMessageDeleteEvent
+    ):
+        await self.store.delete(payload.channel_id, payload.message_ids)
+
+    @commands.Cog.listener()
+    async def on_disconnect(self):
+        # Events may be missed while disconnected, so channels are caught up
+        # from the API the next time they are queried.
+        self.store.reset()
+
+
+def setup(bot: commands.Bot):
+    bot.add_cog(History(bot))
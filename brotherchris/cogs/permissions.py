@@ -1,19 +1,22 @@
+import asyncio
+import importlib
+import io
 import logging
-from enum import Enum
+from collections import Counter
 from typing import List, NamedTuple
 
 import discord
 from discord.ext import commands
 
+from brotherchris import permission_analysis
 from brotherchris.cogs import utils
+from brotherchris.permission_analysis import Category, GuildSnapshot
 
 log: logging.Logger = logging.getLogger(__name__)
 
-
-class Category(Enum):
-    GENERAL: int = discord.Permissions().general().value
-    TEXT: int = discord.Permissions().text().value
-    VOICE: int = discord.Permissions().voice().value
+# perms audit also needs the privileged members intent, but only requests a
+# guild's members when it runs, so the intent is left to the configuration.
+INTENTS: discord.Intents = discord.Intents(guilds=True)
 
 
 class Permission(NamedTuple):
@@ -25,14 +28,29 @@ class Permission(NamedTuple):
 class Permissions(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot: commands.Bot = bot
+        self.load_config()
+        utils.watch_config('Permissions', self.load_config)
+
+    def cog_unload(self):
+        utils.unwatch_config('Permissions', self.load_config)
+
+    def load_config(self):
         self.config: dict = utils.load_config('Permissions')
 
-    @commands.command()
+    async def warm_up(self):
+        """Imports NumPy ahead of the first audit."""
+        await self.bot.loop.run_in_executor(
+            None,
+            importlib.import_module,
+            'numpy'
+        )
+
+    @commands.group(invoke_without_command=True)
     @commands.guild_only()
     async def perms(
         self,
         ctx: commands.Context,
-        user: discord.User = None,
+        user: discord.Member = None,
         channel: discord.TextChannel = None
     ):
         if user is None:
@@ -44,7 +62,7 @@ class Permissions(commands.Cog):
         # Deletes the command message.
         await ctx.message.delete()
 
-        perms = self.get_list(ctx.channel.permissions_for(ctx.author))
+        perms = self.get_list(channel.permissions_for(user))
 
         if self.config['justify']:
             width = self.get_max_width(perms, self.config['padding'])
@@ -79,31 +97,82 @@ class Permissions(commands.Cog):
             f'in {ctx.guild.name} #{ctx.channel.name}.'
         )
 
+    @perms.command(name='audit')
+    @commands.guild_only()
+    async def perms_audit(self, ctx: commands.Context):
+        """
+        Finds members who have permissions in a channel which they cannot use
+        because they cannot see the channel.
+        """
+        await ctx.message.delete()
+
+        if not self.bot.intents.members:
+            await ctx.send(
+                'Auditing needs the members intent. Enable it with '
+                '`"intents": {"members": true}` in the Bot configuration.'
+            )
+            return
+
+        # Members are not requested at startup, so the guild's members are
+        # only loaded by the first audit.
+        if not ctx.guild.chunked:
+            await ctx.guild.chunk()
+
+        snapshot = GuildSnapshot.from_guild(ctx.guild, ctx.guild.channels)
+        anomalies = await asyncio.get_event_loop().run_in_executor(
+            None,
+            permission_analysis.find_anomalies,
+            snapshot
+        )
+
+        embed = discord.Embed()
+        embed.colour = discord.Colour(utils.get_random_colour())
+        embed.title = 'Permission Audit'
+        embed.description = (
+            f'Audited {len(snapshot.member_ids)} members in '
+            f'{len(snapshot.channels)} channels.\n'
+            f'Found {len(anomalies)} cases of members with permissions in a '
+            f'channel they cannot see.'
+        )
+
+        if not anomalies:
+            await ctx.send(embed=embed)
+        else:
+            counts = Counter(a.channel_id for a in anomalies)
+            embed.add_field(
+                name='Most Affected Channels',
+                value='\n'.join(
+                    f'<#{channel_id}> `{count}`'
+                    for channel_id, count in counts.most_common(10)
+                ),
+                inline=False
+            )
+
+            report = '\n'.join(
+                f'{ctx.guild.get_member(a.member_id)} ({a.member_id}) in '
+                f'#{ctx.guild.get_channel(a.channel_id)}: '
+                f'{", ".join(permission_analysis.get_names(a.permissions))}'
+                for a in anomalies
+            )
+            await ctx.send(
+                embed=embed,
+                file=discord.File(
+                    io.BytesIO(report.encode('utf-8')),
+                    filename='audit.txt'
+                )
+            )
+
+        log.info(
+            f'{ctx.author} audited permissions in {ctx.guild.name} and found '
+            f'{len(anomalies)} anomalies.'
+        )
+
     @staticmethod
     def get_list(perms: discord.Permissions) -> List[Permission]:
-        lst: List[Permission] = []
-
-        # Iterates through every permission. perm is the name of the
-        # permission's respective attribute in discord.Permissions.
-        for perm, value in perms:
-            # Creates a Permissions object with no bits set for the purpose of
-            # comparison.
-            p = discord.Permissions().none()
-
-            # Updates the bit that corresponds to the current permission in the
-            # loop iteration.
-            p.update(**{perm: True})
-
-            # Iterates through every permission category.
-            for cat in Category:
-                # Compares the value of the enum, which is the raw bit array
-                # field of the permission category, against the bit of the
-                # comparison object. If the bit is set in both objects, then the
-                # current category is the permission's category.
-                if cat.value & p.value != 0:
-                    lst.append(Permission(perm, value, cat))
-
-        return lst
+        return [
+            Permission(flag.name, perms.value & flag.bit != 0, flag.category)
+            for flag in permission_analysis.FLAGS
+        ]
 
     @staticmethod
     def get_string(
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+import discord
+from aiohttp import web
+from discord.ext import commands
+
+from brotherchris import metrics
+from brotherchris.bot import COMMAND_SECONDS
+from brotherchris.cogs import utils
+from brotherchris.cogs.utils import HISTORY_PAGES
+from brotherchris.render import REJECTED, RUN_SECONDS, WAIT_SECONDS
+from brotherchris.router import HANDLER_SECONDS
+
+log: logging.Logger = logging.getLogger(__name__)
+
+INTENTS: discord.Intents = discord.Intents.none()
+
+# The maximum number of characters in the value of an embed field.
+MAX_FIELD_VALUE = 1024
+
+
+def summarise(histogram: metrics.Histogram, **labels: str) -> str:
+    """Formats the count and the mean, p99 and maximum in milliseconds."""
+    count = histogram.count(**labels)
+    if not count:
+        return 'None yet'
+
+    mean = histogram.sum(**labels) / count * 1000
+    p99 = histogram.quantile(0.99, **labels) * 1000
+    maximum = histogram.max(**labels) * 1000
+
+    return (
+        f'{count} × mean {mean:.0f}ms, p99 ≤ {p99:.0f}ms, '
+        f'max {maximum:.0f}ms'
+    )
+
+
+def join_lines(lines: List[str]) -> str:
+    """
+    Joins as many of `lines` as fit into an embed field, followed by a line
+    which says how many were left out.
+    """
+    value = '\n'.join(lines)
+    if len(value) <= MAX_FIELD_VALUE:
+        return value or 'None yet'
+
+    kept = []
+    size = 0
+    for line in lines:
+        # Leaves room for the line about the rest.
+        size += len(line) + 1
+        if size > MAX_FIELD_VALUE - 32:
+            break
+
+        kept.append(line)
+
+    kept.append(f'...and {len(lines) - len(kept)} more.')
+    return '\n'.join(kept)
+
+
+class Stats(commands.Cog):
+    """
+    Samples event loop lag and exposes the bot's metrics, both through a local
+    HTTP endpoint in the Prometheus text format and the stats command.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot: commands.Bot = bot
+        self.config: Dict = utils.load_config('Stats', {})
+        self.runner: Optional[web.AppRunner] = None
+
+        metrics.gauge(
+            'brotherchris_guilds',
+            'The number of guilds the bot is in.',
+            lambda: len(self.bot.guilds)
+        )
+
+        self.sampler: asyncio.Task = self.bot.loop.create_task(
+            metrics.sample_loop_lag(self.config.get('lag_interval', 0.5))
+        )
+
+        # In a cluster, the supervisor serves the metrics of every process.
+        if (
+            self.config.get('port') is not None
+            and getattr(self.bot, 'cluster_id', None) is None
+        ):
+            self.bot.loop.create_task(self.start_server())
+
+    def cog_unload(self):
+        self.sampler.cancel()
+
+        if self.runner is not None:
+            self.bot.loop.create_task(self.runner.cleanup())
+
+    async def start_server(self):
+        """Serves the metrics at /metrics on the configured host and port."""
+        app = web.Application()
+        app.router.add_get('/metrics', self.get_metrics)
+
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+
+        host = self.config.get('host', '127.0.0.1')
+        port = self.config['port']
+
+        try:
+            await web.TCPSite(self.runner, host, port).start()
+        except OSError as e:
+            log.error(
+                f'Failed to serve metrics on {host}:{port}.\n'
+                f'{type(e).__name__}: {e}'
+            )
+            return
+
+        log.info(f'Serving metrics on http://{host}:{port}/metrics.')
+
+    @staticmethod
+    async def get_metrics(request: web.Request) -> web.Response:
+        return web.Response(
+            text=metrics.render(),
+            content_type='text/plain',
+            charset='utf-8',
+            headers={'X-Content-Type-Options': 'nosniff'}
+        )
+
+    @commands.command()
+    @commands.is_owner()
+    async def stats(self, ctx: commands.Context):
+        """Shows command latencies, event loop lag and API and render use."""
+        embed = discord.Embed()
+        embed.title = 'Stats'
+        embed.colour = discord.Colour(utils.get_random_colour())
+
+        lines = [
+            f'`{labels["command"]}`'
+            f'{" (failed)" if labels["failed"] == "true" else ""}: '
+            f'{summarise(COMMAND_SECONDS, **labels)}'
+            for labels in sorted(
+                COMMAND_SECONDS.get_labels(),
+                key=lambda labels: (labels['command'], labels['failed'])
+            )
+        ]
+        embed.add_field(
+            name='Commands',
+            value=join_lines(lines),
+            inline=False
+        )
+
+        lines = [
+            f'`{labels["handler"]}`: '
+            f'{summarise(HANDLER_SECONDS, **labels)}'
+            for labels in HANDLER_SECONDS.get_labels()
+        ]
+        embed.add_field(
+            name='Message Handlers',
+            value=join_lines(lines),
+            inline=False
+        )
+
+        embed.add_field(
+            name='Event Loop Lag',
+            value=summarise(metrics.LOOP_LAG),
+            inline=False
+        )
+        embed.add_field(
+            name='History Pages',
+            value=summarise(HISTORY_PAGES),
+            inline=False
+        )
+        embed.add_field(
+            name='Renders',
+            value=(
+                f'Waiting: {summarise(WAIT_SECONDS)}\n'
+                f'Running: {summarise(RUN_SECONDS)}\n'
+                f'Rejected: {REJECTED.get():.0f}'
+            ),
+            inline=False
+        )
+
+        await ctx.send(embed=embed)
+
+
+def setup(bot: commands.Bot):
+    bot.add_cog(Stats(bot))
@@ -1,27 +1,96 @@
-import json
-from typing import AsyncGenerator, Callable, Dict
+import os
+from typing import Any, AsyncGenerator, Callable, Dict, Optional, Union
 
 import discord
+from discord.ext import commands
 from randomcolor import RandomColor
 
+from brotherchris import metrics
+from brotherchris.config import configuration
 
-def load_config(prop: str) -> Dict:
+# The maximum number of messages Discord returns per history request.
+PAGE_SIZE = 100
+
+HISTORY_PAGES = metrics.histogram(
+    'brotherchris_history_page_seconds',
+    'How long history requests take.'
+)
+HISTORY_MESSAGES = metrics.counter(
+    'brotherchris_history_messages_total',
+    'The number of messages received from history requests.'
+)
+
+
+def load_config(prop: str, default: Dict = None) -> Dict:
     """
     Retrieves the configuration for the given property as a
     :class:`dictionary<dict>` from Configuration.json.
 
+    The file is only parsed once and after it is modified, so this is cheap
+    enough to call whenever a value is needed. Use :func:`watch_config` to be
+    notified when the property changes.
+
     Parameters
     ----------
     prop: str
         The name of the property for which to retrieve the configuration.
+    default: Dict
+        The configuration to return if the property is absent. If None, the
+        property is required.
 
     Returns
     -------
     Dict
         The configuration for the given property.
+
+    Raises
+    ------
+    KeyError
+        If the property is absent and no default is given.
     """
-    with open('Configuration.json') as file:
-        return json.load(file)[prop]
+    if default is not None and prop not in configuration:
+        return default
+
+    return configuration[prop]
+
+
+def get_process_path(bot: commands.Bot, path: str) -> str:
+    """
+    Suffixes `path` with the ID of the bot's process if it runs in a cluster,
+    so that processes do not share files which they each keep an index of.
+
+    Parameters
+    ----------
+    bot: commands.Bot
+        The bot which uses the file.
+    path: str
+        The path of the file or directory.
+
+    Returns
+    -------
+    str
+        The path for the bot's process, e.g. "History-2.sqlite3" for the
+        process with the ID 2, or `path` itself if the bot is not clustered.
+    """
+    cluster_id = getattr(bot, 'cluster_id', None)
+    if cluster_id is None:
+        return path
+
+    root, ext = os.path.splitext(os.path.normpath(path))
+    return f'{root}-{cluster_id}{ext}'
+
+
+def watch_config(prop: str, listener: Callable[[], Any]):
+    """
+    Calls `listener` whenever the configuration for the given property is
+    changed by a reload of Configuration.json.
+    """
+    configuration.add_listener(prop, listener)
+
+
+def unwatch_config(prop: str, listener: Callable[[], Any]):
+    """Stops calling a listener registered with :func:`watch_config`."""
+    configuration.remove_listener(prop, listener)
 
 
 def get_random_colour() -> int:
@@ -42,18 +111,166 @@ def get_random_colour() -> int:
     return int(RandomColor().generate()[0].lstrip('#'), 16)
 
 
+class HistoryStats:
+    """
+    Counters filled in by :func:`get_messages`.
+
+    Attributes
+    ----------
+    pages: int
+        The number of history requests made to the API.
+    scanned: int
+        The number of messages received from the API.
+    yielded: int
+        The number of messages which passed the filters and were yielded.
+    """
+
+    def __init__(self):
+        self.pages: int = 0
+        self.scanned: int = 0
+        self.yielded: int = 0
+
+
 async def get_messages(
     channel: discord.TextChannel,
-    limit: int,
-    check: Callable[[discord.Message], bool] = None
+    limit: Optional[int],
+    check: Callable[[discord.Message], bool] = None,
+    *,
+    author: discord.abc.Snowflake = None,
+    before: discord.abc.Snowflake = None,
+    after: discord.abc.Snowflake = None,
+    around: discord.abc.Snowflake = None,
+    scan_limit: int = None,
+    stats: HistoryStats = None
 ) -> AsyncGenerator[discord.Message, None]:
-    counter = 0
-    history_limit = 1000
+    """
+    Yields messages from the history of `channel` which pass the filters.
+
+    History is requested one page at a time and no more pages are requested
+    once `limit` messages have been yielded or `scan_limit` messages have been
+    received. Without filters, pages are sized so that no more than `limit`
+    messages are requested.
+
+    Parameters
+    ----------
+    channel: discord.TextChannel
+        The channel from which to retrieve messages.
+    limit: Optional[int]
+        The maximum number of messages to yield. If None, messages are yielded
+        until the history or `scan_limit` is exhausted.
+    check: Callable[[discord.Message], bool]
+        If specified, only messages for which this returns True are yielded.
+    author: discord.abc.Snowflake
+        If specified, only messages by the user with this ID are yielded.
+    before: discord.abc.Snowflake
+        If specified, only messages sent before this one are retrieved.
+    after: discord.abc.Snowflake
+        If specified, only messages sent after this one are retrieved. Unless
+        `before` is also specified, messages are yielded oldest first.
+    around: discord.abc.Snowflake
+        If specified, only the (at most 100) messages around this one are
+        retrieved. Cannot be combined with `before` or `after`.
+    scan_limit: int
+        The maximum number of messages to receive from the API. If None, only
+        `limit` bounds the search.
+    stats: HistoryStats
+        If specified, its counters are incremented as messages are retrieved.
+
+    Yields
+    ------
+    discord.Message
+        The messages which pass the filters, newest first unless only `after`
+        is specified.
+
+    Raises
+    ------
+    ValueError
+        If `around` is combined with `before` or `after`.
+    """
+    if around is not None and (before is not None or after is not None):
+        raise ValueError('around cannot be combined with before or after.')
+
+    if stats is None:
+        stats = HistoryStats()
+
+    filtered = check is not None or author is not None
+    forward = after is not None and before is None
+    cursor = after if forward else before
+
+    while limit is None or stats.yielded < limit:
+        # Only bounded, unfiltered requests know how many messages they still
+        # need.
+        if filtered or limit is None:
+            wanted = PAGE_SIZE
+        else:
+            wanted = limit - stats.yielded
+
+        if scan_limit is not None:
+            wanted = min(wanted, scan_limit - stats.scanned)
+
+        if wanted <= 0:
+            return
 
-    if limit > history_limit:
-        history_limit = limit
+        wanted = min(wanted, PAGE_SIZE)
+        if around is not None:
+            page = channel.history(limit=wanted, around=around)
+        elif forward:
+            page = channel.history(limit=wanted, after=cursor)
+        else:
+            page = channel.history(limit=wanted, before=cursor)
+
+        with HISTORY_PAGES.time():
+            messages = [m async for m in page]
+
+        HISTORY_MESSAGES.inc(len(messages))
+        stats.pages += 1
+        stats.scanned += len(messages)
+
+        for message in messages:
+            # Backwards pages are bounded by `after` here rather than by the
+            # API, which would otherwise return the oldest messages first.
+            if not forward and after is not None and message.id <= after.id:
+                return
+
+            if (
+                (author is None or message.author.id == author.id)
+                and (check is None or check(message))
+            ):
+                stats.yielded += 1
+                yield message
+
+                if stats.yielded == limit:
+                    return
+
+        # A short page means the end of the history was reached.
+        if around is not None or len(messages) < wanted:
+            return
+
+        cursor = messages[-1]
+
+
+async def add_reaction(
+    bot: discord.Client,
+    channel_id: int,
+    message_id: int,
+    emoji: Union[discord.Emoji, str]
+):
+    """
+    Adds a reaction to a message given only its ID, so that the message need
+    not be fetched first.
+
+    Parameters
+    ----------
+    bot: discord.Client
+        The client with which to add the reaction.
+    channel_id: int
+        The ID of the channel which contains the message.
+    message_id: int
+        The ID of the message to which to add the reaction.
+    emoji: Union[discord.Emoji, str]
+        A custom emoji or a Unicode emoji.
+    """
+    if isinstance(emoji, discord.Emoji):
+        emoji = f'{emoji.name}:{emoji.id}'
 
-    async for message in channel.history(limit=history_limit):
-        if (check is None or check(message)) and counter != limit:
-            counter += 1
-            yield message
+    await bot.http.add_reaction(channel_id, message_id, emoji)
@@ -1,5 +1,5 @@
 import logging
-from typing import Dict
+from typing import Dict, FrozenSet
 
 import discord
 from discord.ext import commands
@@ -8,6 +8,8 @@ from brotherchris.cogs import utils
 
 log: logging.Logger = logging.getLogger(__name__)
 
+INTENTS: discord.Intents = discord.Intents(guild_messages=True)
+
 
 class Welcome(commands.Cog):
     """
@@ -16,13 +18,30 @@ class Welcome(commands.Cog):
 
     def __init__(self, bot: commands.Bot):
         self.bot: commands.Bot = bot
-        self.config: Dict = utils.load_config('Welcome')
+        self.load_config()
+        utils.watch_config('Welcome', self.load_config)
+
+    def cog_unload(self):
+        utils.unwatch_config('Welcome', self.load_config)
+        self.bot.router.unregister(self.on_message)
+
+    def load_config(self):
+        config = utils.load_config('Welcome')
+        self.channels: FrozenSet[int] = frozenset(config['channels'])
+        self.config: Dict = config
+
+        # The welcome messages to respond to are sent by a bot.
+        self.bot.router.register(
+            self.on_message,
+            channel_ids=self.channels,
+            bots=True
+        )
 
-    @commands.Cog.listener()
     async def on_message(self, msg: discord.Message):
         """
-        Called when a :class:`message<discord.Message>` is created and sent to a
-        server.
+        Called by the :class:`router<brotherchris.router.MessageRouter>` when a
+        :class:`message<discord.Message>` is sent to one of the channels
+        specified in the configuration.
 
         Determines if the message sent is a welcome message from the Dyno bot.
         If it is, a welcome message is sent which mentions the same user the
@@ -41,23 +60,19 @@ class Welcome(commands.Cog):
         -------
         discord.Client.send_message()
         """
-        # Ignores direct messages.
-        if msg.guild is None:
-            return
-
-        # Only processes messages which come from the servers specified in the
-        # configuration.
         # Checks if the author is the Dyno bot and if the message contains
         # the welcome string specified in the configuration.
         if (
-            msg.channel.id in self.config['channels']
-            and msg.author.id == self.config['dyno_id']
+            msg.author.id == self.config['dyno_id']
             and self.config['dyno_msg'] in msg.content
         ):
             await msg.channel.send(f'Welcome {msg.mentions[0].mention}!')
+            # Formatted lazily, off the event loop.
             log.info(
-                f'Welcomed {msg.mentions[0]} in {msg.guild.name} '
-                f'#{msg.channel.name}'
+                'Welcomed %s in %s #%s',
+                msg.mentions[0],
+                msg.guild.name,
+                msg.channel.name
             )
 
 
@@ -1,41 +1,272 @@
+import asyncio
 import io
 import logging
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 import discord
 from discord.ext import commands
-from wordcloud import WordCloud as WC
 
+from brotherchris import metrics, tokens
 from brotherchris.cogs import utils
+from brotherchris.image_cache import ImageCache, make_key
+from brotherchris.render import RenderExecutor, RenderQueueFull
 
 log: logging.Logger = logging.getLogger(__name__)
 
+INTENTS: discord.Intents = discord.Intents(guild_messages=True)
+
+# The default maximum number of words in a wordcloud.WordCloud.
+MAX_WORDS = 200
+
+# Discord allows at most 10 attachments per message.
+MAX_FILES = 10
+
+# The formats in which word clouds can be encoded. Both keep transparency.
+FORMATS = ('png', 'webp')
+
+# The formats whose encoders take a quality.
+LOSSY_FORMATS = frozenset({'webp'})
+
+# The most channel and user pairs whose latest images are remembered.
+MAX_LATEST = 10000
+
+# The default number of distinct words counted for a word cloud. Far more than
+# fit in one, so that only rare words are dropped.
+VOCABULARY = 50000
+
+CACHE_LOOKUPS = metrics.counter(
+    'brotherchris_word_cloud_cache_lookups_total',
+    'The number of word cloud cache lookups, by whether they hit.'
+)
+
+
+class RenderSettings(NamedTuple):
+    width: int = 1280
+    height: int = 720
+    words: int = MAX_WORDS
+
+    # PNG or WebP.
+    format: str = 'png'
+
+    # The number of colours to which to reduce the palette of PNG images, or
+    # None to keep every colour.
+    colours: Optional[int] = None
+
+    # The quality of lossy WebP images, from 0 to 100.
+    quality: int = 90
+
+    @property
+    def extension(self) -> str:
+        return self.format.lower()
+
+
+def render(
+    frequencies: Dict[str, int],
+    colour: str,
+    settings: RenderSettings = RenderSettings()
+) -> bytes:
+    """
+    Lays out a word cloud for the given word counts and encodes it.
+
+    This is CPU-bound and is meant to be run in a worker process. The wordcloud
+    library is only imported here, so that only the worker processes pay for
+    importing it and its dependencies.
+
+    Parameters
+    ----------
+    frequencies: Dict[str, int]
+        The number of occurrences of each word.
+    colour: str
+        The background colour. None means transparent.
+    settings: RenderSettings
+        The size, number of words and encoding of the image.
+
+    Returns
+    -------
+    bytes
+        The encoded image.
+    """
+    from PIL import Image
+    from wordcloud import WordCloud as WC
+
+    word_cloud = WC(
+        width=settings.width,
+        height=settings.height,
+        max_words=settings.words,
+        background_color=colour,
+        mode='RGBA'
+    ).generate_from_frequencies(frequencies)
+    image = word_cloud.to_image()
+
+    # Only PNG images get smaller with a reduced palette.
+    if settings.colours is not None and settings.extension == 'png':
+        # Fast octree is the only method which keeps transparency.
+        image = image.quantize(settings.colours, method=Image.FASTOCTREE)
+
+    options = {}
+    if settings.extension in LOSSY_FORMATS:
+        options['quality'] = settings.quality
+
+    with io.BytesIO() as bytestream:
+        image.save(bytestream, format=settings.format.upper(), **options)
+        return bytestream.getvalue()
+
+
+def check_config(config: Dict) -> Dict:
+    """
+    Checks that the WordCloud section of the configuration can be rendered,
+    so that a mistake is reported when it is loaded rather than by every
+    render.
+
+    Raises
+    ------
+    ValueError
+        If the format is not one of :data:`FORMATS`.
+    """
+    fmt = config.get('format', 'png')
+    if not isinstance(fmt, str) or fmt.lower() not in FORMATS:
+        raise ValueError(
+            f'Unknown word cloud format {fmt!r}; expected one of '
+            f'{", ".join(FORMATS)}.'
+        )
+
+    return config
+
+
+def parse_limit(argument: str) -> Optional[int]:
+    """Converts a number of messages, or "all" for no limit."""
+    if argument.lower() == 'all':
+        return None
+
+    try:
+        limit = int(argument)
+    except ValueError:
+        raise commands.BadArgument(
+            f'The limit must be a number or "all", not "{argument}".'
+        )
+
+    if limit < 1:
+        raise commands.BadArgument('The limit must be at least 1.')
+
+    return limit
+
+
+def load_renderer():
+    """Imports the wordcloud library ahead of the first render."""
+    import wordcloud  # noqa: F401
+
 
 class WordCloud(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot: commands.Bot = bot
+        self.config: Dict = check_config(utils.load_config('WordCloud', {}))
+        self.executor = RenderExecutor(
+            self.config.get('workers', 2),
+            self.config.get('queue_size', 8)
+        )
+        directory = self.config.get('cache_directory')
+        self.cache = ImageCache(
+            self.config.get('cache_memory', 64 * 1024 ** 2),
+            directory and utils.get_process_path(bot, directory),
+            self.config.get('cache_disk', 512 * 1024 ** 2),
+            self.config.get('cache_ttl', 3600)
+        )
+
+        # The cache keys of the latest images, by channel and user ID and then
+        # by the remaining parameters. Dropped when the user sends a message.
+        self.latest: Dict[Tuple[int, int], Dict[Tuple, str]] = {}
+
+        metrics.gauge(
+            'brotherchris_render_pending',
+            'The number of render jobs waiting for a free worker.',
+            lambda: self.executor.pending
+        )
+        metrics.gauge(
+            'brotherchris_render_running',
+            'The number of render jobs being run.',
+            lambda: self.executor.running
+        )
+
+        utils.watch_config('WordCloud', self.load_config)
+
+        # Invoking wc must not make the image it asks for outdated, so
+        # command invocations are not routed here.
+        bot.router.register(self.on_message)
+
+    def cog_unload(self):
+        utils.unwatch_config('WordCloud', self.load_config)
+        self.bot.router.unregister(self.on_message)
+        self.executor.shutdown()
+
+    async def warm_up(self):
+        """
+        Starts the worker processes and has them import the wordcloud library.
+        """
+        jobs = []
+        for _ in range(self.executor.workers):
+            try:
+                jobs.append(self.executor.submit(0, 0, load_renderer))
+            except RenderQueueFull:
+                break
+
+        await asyncio.gather(*jobs)
+
+    def load_config(self):
+        self.config = check_config(utils.load_config('WordCloud', {}))
+        self.executor.resize(
+            self.config.get('workers', 2),
+            self.config.get('queue_size', 8)
+        )
 
     @commands.command(name='wc')
     @commands.guild_only()
     async def word_cloud(
         self,
         ctx: commands.Context,
-        user: discord.User = None,
-        channel: discord.TextChannel = None,
-        limit: int = 1000,
+        users: commands.Greedy[discord.User],
+        channels: commands.Greedy[discord.TextChannel],
+        limit: parse_limit = 1000,
         colour: str = None
     ):
-        if user is None:
-            user = ctx.author
+        # Duplicates are dropped, keeping the order of the arguments.
+        users = list(dict.fromkeys(users)) or [ctx.author]
+        channels = list(dict.fromkeys(channels)) or [ctx.channel]
 
-        if channel is None:
-            channel = ctx.channel
+        if len(users) > MAX_FILES:
+            await ctx.send(
+                f'Word clouds can be generated for at most {MAX_FILES} users '
+                f'at once.'
+            )
+            return
 
         await ctx.message.delete()
 
-        # Generates and posts a word cloud.
-        text = await self.get_text(channel, user, limit)
-        image = await self.generate_image(text, colour)
-        await ctx.send(file=discord.File(image, filename=f'{user}.png'))
+        if len(users) == 1 and len(channels) == 1:
+            await self.send_word_cloud(
+                ctx,
+                users[0],
+                channels[0],
+                limit,
+                colour
+            )
+        else:
+            await self.send_word_clouds(ctx, users, channels, limit, colour)
+
+    async def send_word_cloud(
+        self,
+        ctx: commands.Context,
+        user: discord.User,
+        channel: discord.TextChannel,
+        limit: Optional[int],
+        colour: str
+    ):
+        """Sends a word cloud of `user`'s messages in `channel`."""
+        # Reuses the latest image if the user has not sent messages since.
+        settings = self.get_settings()
+        params = (limit, colour, settings)
+        latest = self.latest.get((channel.id, user.id), {})
+        image = None
+        preview = None
 
         # Embed properties.
         embed: discord.Embed = discord.Embed()
@@ -44,33 +275,477 @@ class WordCloud(commands.Cog):
             f'Word cloud for {user.mention} in {channel.mention}.'
         embed.colour = discord.Colour(utils.get_random_colour())
 
-        await ctx.send(embed=embed)
+        if params in latest:
+            image = await self.cache.get(latest[params])
+
+        if image is None:
+            frequencies, newest = await self.get_frequencies(
+                channel,
+                user,
+                limit
+            )
+
+            # A word cloud cannot be laid out without any words.
+            if not frequencies:
+                await ctx.send(
+                    f'There are no messages by {user.mention} in '
+                    f'{channel.mention}.'
+                )
+                return
+
+            key = make_key(channel.id, user.id, *params, newest)
+            image = await self.cache.get(key)
+            CACHE_LOOKUPS.inc(hit=str(image is not None).lower())
+
+            if image is None:
+                try:
+                    image, preview = await self.render_progressively(
+                        ctx,
+                        frequencies,
+                        colour,
+                        settings,
+                        embed
+                    )
+                except RenderQueueFull:
+                    await self.turn_away(ctx)
+                    return
+
+                await self.cache.put(key, image)
+
+            self.remember(channel, user, params, key)
+
+        await self.send_image(ctx, image, settings, embed)
+
+        # Attachments cannot be replaced by editing, so the full image is sent
+        # before the preview is removed.
+        if preview is not None:
+            await preview.delete()
+
         log.info(
             f'{ctx.author} generated a word cloud for {user} in '
             f'{channel.guild.name} #{channel.name}.'
         )
 
+    async def send_word_clouds(
+        self,
+        ctx: commands.Context,
+        users: List[discord.User],
+        channels: List[discord.TextChannel],
+        limit: Optional[int],
+        colour: str
+    ):
+        """
+        Sends a word cloud of each of `users`' messages across all of
+        `channels`, as one message.
+        """
+        settings = self.get_settings()
+        frequencies = await self.get_batch_frequencies(channels, users, limit)
+
+        images: Dict[discord.User, bytes] = {}
+        jobs: Dict[discord.User, asyncio.Future] = {}
+        keys: Dict[discord.User, str] = {}
+
+        for user in users:
+            counts, newest = frequencies[user.id]
+            if not counts:
+                continue
+
+            keys[user] = make_key(
+                tuple(channel.id for channel in channels),
+                user.id,
+                limit,
+                colour,
+                settings,
+                newest
+            )
+            image = await self.cache.get(keys[user])
+            CACHE_LOOKUPS.inc(hit=str(image is not None).lower())
+
+            if image is not None:
+                images[user] = image
+                continue
+
+            try:
+                jobs[user] = self.generate_image(ctx, counts, colour, settings)
+            except RenderQueueFull:
+                for job in jobs.values():
+                    job.cancel()
+
+                await self.turn_away(ctx)
+                return
+
+        try:
+            results = await asyncio.gather(*jobs.values())
+        except BaseException:
+            # The renders which are still running are no use on their own.
+            for job in jobs.values():
+                job.cancel()
+            raise
+
+        for user, image in zip(jobs, results):
+            images[user] = image
+            await self.cache.put(keys[user], image)
+
+        embed: discord.Embed = discord.Embed()
+        embed.title = 'Word Clouds'
+        embed.description = (
+            f'Word clouds for {", ".join(u.mention for u in users)} in '
+            f'{", ".join(c.mention for c in channels)}.'
+        )
+        embed.colour = discord.Colour(utils.get_random_colour())
+
+        missing = [user.mention for user in users if user not in images]
+        if missing:
+            embed.add_field(name='No Messages', value=', '.join(missing))
+
+        # Ordered as the users were given.
+        files = [
+            discord.File(
+                io.BytesIO(images[user]),
+                filename=f'{user}.{settings.extension}'
+            )
+            for user in users if user in images
+        ]
+        await ctx.send(files=files or None, embed=embed)
+
+        log.info(
+            f'{ctx.author} generated word clouds for {len(users)} users in '
+            f'{len(channels)} channels of {ctx.guild.name}.'
+        )
+
     @staticmethod
-    async def generate_image(text: str, colour: str) -> bytes:
-        word_cloud = WC(
-            width=1280,
-            height=720,
-            background_color=colour,
-            mode='RGBA'
-        ).generate(text)
-
-        with io.BytesIO() as bytestream:
-            word_cloud.to_image().save(bytestream, format='PNG')
-            return bytestream.getvalue()
+    async def turn_away(ctx: commands.Context):
+        await ctx.send(
+            'Too many word clouds are being generated right now. Please try '
+            'again later.'
+        )
+        log.info(
+            f'{ctx.author} was turned away from generating a word cloud '
+            f'because the render queue is full.'
+        )
+
+    def remember(
+        self,
+        channel: discord.TextChannel,
+        user: discord.User,
+        params: Tuple,
+        key: str
+    ):
+        """
+        Records `key` as the latest image for `user` in `channel`, forgetting
+        the least recently recorded users once there are too many.
+        """
+        latest = self.latest.pop((channel.id, user.id), {})
+        latest[params] = key
+        self.latest[channel.id, user.id] = latest
+
+        while len(self.latest) > MAX_LATEST:
+            del self.latest[next(iter(self.latest))]
+
+    async def on_message(self, msg: discord.Message):
+        # New messages make the user's latest images outdated.
+        self.latest.pop((msg.channel.id, msg.author.id), None)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        # Nowhere to post the result, so pending renders are pointless.
+        self.executor.cancel(channel.guild.id, channel.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.executor.cancel(guild.id)
+
+    def get_settings(self) -> RenderSettings:
+        """Retrieves the settings of full word clouds from the config."""
+        return RenderSettings(
+            self.config.get('width', 1280),
+            self.config.get('height', 720),
+            self.config.get('words', MAX_WORDS),
+            self.config.get('format', 'png'),
+            self.config.get('colours'),
+            self.config.get('quality', 90)
+        )
+
+    def get_preview_settings(self) -> Optional[RenderSettings]:
+        """
+        Retrieves the settings of previews from the config, or None if
+        previews are disabled.
+        """
+        preview = self.config.get('preview', {})
+        if preview is None:
+            return None
+
+        return self.get_settings()._replace(
+            width=preview.get('width', 480),
+            height=preview.get('height', 270),
+            words=preview.get('words', 50)
+        )
+
+    def generate_image(
+        self,
+        ctx: commands.Context,
+        frequencies: Dict[str, int],
+        colour: str,
+        settings: RenderSettings = None
+    ) -> asyncio.Future:
+        """
+        Queues a word cloud to be rendered in the executor on behalf of the
+        invoking guild.
+
+        Returns
+        -------
+        asyncio.Future
+            A future which resolves to the encoded image. It is cancelled if
+            the invoking channel or guild is gone.
+
+        Raises
+        ------
+        RenderQueueFull
+            If too many renders are already waiting.
+        """
+        if settings is None:
+            settings = self.get_settings()
+
+        return self.executor.submit(
+            ctx.guild.id,
+            ctx.channel.id,
+            render,
+            self.get_top(frequencies, settings.words),
+            colour,
+            settings
+        )
+
+    async def render_progressively(
+        self,
+        ctx: commands.Context,
+        frequencies: Dict[str, int],
+        colour: str,
+        settings: RenderSettings,
+        embed: discord.Embed
+    ) -> Tuple[bytes, Optional[discord.Message]]:
+        """
+        Renders a word cloud, sending a small preview of the most common words
+        while the full image is rendered.
+
+        The preview is skipped if it is disabled, if the queue has no room for
+        it, or if the full image is ready first.
+
+        Returns
+        -------
+        Tuple[bytes, Optional[discord.Message]]
+            The full image and the message with the preview, if one was sent.
+
+        Raises
+        ------
+        RenderQueueFull
+            If too many renders are already waiting for the full image.
+        """
+        preview_settings = self.get_preview_settings()
+        preview = None
+
+        # Queued first, so that it is picked up first.
+        if preview_settings is not None:
+            try:
+                preview = self.generate_image(
+                    ctx,
+                    frequencies,
+                    colour,
+                    preview_settings
+                )
+            except RenderQueueFull:
+                pass
+
+        try:
+            full = self.generate_image(ctx, frequencies, colour, settings)
+        except RenderQueueFull:
+            if preview is not None:
+                preview.cancel()
+            raise
+
+        if preview is None:
+            return await full, None
+
+        msg = None
+        try:
+            await asyncio.wait(
+                (preview, full),
+                return_when=asyncio.FIRST_COMPLETED
+            )
+
+            if not full.done() and not preview.cancelled():
+                if preview.exception() is None:
+                    preview_embed = embed.copy()
+                    preview_embed.set_footer(
+                        text='Rendering the full image...'
+                    )
+                    msg = await self.send_image(
+                        ctx,
+                        preview.result(),
+                        preview_settings,
+                        preview_embed
+                    )
+                else:
+                    log.error(
+                        f'Failed to render a word cloud preview.\n'
+                        f'{type(preview.exception()).__name__}: '
+                        f'{preview.exception()}'
+                    )
+            else:
+                preview.cancel()
+        except BaseException:
+            # Neither job may hold on to a worker once nobody waits for it.
+            preview.cancel()
+            full.cancel()
+            raise
+
+        try:
+            return await full, msg
+        except BaseException:
+            if msg is not None:
+                await msg.delete()
+            raise
 
     @staticmethod
-    async def get_text(
+    async def send_image(
+        ctx: commands.Context,
+        image: bytes,
+        settings: RenderSettings,
+        embed: discord.Embed
+    ) -> discord.Message:
+        """Sends `image` inside `embed`, as one message."""
+        filename = f'word_cloud.{settings.extension}'
+        embed.set_image(url=f'attachment://{filename}')
+
+        return await ctx.send(
+            file=discord.File(io.BytesIO(image), filename=filename),
+            embed=embed
+        )
+
+    async def get_frequencies(
+        self,
         channel: discord.TextChannel,
         user: discord.User,
-        limit: int
-    ) -> str:
-        msgs = utils.get_messages(channel, limit, lambda m: m.author == user)
-        return '\n'.join([m.content async for m in msgs])
+        limit: Optional[int]
+    ) -> Tuple[Dict[str, int], Optional[int]]:
+        """
+        Counts the words in `user`'s messages and finds the ID of the newest
+        one. If `limit` is None, every message in the channel is searched.
+
+        Messages are tokenized as they arrive, so only the counts, rather than
+        the messages, are held in memory.
+        """
+        store = getattr(self.bot, 'message_store', None)
+
+        # The store only holds as much history as it has been asked for.
+        if store is not None and limit is not None:
+            return await store.frequencies(channel, limit, user.id)
+
+        # Searches at least the 1000 most recent messages of the channel.
+        msgs = utils.get_messages(
+            channel,
+            limit,
+            author=user,
+            scan_limit=None if limit is None else max(limit, 1000)
+        )
+        counter = tokens.BoundedCounter(
+            self.config.get('vocabulary', VOCABULARY)
+        )
+        newest = None
+
+        async for msg in msgs:
+            # Messages are yielded newest first.
+            if newest is None:
+                newest = msg.id
+
+            counter.update(tokens.tokenize(msg.content))
+
+        if counter.prunes:
+            log.debug(
+                f'Dropped rare words {counter.prunes} times while counting '
+                f'the words of {user} in #{channel.name}.'
+            )
+
+        return tokens.fold(counter.counts), newest
+
+    async def get_batch_frequencies(
+        self,
+        channels: List[discord.TextChannel],
+        users: List[discord.User],
+        limit: Optional[int]
+    ) -> Dict[int, Tuple[Dict[str, int], Tuple[Optional[int], ...]]]:
+        """
+        Counts the words in each user's messages across `channels`, with up to
+        `limit` messages per user from each channel.
+
+        The history of each channel is retrieved once for all of the users, and
+        several channels are retrieved concurrently.
+
+        Returns
+        -------
+        Dict[int, Tuple[Dict[str, int], Tuple[Optional[int], ...]]]
+            The number of occurrences of each word and the ID of the newest
+            counted message in each channel, by user ID.
+        """
+        store = getattr(self.bot, 'message_store', None)
+        vocabulary = self.config.get('vocabulary', VOCABULARY)
+        counters = {u.id: tokens.BoundedCounter(vocabulary) for u in users}
+        newest: Dict[Tuple[int, int], Optional[int]] = {}
+        semaphore = asyncio.Semaphore(self.config.get('concurrent_scans', 4))
+
+        async def scan(channel: discord.TextChannel):
+            if store is not None and limit is not None:
+                for user in users:
+                    counts, newest[channel.id, user.id] = \
+                        await store.frequencies(channel, limit, user.id)
+                    counters[user.id].update(counts)
+                return
+
+            # The users who still need messages from this channel.
+            remaining = {user.id: limit for user in users}
+
+            # The same messages the users' separate word clouds would search.
+            msgs = utils.get_messages(
+                channel,
+                None,
+                lambda m: m.author.id in remaining,
+                scan_limit=None if limit is None else max(limit, 1000)
+            )
+
+            async for msg in msgs:
+                # Messages are yielded newest first.
+                author = msg.author.id
+                newest.setdefault((channel.id, author), msg.id)
+                counters[author].update(tokens.tokenize(msg.content))
+
+                if limit is not None:
+                    remaining[author] -= 1
+                    if not remaining[author]:
+                        del remaining[author]
+                        if not remaining:
+                            break
+
+        async def scan_bounded(channel: discord.TextChannel):
+            async with semaphore:
+                await scan(channel)
+
+        await asyncio.gather(*(scan_bounded(c) for c in channels))
+
+        return {
+            user.id: (
+                tokens.fold(counters[user.id].counts),
+                tuple(newest.get((c.id, user.id)) for c in channels)
+            )
+            for user in users
+        }
+
+    @staticmethod
+    def get_top(frequencies: Dict[str, int], words: int) -> Dict[str, int]:
+        """
+        Keeps only the `words` most common words, which are all that can fit in
+        a word cloud, so that the rest need not be sent to the worker process.
+        """
+        top = sorted(frequencies.items(), key=lambda item: -item[1])
+        return dict(top[:words])
 
 
 def setup(bot: commands.Bot):
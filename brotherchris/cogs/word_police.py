@@ -1,15 +1,43 @@
+import asyncio
+import io
 import logging
-import re
+import math
+import os
+import time
 from itertools import groupby
-from typing import Dict, Iterator, List, Pattern, Tuple
+from typing import AsyncIterator, Dict, FrozenSet, Iterable, Iterator, List, \
+    NamedTuple, Optional, Set, Tuple
 
 import discord
 from discord.ext import commands
 
 from brotherchris.cogs import utils
+from brotherchris.matching import Matcher
+from brotherchris.scan import Report, ScannedMessage, Scanner, \
+    create_word_matcher
 
 log: logging.Logger = logging.getLogger(__name__)
 
+INTENTS: discord.Intents = discord.Intents(guild_messages=True)
+
+# The maximum number of fields in an embed.
+MAX_FIELDS = 25
+
+# The maximum number of characters in an embed's title, description and fields
+# together.
+MAX_EMBED = 6000
+
+# The most characters taken by the note about the fields which do not fit.
+NOTE_SIZE = 64
+
+# The largest file a bot may upload to a server without boosts.
+MAX_UPLOAD = 8 * 1024 ** 2
+
+
+class Suggestions(NamedTuple):
+    colour: int
+    fields: List[Tuple[str, str]]
+
 
 class WordPolice(commands.Cog):
     """
@@ -19,35 +47,50 @@ class WordPolice(commands.Cog):
 
     def __init__(self, bot: commands.Bot):
         self.bot: commands.Bot = bot
-        self.config: Dict = utils.load_config('WordPolice')
-        self.pattern = self.get_pattern(self.config['words'])
+        self.load_config()
 
-    @staticmethod
-    def get_pattern(lst: List[str]) -> Pattern:
-        """
-        Creates a regular expression :class:`Pattern` that will match any
-        :class:`string<str>` from :any:`lst`.
+        # The words each user triggered in each channel since the channel's
+        # last embed, and when each user was last triggered in each channel.
+        self.pending: Dict[int, Dict[discord.Member, Dict[str, None]]] = {}
+        self.last_triggered: Dict[Tuple[int, int], float] = {}
+        self.last_sent: Dict[int, float] = {}
+        self.timers: Dict[int, asyncio.TimerHandle] = {}
+        self.sending: Set[asyncio.Task] = set()
 
-        Parameters
-        ----------
-        lst: List[str]
-            A list of strings from which to create the pattern.
+        self.scanning: bool = False
 
-        Returns
-        -------
-        Pattern
-            The compiled regular expression pattern.
+        utils.watch_config('WordPolice', self.load_config)
+
+    def cog_unload(self):
+        utils.unwatch_config('WordPolice', self.load_config)
+        self.bot.router.unregister(self.on_message)
+
+        for timer in self.timers.values():
+            timer.cancel()
+
+        for task in self.sending:
+            task.cancel()
+
+    def load_config(self):
+        """
+        Loads the configuration and builds the matcher and suggestions for its
+        words.
         """
-        pattern: str = None
-        for string in lst:
-            if pattern is None:
-                # Adds an opening parenthesis before the first string.
-                pattern = fr'(\b{string}\b'
-            else:
-                pattern += fr'|\b{re.escape(string)}\b'
+        config = utils.load_config('WordPolice')
+        self.matcher: Matcher = create_word_matcher(config)
 
-        pattern += r')'
-        return re.compile(pattern, re.IGNORECASE)
+        self.suggestions: Dict[str, Suggestions] = {
+            word: self.get_suggestions(lst)
+            for word, lst in config['words'].items()
+        }
+        self.server_ids: FrozenSet[int] = frozenset(config['server_ids'])
+        self.config: Dict = config
+
+        self.bot.router.register(
+            self.on_message,
+            guild_ids=self.server_ids,
+            commands=True
+        )
 
     @staticmethod
     def group_by_length(lst: List[str]) -> Iterator[Tuple[int, Iterator[str]]]:
@@ -66,67 +109,328 @@ class WordPolice(commands.Cog):
             Tuples of lengths and lists of strings which are of those
             lengths.
         """
-        lst.sort(key=lambda s: (len(s), s))
-        return groupby(lst, key=len)
+        return groupby(sorted(lst, key=lambda s: (len(s), s)), key=len)
 
-    async def send_message(self, msg: discord.Message, word: str):
+    @classmethod
+    def get_suggestions(cls, lst: List[str]) -> 'Suggestions':
         """
-        Create and send an :class:`embed<discord.Embed>` which suggests
-        possible alternatives for the word which triggered the Word Police.
+        Builds the embed fields which suggest the alternatives in `lst`.
+        """
+        return Suggestions(
+            utils.get_random_colour(),
+            [
+                (f'{length} Letters', '\n'.join(group))
+                for length, group in cls.group_by_length(lst)
+            ]
+        )
+
+    def trigger(self, msg: discord.Message, words: Iterable[str]):
+        """
+        Queues suggestions for `words` in response to `msg`.
+
+        Triggers in the same channel are coalesced into one embed which is sent
+        once `coalesce` seconds have passed since the first trigger, and no
+        sooner than `channel_cooldown` seconds after the channel's previous
+        embed. A user is not triggered again in the same channel for `cooldown`
+        seconds.
 
         Parameters
         ----------
         msg: discord.Message
             The message which triggered the Word Police.
-        word: str
-            The word which triggered the Word Police.
+        words: Iterable[str]
+            The words which triggered the Word Police.
+        """
+        now = time.monotonic()
+        key = (msg.channel.id, msg.author.id)
+
+        if now - self.last_triggered.get(key, -math.inf) < \
+                self.config.get('cooldown', 30):
+            return
+
+        self.last_triggered[key] = now
+
+        pending = self.pending.get(msg.channel.id)
+        if pending is None:
+            pending = self.pending[msg.channel.id] = {}
+
+            last_sent = self.last_sent.get(msg.channel.id, -math.inf)
+            delay = max(
+                self.config.get('coalesce', 2),
+                last_sent + self.config.get('channel_cooldown', 5) - now
+            )
+            self.timers[msg.channel.id] = self.bot.loop.call_later(
+                delay,
+                self.start_sending,
+                msg.channel
+            )
+
+        pending.setdefault(msg.author, {}).update(dict.fromkeys(words))
+
+    def start_sending(self, channel: discord.TextChannel):
+        """
+        Sends the embed for `channel` in a task which is kept until it is done,
+        so that failures are logged.
+        """
+        task = asyncio.ensure_future(self.send_message(channel))
+        self.sending.add(task)
+        task.add_done_callback(lambda t: self.sent(t, channel))
+
+    def sent(self, task: asyncio.Task, channel: discord.TextChannel):
+        self.sending.discard(task)
+
+        if not task.cancelled() and task.exception() is not None:
+            e = task.exception()
+            log.error(
+                'Failed to send the word police embed in %s #%s.\n%s: %s',
+                channel.guild.name,
+                channel.name,
+                type(e).__name__,
+                e
+            )
+
+    async def send_message(self, channel: discord.TextChannel):
+        """
+        Create and send an :class:`embed<discord.Embed>` which suggests
+        possible alternatives for the words which triggered the Word Police in
+        `channel`.
+
+        Parameters
+        ----------
+        channel: discord.TextChannel
+            The channel in which the Word Police was triggered.
         """
+        pending = self.pending.pop(channel.id)
+        del self.timers[channel.id]
+        self.last_sent[channel.id] = time.monotonic()
+        self.forget_triggers()
+
+        words = list(dict.fromkeys(w for ws in pending.values() for w in ws))
+        mentions = ', '.join(author.mention for author in pending)
+
         embed: discord.Embed = discord.Embed()
         embed.title = 'Word Police'
         embed.description = \
-            f'Stop right there, {msg.author.mention}!\n' \
+            f'Stop right there, {mentions}!\n' \
             f'Perhaps you meant one of the following words instead?'
-        embed.colour = utils.get_random_colour()
         embed.set_thumbnail(url=self.config['thumbnail'])
 
-        suggestions = self.group_by_length(self.config['words'][word.lower()])
+        fields = []
+        for word in words:
+            # The suggestions may be gone if the configuration was reloaded.
+            suggestions = self.suggestions.get(word)
+            if suggestions is None:
+                continue
+
+            embed.colour = embed.colour or suggestions.colour
+            for name, value in suggestions.fields:
+                if len(words) > 1:
+                    name = f'{word}: {name}'
 
-        for length, lst in suggestions:
-            embed.add_field(name=f'{length} Letters', value='\n'.join(lst))
+                fields.append((name, value))
 
-        await msg.channel.send(embed=embed)
+        for name, value in self.fit_fields(embed, fields):
+            embed.add_field(name=name, value=value)
+
+        await channel.send(embed=embed)
+        # Formatted lazily, off the event loop.
         log.info(
-            f'{msg.author} triggered the word police in {msg.guild.name} '
-            f'#{msg.channel.name}'
+            '%s triggered the word police in %s #%s',
+            ', '.join(map(str, pending)),
+            channel.guild.name,
+            channel.name
         )
 
-    @commands.Cog.listener()
+    @staticmethod
+    def fit_fields(
+        embed: discord.Embed,
+        fields: List[Tuple[str, str]]
+    ) -> List[Tuple[str, str]]:
+        """
+        Keeps as many of `fields` as fit into `embed` within Discord's limits,
+        and if some do not, adds a field which says how many were left out.
+        """
+        size = len(embed.title) + len(embed.description)
+        if len(fields) <= MAX_FIELDS and \
+                size + sum(len(n) + len(v) for n, v in fields) <= MAX_EMBED:
+            return fields
+
+        size += NOTE_SIZE
+        kept = []
+        for name, value in fields:
+            size += len(name) + len(value)
+            if len(kept) == MAX_FIELDS - 1 or size > MAX_EMBED:
+                break
+
+            kept.append((name, value))
+
+        kept.append(('More', f'...and {len(fields) - len(kept)} more.'))
+        return kept
+
+    def forget_triggers(self):
+        """Forgets triggers and embeds which can no longer cause a cooldown."""
+        now = time.monotonic()
+
+        cutoff = now - self.config.get('cooldown', 30)
+        self.last_triggered = {
+            key: t for key, t in self.last_triggered.items() if t > cutoff
+        }
+
+        cutoff = now - self.config.get('channel_cooldown', 5)
+        self.last_sent = {
+            channel_id: t for channel_id, t in self.last_sent.items()
+            if t > cutoff
+        }
+
     async def on_message(self, msg: discord.Message):
         """
-        Called when a :class:message`<discord.Message>` is created and sent to a
-        server.
+        Called by the :class:`router<brotherchris.router.MessageRouter>` when a
+        :class:`message<discord.Message>` is sent by a user to one of the
+        servers specified in the configuration.
 
         Determines if the message sent contains words in the list of words in
-        the configuration for WordPolice. If it does, :func:`send_message` is
-        called for every unique match.
+        the configuration for WordPolice. If it does, :func:`trigger` is called
+        with every unique match.
 
         Parameters
         ----------
         msg: discord.Message
             The message the creation of which called this event.
         """
-        # Ignores direct messages.
-        if msg.author.bot or msg.guild is None:
+        matches = self.matcher.find(msg.content)
+
+        if matches:
+            words = list(dict.fromkeys(m.word for m in matches))
+
+            analytics = getattr(self.bot, 'analytics', None)
+            if analytics is not None:
+                analytics.record_trigger(
+                    msg.guild.id,
+                    msg.channel.id,
+                    msg.author.id,
+                    words
+                )
+
+            self.trigger(msg, words)
+
+    @commands.command()
+    @commands.is_owner()
+    @commands.guild_only()
+    async def scan(
+        self,
+        ctx: commands.Context,
+        channels: commands.Greedy[discord.TextChannel],
+        limit: int = None
+    ):
+        """
+        Finds the words in the history of the given channels, or of every
+        channel of the server, and sends a report of every occurrence.
+        """
+        if self.scanning:
+            await ctx.send('A scan is already running.')
             return
 
-        # Only processes messages which come from the servers specified in the
-        # configuration.
-        if msg.guild.id in self.config['server_ids']:
-            matches = re.findall(self.pattern, msg.content)
+        if not channels:
+            me = ctx.guild.me
+            channels = [
+                c for c in ctx.guild.text_channels
+                if c.permissions_for(me).read_message_history
+            ]
+
+        directory = self.config.get('scan_directory', 'scans')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(
+            directory,
+            f'{ctx.guild.id}-{int(time.time())}.jsonl'
+        )
+
+        status = await ctx.send(f'Scanning {len(channels)} channels...')
+        log.info(
+            '%s started a word police scan of %d channels in %s.',
+            ctx.author,
+            len(channels),
+            ctx.guild.name
+        )
+
+        self.scanning = True
+        scanner = Scanner(self.config, self.config.get('scan_workers'))
+        try:
+            with open(path, 'w', encoding='utf-8') as file:
+                report = Report(file)
+                await scanner.scan(self.get_history(channels, limit), report)
+                summary = await self.bot.loop.run_in_executor(
+                    None,
+                    report.finish
+                )
+        finally:
+            scanner.shutdown()
+            self.scanning = False
+
+        embed: discord.Embed = discord.Embed()
+        embed.title = 'Word Police Scan'
+        embed.description = (
+            f'Found {summary["hits"]} occurrences in {summary["messages"]} '
+            f'messages from {len(channels)} channels in '
+            f'{summary["seconds"]:.0f} seconds.'
+        )
+        embed.colour = discord.Colour(utils.get_random_colour())
+        embed.add_field(
+            name='Words',
+            value='\n'.join(
+                f'{word}: {n}' for word, n in report.words.most_common(10)
+            ) or 'None'
+        )
+        embed.add_field(
+            name='Users',
+            value='\n'.join(
+                f'<@{user_id}>: {n}'
+                for user_id, n in report.users.most_common(10)
+            ) or 'None'
+        )
+
+        report_file: Optional[discord.File] = None
+        if os.path.getsize(path) <= MAX_UPLOAD:
+            with open(path, 'rb') as file:
+                report_file = discord.File(
+                    io.BytesIO(file.read()),
+                    filename=os.path.basename(path)
+                )
+        else:
+            embed.set_footer(text=f'The full report is in {path}.')
+
+        await status.delete()
+        await ctx.send(embed=embed, file=report_file)
+        log.info(
+            'The word police scan of %s found %d occurrences; wrote %s.',
+            ctx.guild.name,
+            summary['hits'],
+            path
+        )
+
+    @staticmethod
+    async def get_history(
+        channels: List[discord.TextChannel],
+        limit: Optional[int]
+    ) -> AsyncIterator[ScannedMessage]:
+        """
+        Yields up to `limit` messages by users from each channel in turn, or
+        all of them if `limit` is None.
+        """
+        for channel in channels:
+            msgs = utils.get_messages(
+                channel,
+                limit,
+                lambda m: not m.author.bot
+            )
 
-            # Iterates through every unique match in order of appearance.
-            for match in dict.fromkeys(matches):
-                await self.send_message(msg, match)
+            async for msg in msgs:
+                yield ScannedMessage(
+                    msg.id,
+                    channel.id,
+                    msg.author.id,
+                    str(msg.author),
+                    msg.content
+                )
 
 
 def setup(bot: commands.Bot):
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+log: logging.Logger = logging.getLogger(__name__)
+
+Listener = Callable[[], Any]
+
+
+class Configuration:
+    """
+    The parsed contents of a configuration file, shared by the whole bot.
+
+    The file is parsed once and then only again when its modification time
+    changes. A reload replaces the parsed contents as a whole, so readers never
+    observe a mix of old and new values. Listeners registered for a section are
+    called after every reload which changes that section.
+
+    Parameters
+    ----------
+    path: str
+        The path of the JSON configuration file.
+    """
+
+    def __init__(self, path: str):
+        self.path: str = path
+
+        self._data: Dict[str, Dict] = {}
+        self._mtime: Optional[float] = None
+        self._listeners: Dict[str, List[Listener]] = defaultdict(list)
+
+    def __getitem__(self, section: str) -> Dict:
+        if self._mtime is None:
+            self.reload()
+
+        return self._data[section]
+
+    def __contains__(self, section: str) -> bool:
+        if self._mtime is None:
+            self.reload()
+
+        return section in self._data
+
+    def add_listener(self, section: str, listener: Listener):
+        """
+        Registers `listener` to be called without arguments whenever `section`
+        changes. Sections which are added or removed count as changed.
+        """
+        self._listeners[section].append(listener)
+
+    def remove_listener(self, section: str, listener: Listener):
+        """Unregisters a listener added with :meth:`add_listener`."""
+        self._listeners[section].remove(listener)
+
+    def reload(self) -> bool:
+        """
+        Parses the file again if it was modified since it was last parsed.
+
+        If the file cannot be read or parsed, the current contents are kept.
+        Only the very first load raises.
+
+        Returns
+        -------
+        bool
+            True if new contents were loaded.
+
+        Raises
+        ------
+        OSError
+            If the file cannot be read on the first load.
+        json.JSONDecodeError
+            If the file cannot be parsed on the first load.
+        """
+        first = self._mtime is None
+
+        try:
+            mtime = os.stat(self.path).st_mtime
+            if mtime == self._mtime:
+                return False
+
+            # Recorded up front so a broken file is only reported once.
+            self._mtime = mtime
+
+            with open(self.path) as file:
+                data = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            if first:
+                self._mtime = None
+                raise
+
+            log.error(
+                f'Failed to reload {self.path}; keeping the old one.\n'
+                f'{type(e).__name__}: {e}'
+            )
+            return False
+
+        old, self._data = self._data, data
+
+        changed = {
+            s for s in old.keys() | data.keys() if old.get(s) != data.get(s)
+        }
+        if not first and changed:
+            log.info(f'Reloaded {self.path}. Changed: {", ".join(changed)}.')
+            self._notify(changed)
+
+        return True
+
+    def _notify(self, sections: Iterable[str]):
+        for section in sections:
+            for listener in tuple(self._listeners[section]):
+                try:
+                    listener()
+                except Exception as e:
+                    log.error(
+                        f'{listener.__qualname__} failed to apply the new '
+                        f'{section} configuration.\n{type(e).__name__}: {e}'
+                    )
+
+    async def watch(self, interval: float):
+        """
+        Polls the file for modifications every `interval` seconds, forever.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            self.reload()
+
+
+configuration = Configuration('Configuration.json')
@@ -0,0 +1,81 @@
+from typing import Dict, Iterable, Optional
+
+import discord
+
+
+class EmojiIndex:
+    """
+    Looks up the custom emojis of the guilds the bot is in by ID or by name in
+    constant time.
+
+    The index has to be kept up to date by calling :meth:`add_guild` and
+    :meth:`remove_guild` as guilds and their emojis change.
+    """
+
+    def __init__(self):
+        self._ids: Dict[int, discord.Emoji] = {}
+        self._guilds: Dict[int, Dict[int, discord.Emoji]] = {}
+        self._names: Dict[str, Dict[int, discord.Emoji]] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def build(self, guilds: Iterable[discord.Guild]):
+        """Replaces the contents of the index with the emojis of `guilds`."""
+        self._ids.clear()
+        self._guilds.clear()
+        self._names.clear()
+
+        for guild in guilds:
+            self.add_guild(guild)
+
+    def add_guild(self, guild: discord.Guild):
+        """Indexes the emojis of `guild`, replacing any indexed previously."""
+        self.remove_guild(guild.id)
+
+        emojis = {emoji.id: emoji for emoji in guild.emojis}
+        self._guilds[guild.id] = emojis
+        self._ids.update(emojis)
+
+        for emoji in emojis.values():
+            self._names.setdefault(emoji.name, {})[emoji.id] = emoji
+
+    def remove_guild(self, guild_id: int):
+        """Removes the emojis of the guild with the given ID from the index."""
+        for emoji in self._guilds.pop(guild_id, {}).values():
+            del self._ids[emoji.id]
+
+            named = self._names[emoji.name]
+            del named[emoji.id]
+            if not named:
+                del self._names[emoji.name]
+
+    def get(
+        self,
+        emoji_id: int,
+        guild_id: int = None
+    ) -> Optional[discord.Emoji]:
+        """
+        Retrieves the emoji with the given ID, optionally only if it belongs to
+        the guild with the given ID.
+        """
+        if guild_id is None:
+            return self._ids.get(emoji_id)
+
+        return self._guilds.get(guild_id, {}).get(emoji_id)
+
+    def find(self, name: str, guild_id: int = None) -> Optional[discord.Emoji]:
+        """
+        Retrieves an emoji with the given name, preferring one which belongs to
+        the guild with the given ID.
+        """
+        named = self._names.get(name)
+        if not named:
+            return None
+
+        if guild_id is not None:
+            for emoji in named.values():
+                if emoji.guild_id == guild_id:
+                    return emoji
+
+        return next(iter(named.values()))
@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+log: logging.Logger = logging.getLogger(__name__)
+
+
+def make_key(*parts: Any) -> str:
+    """
+    Derives a cache key from the parameters which determine an image's content.
+    """
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+
+class ImageCache:
+    """
+    A two-tier, size-bounded LRU cache of rendered images.
+
+    Images are kept in memory and, if `directory` is specified, written to disk
+    so they survive restarts. When a tier exceeds its size, its least recently
+    used images are evicted. Images older than `ttl` seconds are never
+    returned.
+
+    Keys should be derived with :func:`make_key` from everything which
+    determines an image's content, so entries never need to be invalidated.
+
+    Parameters
+    ----------
+    max_memory: int
+        The maximum total size, in bytes, of the images kept in memory.
+    directory: Optional[str]
+        The directory in which to keep images on disk, or None to only keep
+        them in memory.
+    max_disk: int
+        The maximum total size, in bytes, of the images kept on disk.
+    ttl: float
+        The number of seconds after which an image expires.
+    """
+
+    def __init__(
+        self,
+        max_memory: int,
+        directory: Optional[str],
+        max_disk: int,
+        ttl: float
+    ):
+        self.max_memory: int = max_memory
+        self.directory: Optional[str] = directory
+        self.max_disk: int = max_disk
+        self.ttl: float = ttl
+
+        # Ordered from least to most recently used. Values are the time at
+        # which each image was created, and the image or its size on disk.
+        self._memory: Dict[str, Tuple[float, bytes]] = OrderedDict()
+        self._disk: Dict[str, Tuple[float, int]] = OrderedDict()
+        self._memory_size: int = 0
+        self._disk_size: int = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._scan()
+
+    def _scan(self):
+        """Indexes images written to disk by a previous run, oldest first."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+
+        for created, key, size in sorted(entries):
+            self._disk[key] = (created, size)
+            self._disk_size += size
+
+        self._delete(self._evict_disk())
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Retrieves the image cached under `key`, if it has not expired."""
+        now = time.time()
+
+        if key in self._memory:
+            created, image = self._memory[key]
+            if now - created < self.ttl:
+                self._memory.move_to_end(key)
+                return image
+
+            self._remove_memory(key)
+
+        if key in self._disk:
+            created, _ = self._disk[key]
+            if now - created < self.ttl:
+                self._disk.move_to_end(key)
+                image = await self._run(self._read, key)
+                if image is not None:
+                    self._put_memory(key, created, image)
+                    return image
+
+            self._remove_disk(key)
+            await self._run(self._delete, [key])
+
+        return None
+
+    async def put(self, key: str, image: bytes):
+        """Caches `image` under `key`."""
+        created = time.time()
+        self._put_memory(key, created, image)
+
+        # Images larger than the whole tier would be evicted straight away.
+        if self.directory is None or key in self._disk or \
+                len(image) > self.max_disk:
+            return
+
+        # Only indexed once written, so that a concurrent get never finds an
+        # entry whose file is partial or missing.
+        if not await self._run(self._write, key, image):
+            return
+
+        if key not in self._disk:
+            self._disk[key] = (created, len(image))
+            self._disk_size += len(image)
+            await self._run(self._delete, self._evict_disk())
+
+    @staticmethod
+    async def _run(func, *args):
+        return await asyncio.get_event_loop().run_in_executor(None, func, *args)
+
+    def _put_memory(self, key: str, created: float, image: bytes):
+        self._remove_memory(key)
+        self._memory[key] = (created, image)
+        self._memory_size += len(image)
+
+        while self._memory_size > self.max_memory:
+            self._remove_memory(next(iter(self._memory)))
+
+    def _remove_memory(self, key: str):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_size -= len(entry[1])
+
+    def _evict_disk(self) -> List[str]:
+        """
+        Removes the least recently used images from the disk index until the
+        tier fits, and returns their keys so their files can be deleted.
+        """
+        evicted = []
+        while self._disk_size > self.max_disk:
+            key = next(iter(self._disk))
+            self._remove_disk(key)
+            evicted.append(key)
+
+        return evicted
+
+    def _remove_disk(self, key: str):
+        entry = self._disk.pop(key, None)
+        if entry is not None:
+            self._disk_size -= entry[1]
+
+    def _delete(self, keys: Iterable[str]):
+        for key in keys:
+            try:
+                os.remove(os.path.join(self.directory, key))
+            except OSError:
+                pass
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self.directory, key), 'rb') as file:
+                return file.read()
+        except OSError as e:
+            log.warning(f'Failed to read cached image {key}: {e}')
+            return None
+
+    def _write(self, key: str, image: bytes) -> bool:
+        # Written under a temporary name so a partial file is never read.
+        path = os.path.join(self.directory, key)
+        try:
+            with open(f'{path}.tmp', 'wb') as file:
+                file.write(image)
+
+            os.replace(f'{path}.tmp', path)
+        except OSError as e:
+            log.warning(f'Failed to write cached image {key}: {e}')
+            return False
+
+        return True
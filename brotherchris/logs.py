@@ -0,0 +1,232 @@
+"""
+Writes log records on a background thread, so that logging never blocks the
+event loop on a slow stdout.
+
+Loggers hand records to a :class:`BoundedQueueHandler`, which only puts them on
+a queue; a :class:`logging.handlers.QueueListener` formats and writes them on
+its own thread. If the writer falls behind far enough for the queue to fill
+up, further records are dropped and counted rather than waited for.
+
+Records are formatted by the writer thread, so the message of %-style log
+calls is only built there. Calls in busy handlers should prefer that style over
+f-strings. Arguments other than strings and numbers are still converted to
+strings when they are logged, since the event loop may change them meanwhile.
+"""
+import atexit
+import datetime
+import json
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from brotherchris import metrics
+
+log: logging.Logger = logging.getLogger(__name__)
+
+FORMAT = '%(asctime)s - [%(levelname)s] %(name)s: %(message)s'
+
+DROPPED = metrics.counter(
+    'brotherchris_log_records_dropped_total',
+    'The number of log records dropped because the log queue was full.'
+)
+
+# Arguments of log calls which cannot change before they are formatted.
+PLAIN = (str, int, float, type(None))
+
+_listener: Optional[QueueListener] = None
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats each record as a JSON object on a single line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.datetime.fromtimestamp(
+                record.created,
+                datetime.timezone.utc
+            ).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.processName,
+            'message': record.getMessage()
+        }
+
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Puts records on a queue without ever waiting, dropping them if the queue
+    is full.
+
+    The number of dropped records is logged once there is room again.
+
+    Parameters
+    ----------
+    records: queue.Queue
+        The queue on which to put records. It may be a
+        :class:`multiprocessing.Queue` created with a maximum size.
+    capacity: Optional[int]
+        The maximum number of records waiting in the queue. If None, only the
+        queue's own maximum size applies.
+    lazy: bool
+        If True, records are put on the queue as they are and formatted by the
+        listener. Otherwise, they are formatted first, as records sent to
+        another process must be.
+    """
+
+    def __init__(
+        self,
+        records: queue.Queue,
+        capacity: Optional[int] = None,
+        lazy: bool = True
+    ):
+        super().__init__(records)
+        self.capacity: Optional[int] = capacity
+        self.lazy: bool = lazy
+        self.dropped: int = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if not self.lazy:
+            return super().prepare(record)
+
+        # Other arguments, such as discord.py models, may be changed by the
+        # event loop while the writer thread converts them, so they are
+        # converted here. Formatting itself is still left to the writer.
+        if isinstance(record.args, dict):
+            record.args = {
+                key: value if isinstance(value, PLAIN) else str(value)
+                for key, value in record.args.items()
+            }
+        elif record.args:
+            record.args = tuple(
+                arg if isinstance(arg, PLAIN) else str(arg)
+                for arg in record.args
+            )
+
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.put(record)
+        except queue.Full:
+            self.dropped += 1
+            DROPPED.inc()
+            return
+
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            try:
+                self.put(self.prepare(logging.LogRecord(
+                    log.name,
+                    logging.WARNING,
+                    __file__,
+                    0,
+                    'Dropped %d log records because the log queue was full.',
+                    (dropped,),
+                    None
+                )))
+            except queue.Full:
+                self.dropped += dropped
+
+    def put(self, record: logging.LogRecord):
+        if self.capacity is not None and self.queue.qsize() >= self.capacity:
+            raise queue.Full
+
+        self.queue.put_nowait(record)
+
+
+def configure(config: Dict = None, fmt: str = FORMAT):
+    """
+    Writes the records of every logger to stdout on a background thread.
+
+    Calling this again replaces the previous configuration, once the records
+    queued under it are written.
+
+    Parameters
+    ----------
+    config: Dict
+        The Logging section of the configuration. If None, the defaults.
+    fmt: str
+        The format of records, unless they are written as JSON.
+    """
+    global _listener
+
+    if config is None:
+        config = {}
+
+    output = logging.StreamHandler(stream=sys.stdout)
+    if config.get('json', False):
+        output.setFormatter(JSONFormatter())
+    else:
+        output.setFormatter(logging.Formatter(fmt))
+
+    records = queue.Queue()
+    handler = BoundedQueueHandler(records, config.get('queue_size', 10000))
+
+    root = logging.getLogger()
+    root.setLevel(config.get('level', 'INFO'))
+    root.handlers = [handler]
+
+    stop()
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+
+
+def forward(records: queue.Queue, config: Dict = None):
+    """
+    Sends the records of every logger to `records` instead of writing them,
+    for another process to write.
+
+    Parameters
+    ----------
+    records: queue.Queue
+        A :class:`multiprocessing.Queue` read by the other process.
+    config: Dict
+        The Logging section of the configuration. If None, the defaults.
+    """
+    if config is None:
+        config = {}
+
+    root = logging.getLogger()
+    root.setLevel(config.get('level', 'INFO'))
+    root.handlers = [BoundedQueueHandler(records, lazy=False)]
+    stop()
+
+
+def reset():
+    """
+    Writes the records of every logger straight to stdout.
+
+    Meant for worker processes forked from a process which called
+    :func:`configure`. They inherit its queue handler but not the thread which
+    writes the queue, so their records would otherwise be lost.
+    """
+    global _listener
+
+    # The listener's thread only exists in the parent, so it must not be
+    # stopped from here.
+    _listener = None
+
+    output = logging.StreamHandler(stream=sys.stdout)
+    output.setFormatter(logging.Formatter(FORMAT))
+    logging.getLogger().handlers = [output]
+
+
+def stop():
+    """Writes the queued records and stops the background thread."""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop)
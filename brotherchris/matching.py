@@ -0,0 +1,212 @@
+import re
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Pattern, Type
+
+
+class Match(NamedTuple):
+    word: str
+    start: int
+    end: int
+
+
+def is_word_char(char: str) -> bool:
+    """Returns True if `char` is matched by `\\w` in a Unicode pattern."""
+    return char.isalnum() or char == '_'
+
+
+def is_boundary(text: str, index: int) -> bool:
+    """Returns True if `\\b` would match at `index` in `text`."""
+    before = index > 0 and is_word_char(text[index - 1])
+    after = index < len(text) and is_word_char(text[index])
+    return before != after
+
+
+class Matcher(ABC):
+    """
+    Finds whole-word, case-insensitive occurrences of a fixed set of words.
+
+    Parameters
+    ----------
+    words: Iterable[str]
+        The words to find.
+    """
+
+    def __init__(self, words: Iterable[str]):
+        # Maps the lowercase form of each word back to the word as given.
+        self.words: Dict[str, str] = {w.lower(): w for w in words}
+
+    @abstractmethod
+    def find(self, text: str) -> List[Match]:
+        """
+        Finds non-overlapping occurrences of the words in `text`.
+
+        Parameters
+        ----------
+        text: str
+            The text to search.
+
+        Returns
+        -------
+        List[Match]
+            The occurrences in order of appearance. Each match's `word` is the
+            word as it was given rather than as it appears in `text`.
+        """
+
+
+class RegexMatcher(Matcher):
+    """
+    A :class:`Matcher` which uses a single regular expression alternation.
+
+    Its cost grows with the number of words, since every alternative is tried at
+    every position.
+    """
+
+    def __init__(self, words: Iterable[str]):
+        super().__init__(words)
+        self.pattern: Pattern = self.get_pattern(self.words)
+
+    @staticmethod
+    def get_pattern(lst: Iterable[str]) -> Pattern:
+        """
+        Creates a regular expression :class:`Pattern` that will match any
+        :class:`string<str>` from :any:`lst`.
+
+        Parameters
+        ----------
+        lst: Iterable[str]
+            The strings from which to create the pattern.
+
+        Returns
+        -------
+        Pattern
+            The compiled regular expression pattern.
+        """
+        pattern = '|'.join(fr'\b{re.escape(string)}\b' for string in lst)
+
+        # An empty alternation would match everywhere.
+        if not pattern:
+            pattern = '(?!)'
+
+        return re.compile(f'({pattern})', re.IGNORECASE)
+
+    def find(self, text: str) -> List[Match]:
+        return [
+            Match(self.words[m.group().lower()], m.start(), m.end())
+            for m in self.pattern.finditer(text)
+        ]
+
+
+class AhoCorasickMatcher(Matcher):
+    """
+    A :class:`Matcher` backed by an Aho-Corasick automaton.
+
+    The text is scanned once, one character at a time, regardless of the
+    number of words. Where occurrences overlap, the leftmost and then the
+    longest one is kept.
+    """
+
+    def __init__(self, words: Iterable[str]):
+        super().__init__(words)
+
+        # State 0 is the root. Each state has its transitions, a failure link
+        # and the words which end at it.
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+
+        for word in self.words:
+            self._add(word)
+
+        self._link()
+
+    def _add(self, word: str):
+        state = 0
+        for char in word:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+
+            state = next_state
+
+        self._out[state].append(word)
+
+    def _link(self):
+        """Computes failure links breadth-first."""
+        queue = deque(self._goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._out[next_state] += self._out[self._fail[next_state]]
+
+    def find(self, text: str) -> List[Match]:
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+
+        candidates = []
+        state = 0
+
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # Some characters have a lowercase form longer than one character.
+            # They are compared as is so that offsets line up with `text`.
+            lowered = [c if len(c.lower()) != 1 else c.lower() for c in text]
+
+        for index, lower in enumerate(lowered):
+            while state and lower not in goto[state]:
+                state = fail[state]
+
+            state = goto[state].get(lower, 0)
+
+            for word in out[state]:
+                start = index + 1 - len(word)
+                if is_boundary(text, start) and is_boundary(text, index + 1):
+                    candidates.append(Match(self.words[word], start, index + 1))
+
+        candidates.sort(key=lambda m: (m.start, -m.end))
+
+        matches = []
+        end = 0
+        for match in candidates:
+            if match.start >= end:
+                matches.append(match)
+                end = match.end
+
+        return matches
+
+
+MATCHERS: Dict[str, Type[Matcher]] = {
+    'aho-corasick': AhoCorasickMatcher,
+    'regex': RegexMatcher,
+}
+
+
+def create_matcher(name: str, words: Iterable[str]) -> Matcher:
+    """
+    Creates the :class:`Matcher` registered under `name` for `words`.
+
+    Raises
+    ------
+    ValueError
+        If no matcher is registered under `name`.
+    """
+    if name not in MATCHERS:
+        raise ValueError(
+            f'Unknown matcher {name!r}; expected one of {", ".join(MATCHERS)}.'
+        )
+
+    return MATCHERS[name](words)
@@ -0,0 +1,139 @@
+"""
+Works out what the bot needs to cache from the extensions it loads.
+
+Every extension module may declare the gateway intents its cogs need as
+`INTENTS` and, if they look messages up in the client's message cache, how many
+messages they need cached as `MAX_MESSAGES`. Anything not declared by any
+extension is neither received nor cached.
+"""
+import logging
+import os
+from types import ModuleType
+from typing import Dict, Iterable, NamedTuple, Optional
+
+import discord
+
+log: logging.Logger = logging.getLogger(__name__)
+
+# Needed by the bot itself: guilds and their channels and roles for commands,
+# emojis for the emoji index, and messages to receive commands.
+BASE_INTENTS: discord.Intents = discord.Intents(
+    guilds=True,
+    emojis=True,
+    guild_messages=True,
+    dm_messages=True
+)
+
+
+class CacheProfile(NamedTuple):
+    intents: discord.Intents
+    member_cache_flags: discord.MemberCacheFlags
+    max_messages: Optional[int]
+
+    @classmethod
+    def from_extensions(
+        cls,
+        modules: Iterable[ModuleType],
+        config: Dict
+    ) -> 'CacheProfile':
+        """
+        Combines what the extension `modules` declare they need.
+
+        Extensions which declare nothing get discord.py's default intents.
+        The `intents` and `max_messages` keys of the Bot configuration take
+        precedence over the declarations.
+
+        Parameters
+        ----------
+        modules: Iterable[ModuleType]
+            The imported extension modules.
+        config: Dict
+            The configuration of the bot.
+
+        Returns
+        -------
+        CacheProfile
+            The caching the extensions need.
+        """
+        intents = discord.Intents.none()
+        add_intents(intents, BASE_INTENTS)
+        max_messages = None
+
+        for module in modules:
+            declared = getattr(module, 'INTENTS', None)
+            if declared is None:
+                log.warning(
+                    f'{module.__name__} does not declare its intents; assuming '
+                    f'it needs the default ones.'
+                )
+                declared = discord.Intents.default()
+
+            add_intents(intents, declared)
+
+            wanted = getattr(module, 'MAX_MESSAGES', None)
+            if wanted is not None:
+                max_messages = max(max_messages or 0, wanted)
+
+        for name, value in config.get('intents', {}).items():
+            setattr(intents, name, value)
+
+        max_messages = config.get('max_messages', max_messages)
+
+        return cls(
+            intents,
+            discord.MemberCacheFlags.from_intents(intents),
+            max_messages
+        )
+
+    def describe(self) -> str:
+        enabled = ', '.join(name for name, value in self.intents if value)
+        members = ', '.join(
+            name for name, value in self.member_cache_flags if value
+        )
+        return (
+            f'Intents: {enabled}. Member cache: {members or "none"}. '
+            f'Message cache: {self.max_messages or "disabled"}.'
+        )
+
+
+def add_intents(intents: discord.Intents, other: discord.Intents):
+    """Enables the intents enabled in `other` in `intents`."""
+    for name, value in other:
+        if value:
+            setattr(intents, name, True)
+
+
+def get_rss() -> Optional[int]:
+    """Retrieves the resident set size in bytes, if the OS reports it."""
+    try:
+        with open('/proc/self/statm') as file:
+            pages = int(file.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+
+    return pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def get_cache_sizes(client: discord.Client) -> Dict[str, int]:
+    """Counts the objects in the client's caches."""
+    return {
+        'guilds': len(client.guilds),
+        'channels': sum(len(guild.channels) for guild in client.guilds),
+        'roles': sum(len(guild.roles) for guild in client.guilds),
+        'members': sum(len(guild.members) for guild in client.guilds),
+        'users': len(client.users),
+        'emojis': len(client.emojis),
+        'messages': len(client.cached_messages)
+    }
+
+
+def describe_cache_sizes(client: discord.Client) -> str:
+    sizes = ', '.join(
+        f'{count} {name}' for name, count in get_cache_sizes(client).items()
+    )
+
+    rss = get_rss()
+    if rss is not None:
+        sizes += f'; RSS {rss / 1024 ** 2:.1f} MiB'
+
+    return f'Cached {sizes}.'
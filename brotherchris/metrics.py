@@ -0,0 +1,345 @@
+"""
+Counters, gauges and histograms which the bot keeps about itself.
+
+Metrics are created with :func:`counter`, :func:`gauge` and :func:`histogram`
+at module level wherever they are recorded, and :func:`render` exposes all of
+them in the Prometheus text format.
+"""
+import asyncio
+import logging
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+log: logging.Logger = logging.getLogger(__name__)
+
+# Seconds. Spans quick API calls to slow renders and reaction jobs.
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def get_labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+
+    pairs = ','.join(
+        f'{name}="{escape(value)}"' for name, value in labels
+    )
+    return f'{{{pairs}}}'
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+
+    return repr(float(value))
+
+
+class Metric:
+    """A named family of values, one per combination of labels."""
+    type: str = 'untyped'
+
+    def __init__(self, name: str, documentation: str):
+        self.name: str = name
+        self.documentation: str = documentation
+
+    def samples(self) -> Iterator[Tuple[str, Labels, float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type}'
+        ]
+        lines.extend(
+            f'{name}{format_labels(labels)} {format_value(value)}'
+            for name, labels, value in self.samples()
+        )
+        return lines
+
+
+class Counter(Metric):
+    """A value which only increases."""
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = get_labels(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(get_labels(labels), 0)
+
+    def samples(self) -> Iterator[Tuple[str, Labels, float]]:
+        for labels, value in self._values.items():
+            yield self.name, labels, value
+
+
+class Gauge(Metric):
+    """
+    A value which can go up and down. If `function` is specified, it is called
+    for the value whenever the gauge is read.
+    """
+    type = 'gauge'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        function: Optional[Callable[[], float]] = None
+    ):
+        super().__init__(name, documentation)
+        self.function: Optional[Callable[[], float]] = function
+        self._values: Dict[Labels, float] = {}
+
+    def set(self, value: float, **labels: str):
+        self._values[get_labels(labels)] = value
+
+    def get(self, **labels: str) -> float:
+        if self.function is not None:
+            return self.function()
+
+        return self._values.get(get_labels(labels), 0)
+
+    def samples(self) -> Iterator[Tuple[str, Labels, float]]:
+        if self.function is not None:
+            yield self.name, (), self.function()
+            return
+
+        for labels, value in self._values.items():
+            yield self.name, labels, value
+
+
+class Histogram(Metric):
+    """
+    Counts observations in cumulative buckets and keeps their sum, from which
+    averages and approximate quantiles can be derived.
+    """
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation)
+        self.buckets: Tuple[float, ...] = (*sorted(buckets), math.inf)
+
+        # Per label combination: the count of each bucket, not cumulative,
+        # the sum and the maximum.
+        self._values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = get_labels(labels)
+        if key not in self._values:
+            self._values[key] = ([0] * len(self.buckets), [0.0, 0.0])
+
+        counts, totals = self._values[key]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+
+        totals[0] += value
+        totals[1] = max(totals[1], value)
+
+    @contextmanager
+    def time(self, **labels: str):
+        """Observes how many seconds the body of a with statement takes."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def get_labels(self) -> List[Dict[str, str]]:
+        """Lists the label combinations which have been observed."""
+        return [dict(labels) for labels in self._values]
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(get_labels(labels))
+        return sum(entry[0]) if entry else 0
+
+    def sum(self, **labels: str) -> float:
+        entry = self._values.get(get_labels(labels))
+        return entry[1][0] if entry else 0
+
+    def max(self, **labels: str) -> float:
+        entry = self._values.get(get_labels(labels))
+        return entry[1][1] if entry else 0
+
+    def quantile(self, q: float, **labels: str) -> float:
+        """
+        Approximates the `q` quantile as the upper bound of the bucket it falls
+        in, or the maximum if that is lower.
+        """
+        entry = self._values.get(get_labels(labels))
+        if not entry:
+            return 0
+
+        counts, (_, maximum) = entry
+        rank = q * sum(counts)
+        seen = 0
+        for bound, count in zip(self.buckets, counts):
+            seen += count
+            if seen >= rank and count:
+                return min(bound, maximum)
+
+        return maximum
+
+    def samples(self) -> Iterator[Tuple[str, Labels, float]]:
+        for labels, (counts, (total, _)) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = (*labels, ('le', format_value(bound)))
+                yield f'{self.name}_bucket', le, cumulative
+
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, cumulative
+
+
+_metrics: Dict[str, Metric] = {}
+
+
+def _register(cls, name: str, *args, **kwargs) -> Metric:
+    # Reloading an extension recreates its metrics, which should carry on
+    # from where they were.
+    metric = _metrics.get(name)
+    if metric is None:
+        metric = _metrics[name] = cls(name, *args, **kwargs)
+    elif not isinstance(metric, cls):
+        raise ValueError(f'{name} is already registered as a {metric.type}.')
+
+    return metric
+
+
+def counter(name: str, documentation: str) -> Counter:
+    """Retrieves the counter named `name`, creating it if necessary."""
+    return _register(Counter, name, documentation)
+
+
+def gauge(
+    name: str,
+    documentation: str,
+    function: Optional[Callable[[], float]] = None
+) -> Gauge:
+    """
+    Retrieves the gauge named `name`, creating it if necessary. `function`
+    replaces the gauge's previous function, if any.
+    """
+    metric = _register(Gauge, name, documentation)
+    if function is not None:
+        metric.function = function
+
+    return metric
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    buckets: Sequence[float] = DEFAULT_BUCKETS
+) -> Histogram:
+    """Retrieves the histogram named `name`, creating it if necessary."""
+    return _register(Histogram, name, documentation, buckets)
+
+
+def render() -> str:
+    """Formats every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics.values():
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            # A broken gauge function must not hide every other metric.
+            log.error(
+                f'Failed to render metric {metric.name}.\n'
+                f'{type(e).__name__}: {e}'
+            )
+
+    return '\n'.join(lines) + '\n'
+
+
+def merge(renders: Dict[str, str], label: str) -> str:
+    """
+    Merges the output of :func:`render` from several processes into one
+    exposition, distinguishing their samples by the label `label`.
+
+    Parameters
+    ----------
+    renders: Dict[str, str]
+        The output of each process, by the value to give its samples' label.
+    label: str
+        The name of the label.
+
+    Returns
+    -------
+    str
+        The merged exposition, with the samples of each metric together.
+    """
+    headers: Dict[str, List[str]] = {}
+    samples: Dict[str, List[str]] = {}
+
+    for value, text in renders.items():
+        family = None
+        pair = f'{label}="{escape(value)}"'
+
+        for line in text.splitlines():
+            if line.startswith('#'):
+                _, _, family, *_ = line.split(' ', 3)
+                if len(headers.setdefault(family, [])) < 2:
+                    headers[family].append(line)
+                samples.setdefault(family, [])
+            elif line and family is not None:
+                series, _, sample = line.rpartition(' ')
+                name, brace, labels = series.partition('{')
+                labels = f'{pair},{labels}' if brace else f'{pair}}}'
+                samples[family].append(f'{name}{{{labels} {sample}')
+
+    lines = []
+    for family, header in headers.items():
+        lines.extend(header)
+        lines.extend(samples[family])
+
+    return '\n'.join(lines) + '\n'
+
+
+LOOP_LAG = histogram(
+    'brotherchris_event_loop_lag_seconds',
+    'How late the event loop woke up a sleeping task.',
+    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
+
+async def sample_loop_lag(interval: float):
+    """
+    Measures forever how much later than scheduled a sleep of `interval`
+    seconds wakes up. Lag means a callback blocked the event loop.
+    """
+    loop = asyncio.get_event_loop()
+
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        LOOP_LAG.observe(lag)
+
+        if lag > 1:
+            log.warning(f'The event loop was blocked for {lag:.2f}s.')
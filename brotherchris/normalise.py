@@ -0,0 +1,299 @@
+"""
+Reduces text to a canonical form before it is matched against words, so that
+one plain spelling of a word also finds the variants people write to evade it.
+
+Each character is lowercased, stripped of accents and compatibility forms such
+as full-width letters, and mapped from lookalikes in other scripts and from
+leetspeak to a Latin letter. Invisible characters are dropped, and runs of
+three or more of the same letter are shortened to two. For example, "B00k",
+"bооk" with Cyrillic Os, "b ook" with a zero-width space, and "boooook"
+all become "book". Words must be canonicalised the same way to be found.
+
+Doubled letters are kept, since collapsing them to one would make ordinary
+words match others, such as "as" matching "ass" or "god" matching "good".
+Stretched letters in words without a double, such as "shiiiit", are caught
+by also matching with every run shortened to one letter, but only where each
+run either has the same length as in the word or was stretched to three or
+more letters.
+"""
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from brotherchris.matching import Match, Matcher, create_matcher
+
+# Characters which render as nothing, or only affect how their neighbours
+# render.
+INVISIBLE = (
+    # Soft hyphen, combining grapheme joiner and Arabic letter mark.
+    '\u00ad\u034f\u061c'
+    # Hangul and Khmer fillers, and Mongolian variation selectors.
+    '\u115f\u1160\u17b4\u17b5\u180b\u180c\u180d\u180e\u3164\uffa0'
+    # Zero-width spaces and joiners, and directional marks.
+    '\u200b\u200c\u200d\u200e\u200f\u202a\u202b\u202c\u202d\u202e'
+    '\u2060\u2061\u2062\u2063\u2064\u2066\u2067\u2068\u2069\ufeff'
+    # Variation selectors, such as the one which requests emoji style.
+    + ''.join(map(chr, range(0xfe00, 0xfe10)))
+)
+
+# Letters of other scripts which look like Latin letters. Only lowercase forms
+# are needed, since characters are lowercased first.
+CONFUSABLES = str.maketrans({
+    # Cyrillic.
+    'а': 'a', 'в': 'b', 'г': 'r', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'и': 'u', 'к': 'k', 'м': 'm', 'н': 'h', 'о': 'o', 'п': 'n', 'р': 'p',
+    'с': 'c', 'т': 't', 'у': 'y', 'х': 'x', 'ь': 'b', 'ѕ': 's', 'і': 'i',
+    'ї': 'i', 'ј': 'j', 'ԁ': 'd', 'ԛ': 'q', 'ԝ': 'w', 'һ': 'h', 'ӏ': 'l',
+    # Greek.
+    'α': 'a', 'β': 'b', 'γ': 'y', 'ε': 'e', 'η': 'n', 'ι': 'i', 'κ': 'k',
+    'μ': 'u', 'ν': 'v', 'ο': 'o', 'ρ': 'p', 'σ': 'o', 'ς': 's', 'τ': 't',
+    'υ': 'u', 'χ': 'x', 'ω': 'w',
+    # Latin letters which do not decompose into a base letter.
+    'ı': 'i', 'ȷ': 'j', 'ł': 'l', 'ø': 'o', 'đ': 'd', 'ħ': 'h', 'ŧ': 't',
+    'ɑ': 'a', 'ɡ': 'g', 'ɩ': 'i', 'ʀ': 'r', 'ʏ': 'y', 'ᴀ': 'a', 'ᴄ': 'c',
+    'ᴅ': 'd', 'ᴇ': 'e', 'ᴋ': 'k', 'ᴍ': 'm', 'ᴏ': 'o', 'ᴘ': 'p', 'ᴛ': 't',
+    'ᴜ': 'u', 'ᴠ': 'v', 'ᴡ': 'w', 'ᴢ': 'z',
+})
+
+# Digits and symbols used as letters. Punctuation which commonly ends a word,
+# such as "!", is left alone so that it still separates words.
+LEET = str.maketrans({
+    '0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '8': 'b',
+    '9': 'g', '@': 'a', '$': 's', '€': 'e', '£': 'l', '¢': 'c',
+})
+
+# Characters both preceded and followed by the same character, i.e. all but
+# the first and last characters of each run of three or more, such as "oooo".
+# Faster to remove than to substitute whole runs.
+RUN_PATTERN = re.compile(r'(?<=(.))\1(?=\1)', re.DOTALL)
+
+# Characters preceded by the same character, i.e. all but the first character
+# of each run.
+REPEAT_PATTERN = re.compile(r'(?<=(.))\1', re.DOTALL)
+
+# Each run of the same character.
+RUNS_PATTERN = re.compile(r'(.)\1*', re.DOTALL)
+
+# The canonical form of each character seen so far, both by character and, as
+# a table for str.translate, by code point. Invisible characters map to ''.
+_canonical: Dict[str, str] = dict.fromkeys(INVISIBLE, '')
+_table: Dict[int, str] = {ord(char): '' for char in INVISIBLE}
+
+
+def canonicalise_char(char: str) -> str:
+    """Retrieves the canonical form of a single character."""
+    canonical = _canonical.get(char)
+
+    if canonical is None:
+        decomposed = unicodedata.normalize('NFKD', char.casefold())
+        canonical = ''.join(
+            c for c in decomposed if not unicodedata.combining(c)
+        ).translate(CONFUSABLES).translate(LEET)
+        _canonical[char] = canonical
+        _table[ord(char)] = canonical
+
+    return canonical
+
+
+# Latin characters, which most messages consist of, are known from the start.
+for code in range(0x250):
+    canonicalise_char(chr(code))
+
+
+def canonicalise(text: str) -> str:
+    """
+    Reduces `text` to its canonical form.
+
+    Parameters
+    ----------
+    text: str
+        The text to canonicalise.
+
+    Returns
+    -------
+    str
+        The canonical form.
+    """
+    return RUN_PATTERN.sub('', translate(text))
+
+
+def translate(text: str) -> str:
+    """Canonicalises each character of `text`, keeping every run whole."""
+    # Usually none, so the whole text is translated at once below.
+    for char in set(text).difference(_canonical):
+        canonicalise_char(char)
+
+    return text.translate(_table)
+
+
+def get_runs(text: str) -> List[int]:
+    """Returns the length of each run of the same character in `text`."""
+    return [len(m.group()) for m in RUNS_PATTERN.finditer(text)]
+
+
+def is_stretched(runs: List[int], word_runs: List[int]) -> bool:
+    """
+    Returns True if text with the lengths of runs `runs` is a word with the
+    lengths of runs `word_runs`, with some letters stretched.
+    """
+    return all(n == m or n > 2 for n, m in zip(runs, word_runs))
+
+
+class Normalised:
+    """
+    The canonical form of a text, as produced by :func:`canonicalise`, which
+    can map its slices back to the original text.
+
+    Parameters
+    ----------
+    original: str
+        The text to normalise.
+    """
+
+    def __init__(self, original: str):
+        self.original: str = original
+        self.translated: str = translate(original)
+        self.text: str = RUN_PATTERN.sub('', self.translated)
+
+        # Only texts with a stretched letter can match in their single letter
+        # form where they do not in their canonical form.
+        self.stretched: bool = len(self.text) != len(self.translated)
+
+        # The slice of the original text from which each character of `text`
+        # came, as separate lists of starts and ends. Only worked out if
+        # needed, since most texts do not contain any of the words.
+        self._starts: Optional[List[int]] = None
+        self._ends: Optional[List[int]] = None
+
+    def span(self, start: int, end: int) -> Tuple[int, int]:
+        """
+        Maps the slice `start:end` of the canonical text to the slice of the
+        original text from which it came. The last character of a shortened
+        run maps to the rest of the run.
+        """
+        if self._starts is None:
+            self._map()
+
+        return self._starts[start], self._ends[end - 1]
+
+    def single(self) -> Tuple[str, List[Tuple[int, int]]]:
+        """
+        Shortens every run of the canonical text to a single letter.
+
+        Returns
+        -------
+        Tuple[str, List[Tuple[int, int]]]
+            The shortened text, and for each of its letters, the length of
+            its run and the end of the run in the original text.
+        """
+        ends = []
+        for index, char in enumerate(self.original):
+            ends.extend([index + 1] * len(_canonical[char]))
+
+        runs = []
+        end = 0
+        for n in get_runs(self.translated):
+            end += n
+            runs.append((n, ends[end - 1]))
+
+        return REPEAT_PATTERN.sub('', self.translated), runs
+
+    def _map(self):
+        starts = []
+        ends = []
+        previous = None
+        run = 0
+
+        for index, char in enumerate(self.original):
+            for c in _canonical[char]:
+                if c == previous:
+                    run += 1
+                    if run > 2:
+                        ends[-1] = index + 1
+                        continue
+                else:
+                    previous = c
+                    run = 1
+
+                starts.append(index)
+                ends.append(index + 1)
+
+        self._starts = starts
+        self._ends = ends
+
+
+class NormalisingMatcher(Matcher):
+    """
+    A :class:`Matcher` which finds words in the canonical form of text.
+
+    Matches are reported with the words as they were given, and with the
+    offsets of the original text.
+
+    Parameters
+    ----------
+    name: str
+        The name of the :class:`Matcher` which searches the canonical text.
+    words: Iterable[str]
+        The words to find.
+    """
+
+    def __init__(self, name: str, words: Iterable[str]):
+        super().__init__(words)
+
+        # Words with the same canonical form, such as "book" and "b00k", are
+        # indistinguishable; the last one given is reported.
+        self.originals: Dict[str, str] = {}
+        for word in self.words.values():
+            canonical = canonicalise(word)
+
+            # A word of only invisible characters would match everywhere.
+            if canonical:
+                self.originals[canonical] = word
+
+        self.matcher: Matcher = create_matcher(name, self.originals)
+
+        # The canonical words by their single letter forms, with the lengths
+        # of their runs, for finding words with stretched letters.
+        self.singles: Dict[str, List[Tuple[str, List[int]]]] = {}
+        for canonical in self.originals:
+            self.singles.setdefault(
+                REPEAT_PATTERN.sub('', canonical),
+                []
+            ).append((canonical, get_runs(canonical)))
+
+        self.single_matcher: Matcher = create_matcher(name, self.singles)
+
+    def find(self, text: str) -> List[Match]:
+        normalised = Normalised(text)
+
+        matches = [
+            Match(self.originals[m.word], *normalised.span(m.start, m.end))
+            for m in self.matcher.find(normalised.text)
+        ]
+        if not normalised.stretched:
+            return matches
+
+        single, runs = normalised.single()
+        found = list(matches)
+
+        for m in self.single_matcher.find(single):
+            lengths = [n for n, _ in runs[m.start:m.end]]
+            start = runs[m.start - 1][1] if m.start else 0
+            end = runs[m.end - 1][1]
+
+            # Leading characters which canonicalise to nothing, such as
+            # invisible ones, are not part of the match.
+            while start < end and not _canonical[text[start]]:
+                start += 1
+
+            # Matches must not overlap, and those of the canonical form come
+            # first.
+            if any(f.start < end and start < f.end for f in found):
+                continue
+
+            for canonical, word_runs in self.singles[m.word]:
+                if is_stretched(lengths, word_runs):
+                    matches.append(Match(self.originals[canonical], start, end))
+                    break
+
+        return sorted(matches, key=lambda m: m.start)
@@ -0,0 +1,235 @@
+from enum import Enum
+from typing import Dict, List, NamedTuple, Tuple
+
+import discord
+
+
+class Category(Enum):
+    GENERAL: int = discord.Permissions().general().value
+    TEXT: int = discord.Permissions().text().value
+    VOICE: int = discord.Permissions().voice().value
+
+
+class Flag(NamedTuple):
+    name: str
+    bit: int
+    category: Category
+
+
+def get_bits() -> Dict[str, int]:
+    """
+    Maps the name of every permission to its bit, by setting each flag
+    property of :class:`discord.Permissions` on its own. Aliases, which share
+    the bit of an earlier permission, are left out.
+    """
+    bits = {}
+
+    for name, _ in discord.Permissions.none():
+        permissions = discord.Permissions.none()
+        setattr(permissions, name, True)
+
+        if permissions.value not in bits.values():
+            bits[name] = permissions.value
+
+    return bits
+
+
+def get_flags() -> Tuple[Flag, ...]:
+    """
+    Pairs every permission with its bit and category.
+
+    A permission appears once for each category it belongs to, in the order
+    :class:`discord.Permissions` iterates its permissions.
+    """
+    return tuple(
+        Flag(name, bit, category)
+        for name, bit in BITS.items()
+        for category in Category
+        if category.value & bit
+    )
+
+
+# Permission bits and categories never change, so they are only worked out
+# once.
+BITS: Dict[str, int] = get_bits()
+FLAGS: Tuple[Flag, ...] = get_flags()
+
+ALL: int = discord.Permissions.all().value
+ADMINISTRATOR: int = discord.Permissions(administrator=True).value
+VIEW: int = discord.Permissions(read_messages=True).value
+
+# Permissions which are pointless without being able to see the channel.
+MANAGE: int = discord.Permissions(
+    manage_channels=True,
+    manage_roles=True,
+    manage_messages=True,
+    manage_webhooks=True
+).value
+
+
+class Overwrites(NamedTuple):
+    """The overwrites of a channel as raw bits."""
+    channel_id: int
+    everyone: Tuple[int, int]
+    roles: List[Tuple[int, int, int]]
+    members: List[Tuple[int, int, int]]
+
+
+class GuildSnapshot(NamedTuple):
+    """
+    The parts of a guild needed to compute permissions, as plain values which
+    can be processed away from the event loop.
+    """
+    member_ids: List[int]
+    owner_id: int
+    role_ids: List[int]
+    role_permissions: List[int]
+    memberships: List[Tuple[int, int]]
+    channels: List[Overwrites]
+
+    @classmethod
+    def from_guild(
+        cls,
+        guild: discord.Guild,
+        channels: List[discord.abc.GuildChannel]
+    ) -> 'GuildSnapshot':
+        """
+        Takes a snapshot of the members and roles of `guild` and of the
+        overwrites of `channels`.
+        """
+        roles = guild.roles
+        role_index = {role.id: i for i, role in enumerate(roles)}
+
+        memberships = [
+            (row, role_index[role.id])
+            for row, member in enumerate(guild.members)
+            for role in member.roles
+        ]
+
+        return cls(
+            [member.id for member in guild.members],
+            guild.owner_id,
+            [role.id for role in roles],
+            [role.permissions.value for role in roles],
+            memberships,
+            [cls._get_overwrites(guild, channel) for channel in channels]
+        )
+
+    @staticmethod
+    def _get_overwrites(
+        guild: discord.Guild,
+        channel: discord.abc.GuildChannel
+    ) -> Overwrites:
+        everyone = (0, 0)
+        roles = []
+        members = []
+
+        for target, overwrite in channel.overwrites.items():
+            allow, deny = (p.value for p in overwrite.pair())
+
+            if target.id == guild.default_role.id:
+                everyone = (allow, deny)
+            elif isinstance(target, discord.Role):
+                roles.append((target.id, allow, deny))
+            else:
+                members.append((target.id, allow, deny))
+
+        return Overwrites(channel.id, everyone, roles, members)
+
+
+class Anomaly(NamedTuple):
+    member_id: int
+    channel_id: int
+    permissions: int
+
+
+def find_anomalies(snapshot: GuildSnapshot) -> List[Anomaly]:
+    """
+    Finds members who have permissions in a channel which they cannot use
+    because they cannot see the channel, e.g. managing its messages.
+
+    Effective permissions are computed for all members of a channel at once
+    with array operations, following the same rules as
+    :meth:`discord.abc.GuildChannel.permissions_for` before its implicit
+    denials.
+
+    Parameters
+    ----------
+    snapshot: GuildSnapshot
+        The guild to audit.
+
+    Returns
+    -------
+    List[Anomaly]
+        The anomalies, each with the offending permissions.
+    """
+    import numpy as np
+
+    member_count = len(snapshot.member_ids)
+    role_count = len(snapshot.role_ids)
+
+    has_role = np.zeros((member_count, role_count), dtype=bool)
+    if snapshot.memberships:
+        rows, columns = zip(*snapshot.memberships)
+        has_role[rows, columns] = True
+
+    role_permissions = np.array(snapshot.role_permissions, dtype=np.uint64)
+    role_index = {role_id: i for i, role_id in enumerate(snapshot.role_ids)}
+    member_index = {m: i for i, m in enumerate(snapshot.member_ids)}
+
+    base = np.zeros(member_count, dtype=np.uint64)
+    for column in range(role_count):
+        base[has_role[:, column]] |= role_permissions[column]
+
+    # Administrators and the owner are unaffected by overwrites.
+    exempt = (base & np.uint64(ADMINISTRATOR)) != 0
+    owner = member_index.get(snapshot.owner_id)
+    if owner is not None:
+        exempt[owner] = True
+
+    anomalies = []
+    for channel in snapshot.channels:
+        perms = base.copy()
+
+        allow, deny = channel.everyone
+        perms &= np.uint64(~deny & ALL)
+        perms |= np.uint64(allow)
+
+        role_allow = np.zeros(member_count, dtype=np.uint64)
+        role_deny = np.zeros(member_count, dtype=np.uint64)
+        for role_id, allow, deny in channel.roles:
+            if role_id in role_index:
+                mask = has_role[:, role_index[role_id]]
+                role_allow[mask] |= np.uint64(allow)
+                role_deny[mask] |= np.uint64(deny)
+
+        perms &= ~role_deny
+        perms |= role_allow
+
+        for member_id, allow, deny in channel.members:
+            row = member_index.get(member_id)
+            if row is not None:
+                perms[row] &= np.uint64(~deny & ALL)
+                perms[row] |= np.uint64(allow)
+
+        perms[exempt] = np.uint64(ALL)
+
+        blind = ((perms & np.uint64(VIEW)) == 0) & (
+            (perms & np.uint64(MANAGE)) != 0
+        )
+        for row in np.flatnonzero(blind):
+            anomalies.append(Anomaly(
+                snapshot.member_ids[row],
+                channel.channel_id,
+                int(perms[row] & np.uint64(MANAGE))
+            ))
+
+    return anomalies
+
+
+def get_names(permissions: int) -> List[str]:
+    """Lists the names of the permissions set in `permissions`."""
+    return [
+        name for name, bit in BITS.items()
+        if permissions & bit
+    ]
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+from typing import AsyncIterator, List, Optional, Union
+
+import aiohttp
+import discord
+from discord.ext import commands
+
+from brotherchris.cogs import utils
+
+log: logging.Logger = logging.getLogger(__name__)
+
+# Attempts per message before it is given up on.
+ATTEMPTS = 5
+
+# Seconds to wait before the first retry, doubled for each further retry.
+BACKOFF = 1
+
+
+class RateLimiter:
+    """
+    Spaces out the start of operations so that no more than `rate` start per
+    second.
+    """
+
+    def __init__(self, rate: float):
+        self.interval: float = 1 / rate
+        self._next: float = 0
+
+    async def wait(self):
+        loop = asyncio.get_event_loop()
+        now = loop.time()
+        start = max(now, self._next)
+        self._next = start + self.interval
+
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class ReactionJob:
+    """
+    Adds a reaction to many messages in a channel.
+
+    Message IDs are read from `source` while reactions are being added, and up
+    to `concurrency` reactions are in flight at once. Reactions are started at
+    no more than `rate` per second, which keeps the job within Discord's rate
+    limit for the channel's reaction route rather than relying on retries after
+    being limited.
+
+    A reaction which fails because the connection was lost is retried once the
+    bot is connected again, so the job resumes where it left off after a
+    reconnect. Retries are also spaced out exponentially, so errors which
+    outlast a connection, such as an outage of Discord's API, are waited out.
+
+    Parameters
+    ----------
+    bot: commands.Bot
+        The bot with which to react.
+    channel: discord.TextChannel
+        The channel which contains the messages.
+    emoji: Union[discord.Emoji, str]
+        The emoji with which to react.
+    source: AsyncIterator[int]
+        The IDs of the messages to which to react.
+    concurrency: int
+        The maximum number of reactions in flight.
+    rate: float
+        The maximum number of reactions started per second.
+    connected: asyncio.Event
+        Set while the bot is connected to the gateway.
+    """
+
+    def __init__(
+        self,
+        bot: commands.Bot,
+        channel: discord.TextChannel,
+        emoji: Union[discord.Emoji, str],
+        source: AsyncIterator[int],
+        concurrency: int,
+        rate: float,
+        connected: asyncio.Event
+    ):
+        self.bot: commands.Bot = bot
+        self.channel: discord.TextChannel = channel
+        self.emoji: Union[discord.Emoji, str] = emoji
+        self.source: AsyncIterator[int] = source
+        self.concurrency: int = concurrency
+        self.connected: asyncio.Event = connected
+
+        self.queued: int = 0
+        self.done: int = 0
+        self.failed: int = 0
+        # Messages which were deleted before they could be reacted to.
+        self.skipped: int = 0
+        self.exhausted: bool = False
+        self.cancelled: bool = False
+
+        self._limiter = RateLimiter(rate)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        """
+        Runs the job to completion or until it is cancelled.
+
+        Raises
+        ------
+        asyncio.CancelledError
+            If the job was cancelled with :meth:`cancel`.
+        """
+        self._task = asyncio.current_task()
+
+        workers: List[asyncio.Task] = [
+            asyncio.ensure_future(self._react())
+            for _ in range(self.concurrency)
+        ]
+
+        try:
+            async for message_id in self.source:
+                await self._queue.put(message_id)
+                self.queued += 1
+
+            self.exhausted = True
+            await self._queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    def cancel(self):
+        """Stops the job. Reactions in flight may still be added."""
+        self.cancelled = True
+
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _react(self):
+        while True:
+            message_id = await self._queue.get()
+
+            try:
+                await self._react_to(message_id)
+            except Exception as e:
+                # Keeps the worker alive so the queue continues to drain.
+                self.failed += 1
+                log.error(
+                    f'Reacting to message {message_id} failed.\n'
+                    f'{type(e).__name__}: {e}'
+                )
+            finally:
+                self._queue.task_done()
+
+    async def _react_to(self, message_id: int):
+        for attempt in range(1, ATTEMPTS + 1):
+            await self._limiter.wait()
+
+            try:
+                await utils.add_reaction(
+                    self.bot,
+                    self.channel.id,
+                    message_id,
+                    self.emoji
+                )
+                self.done += 1
+                return
+            except discord.NotFound:
+                # The message was deleted in the meantime.
+                self.skipped += 1
+                return
+            except (aiohttp.ClientError, discord.HTTPException) as e:
+                if isinstance(e, discord.HTTPException) and e.status < 500:
+                    break
+
+                log.warning(
+                    f'Reacting to message {message_id} failed (attempt '
+                    f'{attempt}/{ATTEMPTS}); waiting for the connection.\n'
+                    f'{type(e).__name__}: {e}'
+                )
+
+                if attempt < ATTEMPTS:
+                    await self.connected.wait()
+                    await asyncio.sleep(BACKOFF * 2 ** (attempt - 1))
+
+        self.failed += 1
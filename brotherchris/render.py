@@ -0,0 +1,264 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Dict, NamedTuple, Optional
+
+from brotherchris import logs, metrics
+
+log: logging.Logger = logging.getLogger(__name__)
+
+WAIT_SECONDS = metrics.histogram(
+    'brotherchris_render_wait_seconds',
+    'How long render jobs wait for a free worker.'
+)
+RUN_SECONDS = metrics.histogram(
+    'brotherchris_render_seconds',
+    'How long render jobs take to run in a worker.'
+)
+REJECTED = metrics.counter(
+    'brotherchris_render_rejected_total',
+    'The number of render jobs turned away because the queue was full.'
+)
+
+
+class RenderQueueFull(Exception):
+    """
+    Raised when a job is submitted while the render queue is at capacity.
+    """
+
+
+class Job(NamedTuple):
+    guild_id: int
+    channel_id: int
+    func: Callable
+    args: tuple
+    future: asyncio.Future
+    submitted: float
+
+
+class RenderExecutor:
+    """
+    Runs CPU-bound rendering functions in a pool of worker processes so they do
+    not block the event loop.
+
+    Jobs wait in one queue per guild. Whenever a worker becomes free, the guilds
+    are served in round-robin order, so a single guild cannot monopolise the
+    pool. The total number of waiting jobs is bounded by `queue_size`.
+
+    Parameters
+    ----------
+    workers: int
+        The number of worker processes.
+    queue_size: int
+        The maximum number of jobs which may wait for a free worker.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers: int = workers
+        self.queue_size: int = queue_size
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._queues: Dict[int, Deque[Job]] = OrderedDict()
+        self._pending: int = 0
+        self._running: int = 0
+
+    @property
+    def pending(self) -> int:
+        """The number of jobs waiting for a free worker."""
+        return self._pending
+
+    @property
+    def running(self) -> int:
+        """The number of jobs currently being run by a worker."""
+        return self._running
+
+    def submit(
+        self,
+        guild_id: int,
+        channel_id: int,
+        func: Callable,
+        *args: Any
+    ) -> asyncio.Future:
+        """
+        Queues `func` to be called with `args` in a worker process.
+
+        `func` and `args` must be picklable. Cancelling the returned future
+        removes the job from the queue; if the job is already running, its
+        result is discarded.
+
+        Parameters
+        ----------
+        guild_id: int
+            The ID of the guild on behalf of which the job is run.
+        channel_id: int
+            The ID of the channel in which the job was requested.
+        func: Callable
+            The function to call.
+        *args: Any
+            The arguments with which to call the function.
+
+        Returns
+        -------
+        asyncio.Future
+            A future which resolves to the return value of `func`.
+
+        Raises
+        ------
+        RenderQueueFull
+            If the queue is at capacity.
+        """
+        if self._pending >= self.queue_size:
+            REJECTED.inc()
+            raise RenderQueueFull(
+                f'The render queue is full ({self.queue_size} jobs).'
+            )
+
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        job = Job(guild_id, channel_id, func, args, future, loop.time())
+        future.add_done_callback(lambda f: self._discard(job))
+
+        self._queues.setdefault(guild_id, deque()).append(job)
+        self._pending += 1
+        self._dispatch()
+
+        return future
+
+    def resize(self, workers: int, queue_size: int):
+        """
+        Changes the number of worker processes and the queue capacity.
+
+        Running jobs are allowed to finish in the old worker processes. Jobs
+        already queued beyond the new capacity are kept.
+        """
+        if workers != self.workers and self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+        self.workers = workers
+        self.queue_size = queue_size
+        self._dispatch()
+
+    def cancel(self, guild_id: int, channel_id: int = None):
+        """
+        Cancels all jobs for the given guild, or only those for the given
+        channel if `channel_id` is specified.
+
+        Parameters
+        ----------
+        guild_id: int
+            The ID of the guild for which to cancel jobs.
+        channel_id: int
+            The ID of the channel for which to cancel jobs.
+        """
+        for job in tuple(self._queues.get(guild_id, ())):
+            if channel_id is None or job.channel_id == channel_id:
+                job.future.cancel()
+
+    def shutdown(self):
+        """
+        Cancels all waiting jobs and shuts down the worker processes.
+        """
+        for queue in tuple(self._queues.values()):
+            for job in tuple(queue):
+                job.future.cancel()
+
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def _discard(self, job: Job):
+        """Removes a job which was cancelled before it started running."""
+        queue = self._queues.get(job.guild_id, ())
+
+        # Compares by identity, since equal jobs may be queued more than once.
+        for index, queued in enumerate(queue):
+            if queued is job:
+                del queue[index]
+                break
+        else:
+            return
+
+        self._pending -= 1
+
+        if not queue:
+            del self._queues[job.guild_id]
+
+    def _dispatch(self):
+        """Starts queued jobs, one guild at a time, while workers are free."""
+        loop = asyncio.get_event_loop()
+
+        while self._running < self.workers and self._queues:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=logs.reset
+                )
+
+            guild_id, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            self._pending -= 1
+
+            # Moves the guild to the back of the line.
+            if queue:
+                self._queues.move_to_end(guild_id)
+            else:
+                del self._queues[guild_id]
+
+            pool = self._pool
+            try:
+                result = loop.run_in_executor(pool, job.func, *job.args)
+            except BrokenProcessPool:
+                # Broken by a job which has not finished yet. The job is put
+                # back to be run by a new pool.
+                self._queues.setdefault(guild_id, deque()).appendleft(job)
+                self._queues.move_to_end(guild_id, last=False)
+                self._pending += 1
+                self._replace(pool)
+                continue
+
+            self._running += 1
+            start = loop.time()
+            WAIT_SECONDS.observe(start - job.submitted)
+
+            result.add_done_callback(
+                lambda r, j=job, p=pool, s=start: self._finish(j, r, p, s)
+            )
+
+    def _replace(self, pool: ProcessPoolExecutor):
+        """
+        Shuts down `pool`, which is broken, so that the next job starts a new
+        one. A worker which dies, e.g. of running out of memory, breaks the
+        whole pool.
+        """
+        if pool is self._pool:
+            log.error('A render worker died; starting a new pool.')
+            pool.shutdown(wait=False)
+            self._pool = None
+
+    def _finish(
+        self,
+        job: Job,
+        result: asyncio.Future,
+        pool: ProcessPoolExecutor,
+        start: float
+    ):
+        """Forwards the outcome of a job and starts the next one."""
+        self._running -= 1
+        RUN_SECONDS.observe(asyncio.get_event_loop().time() - start)
+
+        if not result.cancelled() and \
+                isinstance(result.exception(), BrokenProcessPool):
+            self._replace(pool)
+
+        if not job.future.done():
+            if result.cancelled():
+                job.future.cancel()
+            elif result.exception() is not None:
+                job.future.set_exception(result.exception())
+            else:
+                job.future.set_result(result.result())
+
+        self._dispatch()
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import traceback
+from typing import Awaitable, Callable, Dict, FrozenSet, List, NamedTuple, \
+    Optional, Set
+
+import discord
+from discord.ext import commands
+
+from brotherchris import metrics
+
+log: logging.Logger = logging.getLogger(__name__)
+
+HANDLER_SECONDS = metrics.histogram(
+    'brotherchris_message_handler_seconds',
+    'How long message handlers take, by handler.'
+)
+
+Callback = Callable[[discord.Message], Awaitable[None]]
+
+
+class Handler(NamedTuple):
+    """
+    A callback and the messages in which it is interested.
+
+    A handler with neither `guild_ids` nor `channel_ids` is interested in every
+    guild message, and additionally in direct messages if `direct` is True.
+    """
+    callback: Callback
+    guild_ids: Optional[FrozenSet[int]]
+    channel_ids: Optional[FrozenSet[int]]
+    bots: bool
+    commands: bool
+    direct: bool
+
+
+class MessageRouter:
+    """
+    Dispatches each message only to the handlers interested in it.
+
+    Handlers declare up front which guilds or channels they want messages from
+    and whether they want messages from bots, command invocations or direct
+    messages. These are indexed by ID, so a message which no handler is
+    interested in is rejected with hash lookups rather than by every handler in
+    turn.
+
+    Each handler runs in its own task, as event listeners do.
+
+    Parameters
+    ----------
+    bot: commands.Bot
+        The bot whose messages are routed. Used to recognise commands.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot: commands.Bot = bot
+        self._handlers: Dict[Callback, Handler] = {}
+        self._build()
+
+        # The event loop only keeps weak references to tasks, so running
+        # handlers are kept here until they are done.
+        self._tasks: Set[asyncio.Task] = set()
+
+    def register(
+        self,
+        callback: Callback,
+        *,
+        guild_ids: Optional[FrozenSet[int]] = None,
+        channel_ids: Optional[FrozenSet[int]] = None,
+        bots: bool = False,
+        commands: bool = False,
+        direct: bool = False
+    ):
+        """
+        Routes messages to `callback`, replacing its previous registration.
+
+        Parameters
+        ----------
+        callback: Callback
+            The coroutine function to call with each message.
+        guild_ids: Optional[FrozenSet[int]]
+            The IDs of the guilds from which to receive messages.
+        channel_ids: Optional[FrozenSet[int]]
+            The IDs of the channels from which to receive messages.
+        bots: bool
+            Whether to receive messages sent by bots.
+        commands: bool
+            Whether to receive messages which invoke commands.
+        direct: bool
+            Whether to receive direct messages. Ignored if `guild_ids` or
+            `channel_ids` is specified.
+        """
+        self._handlers[callback] = Handler(
+            callback,
+            None if guild_ids is None else frozenset(guild_ids),
+            None if channel_ids is None else frozenset(channel_ids),
+            bots,
+            commands,
+            direct
+        )
+        self._build()
+
+    def unregister(self, callback: Callback):
+        """Stops routing messages to `callback`."""
+        self._handlers.pop(callback, None)
+        self._build()
+
+    def _build(self):
+        """Indexes the handlers by the IDs they are interested in."""
+        self._everywhere: List[Handler] = []
+        self._direct: List[Handler] = []
+        self._guilds: Dict[int, List[Handler]] = {}
+        self._channels: Dict[int, List[Handler]] = {}
+
+        for handler in self._handlers.values():
+            if handler.guild_ids is None and handler.channel_ids is None:
+                self._everywhere.append(handler)
+                if handler.direct:
+                    self._direct.append(handler)
+
+            for guild_id in handler.guild_ids or ():
+                self._guilds.setdefault(guild_id, []).append(handler)
+
+            for channel_id in handler.channel_ids or ():
+                self._channels.setdefault(channel_id, []).append(handler)
+
+        # Guild and channel IDs are both snowflakes, so one set serves as a
+        # prefilter for both.
+        self._ids: FrozenSet[int] = \
+            frozenset(self._guilds) | frozenset(self._channels)
+
+    def get_handlers(self, msg: discord.Message) -> List[Handler]:
+        """
+        Retrieves the handlers interested in `msg` by where it was sent and by
+        whom, without regard to whether it invokes a command.
+        """
+        if msg.guild is None:
+            handlers = self._direct
+        elif self._ids and (
+            msg.guild.id in self._ids or msg.channel.id in self._ids
+        ):
+            # A handler registered for both the guild and the channel must
+            # only receive the message once.
+            handlers = list(dict.fromkeys((
+                *self._everywhere,
+                *self._guilds.get(msg.guild.id, ()),
+                *self._channels.get(msg.channel.id, ())
+            )))
+        else:
+            handlers = self._everywhere
+
+        if msg.author.bot:
+            handlers = [handler for handler in handlers if handler.bots]
+
+        return handlers
+
+    async def dispatch(
+        self,
+        msg: discord.Message,
+        ctx: Optional[commands.Context] = None
+    ):
+        """
+        Classifies `msg` and schedules the handlers interested in it.
+
+        Whether the message invokes a command is only determined if one of the
+        handlers does not want command invocations. Messages by bots never
+        invoke commands, so they are not parsed at all.
+
+        Parameters
+        ----------
+        msg: discord.Message
+            The message to route.
+        ctx: Optional[commands.Context]
+            The context of the message, if the caller already has it, so that
+            the message is not parsed twice.
+        """
+        handlers = self.get_handlers(msg)
+        if not handlers:
+            return
+
+        if not msg.author.bot and \
+                not all(handler.commands for handler in handlers):
+            if ctx is None:
+                ctx = await self.bot.get_context(msg)
+
+            if ctx.valid:
+                handlers = [handler for handler in handlers if handler.commands]
+
+        for handler in handlers:
+            task = asyncio.ensure_future(self._run(handler.callback, msg))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    async def _run(callback: Callback, msg: discord.Message):
+        try:
+            with HANDLER_SECONDS.time(handler=callback.__qualname__):
+                await callback(msg)
+        except Exception as e:
+            log.error(
+                f'{callback.__qualname__} failed to handle message {msg.id}.\n'
+                f'{type(e).__name__}: {e}\n'
+                f'{"".join(traceback.format_tb(e.__traceback__))}'
+            )
@@ -0,0 +1,376 @@
+"""
+Finds the Word Police's words in messages which were sent before they were
+added, and writes a report of every occurrence with counts per word and user.
+
+Messages are matched in chunks by a pool of worker processes, so a scan of an
+archive of millions of messages is bound by reading them rather than by
+matching them. The messages are either retrieved from Discord by the `scan`
+command, or read from an export by running
+
+    python -m brotherchris.scan EXPORT [EXPORT ...] --report REPORT
+
+An export is a JSON Lines file with one message object per line, or a JSON file
+with an array of message objects or an object with a "messages" array, as
+written by DiscordChatExporter. Each message needs "content" and "id", and
+either "author" as an object with "id" and "name" or "author_id".
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterable, Dict, Iterable, Iterator, List, NamedTuple, \
+    Optional, Set, TextIO, Tuple
+
+from brotherchris import logs
+from brotherchris.matching import Matcher, create_matcher
+from brotherchris.normalise import NormalisingMatcher
+
+log: logging.Logger = logging.getLogger(__name__)
+
+# The default number of messages matched by a worker at a time.
+CHUNK_SIZE = 5000
+
+# The matcher of a worker process, created once by init_worker.
+_matcher: Optional[Matcher] = None
+
+
+class ScannedMessage(NamedTuple):
+    id: int
+    channel_id: int
+    author_id: int
+    author: str
+    content: str
+
+
+class Hit(NamedTuple):
+    message_id: int
+    channel_id: int
+    author_id: int
+    word: str
+
+    # The text which matched, which may be a variant of the word.
+    text: str
+
+
+def create_word_matcher(config: Dict) -> Matcher:
+    """
+    Creates the matcher for the words of the WordPolice section `config`.
+    """
+    name = config.get('matcher', 'aho-corasick')
+
+    # Messages are normalised once, ahead of matching, rather than every
+    # variant of a word being listed.
+    if config.get('normalise', True):
+        return NormalisingMatcher(name, config['words'])
+
+    return create_matcher(name, config['words'])
+
+
+def init_worker(config: Dict):
+    global _matcher
+    logs.reset()
+    _matcher = create_word_matcher(config)
+
+
+def scan_chunk(messages: List[Tuple[int, int, int, str]]) -> List[Hit]:
+    """
+    Finds the words in a chunk of messages in a worker process.
+
+    Parameters
+    ----------
+    messages: List[Tuple[int, int, int, str]]
+        The ID, channel ID, author ID and content of each message.
+
+    Returns
+    -------
+    List[Hit]
+        The occurrences of the words, in order.
+    """
+    hits = []
+
+    for message_id, channel_id, author_id, content in messages:
+        for match in _matcher.find(content):
+            hits.append(Hit(
+                message_id,
+                channel_id,
+                author_id,
+                match.word,
+                content[match.start:match.end]
+            ))
+
+    return hits
+
+
+class Report:
+    """
+    Writes each occurrence to a JSON Lines file as it is found, followed by a
+    summary once the scan is done.
+
+    Parameters
+    ----------
+    file: TextIO
+        The file to which to write.
+    """
+
+    def __init__(self, file: TextIO):
+        self.file: TextIO = file
+        self.messages: int = 0
+        self.words: Counter = Counter()
+        self.users: Counter = Counter()
+        self.user_words: Dict[int, Counter] = defaultdict(Counter)
+        self.names: Dict[int, str] = {}
+        self.started: float = time.perf_counter()
+
+    def add(self, hits: List[Hit]):
+        for hit in hits:
+            self.file.write(json.dumps(
+                {
+                    'type': 'hit',
+                    'message_id': hit.message_id,
+                    'channel_id': hit.channel_id,
+                    'author_id': hit.author_id,
+                    'author': self.names.get(hit.author_id),
+                    'word': hit.word,
+                    'text': hit.text
+                },
+                ensure_ascii=False
+            ) + '\n')
+
+            self.words[hit.word] += 1
+            self.users[hit.author_id] += 1
+            self.user_words[hit.author_id][hit.word] += 1
+
+    def summarise(self) -> Dict:
+        return {
+            'type': 'summary',
+            'messages': self.messages,
+            'hits': sum(self.words.values()),
+            'seconds': round(time.perf_counter() - self.started, 3),
+            'words': dict(self.words.most_common()),
+            'users': [
+                {
+                    'id': user_id,
+                    'name': self.names.get(user_id),
+                    'hits': n,
+                    'words': dict(self.user_words[user_id].most_common())
+                }
+                for user_id, n in self.users.most_common()
+            ]
+        }
+
+    def finish(self) -> Dict:
+        """Writes the summary and returns it."""
+        summary = self.summarise()
+        self.file.write(json.dumps(summary, ensure_ascii=False) + '\n')
+        self.file.flush()
+
+        return summary
+
+
+class Scanner:
+    """
+    Matches messages against the Word Police's words in worker processes.
+
+    Parameters
+    ----------
+    config: Dict
+        The WordPolice section of the configuration.
+    workers: Optional[int]
+        The number of worker processes. If None, one per CPU.
+    chunk_size: int
+        The number of messages sent to a worker at a time.
+    """
+
+    def __init__(
+        self,
+        config: Dict,
+        workers: Optional[int] = None,
+        chunk_size: int = CHUNK_SIZE
+    ):
+        self.workers: int = workers or os.cpu_count() or 1
+        self.chunk_size: int = chunk_size
+        self.executor = ProcessPoolExecutor(
+            self.workers,
+            initializer=init_worker,
+            initargs=(config,)
+        )
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+    async def scan(
+        self,
+        messages: AsyncIterable[ScannedMessage],
+        report: Report
+    ):
+        """
+        Matches `messages` and adds the occurrences to `report` as chunks are
+        done, in the order they are done.
+
+        Only a few chunks per worker are queued at a time, so memory does not
+        grow with the number of messages, and reading messages overlaps with
+        matching them.
+        """
+        loop = asyncio.get_event_loop()
+        pending: Set[asyncio.Future] = set()
+        chunk = []
+
+        async def drain(limit: int):
+            nonlocal pending
+            while len(pending) > limit:
+                done, pending = await asyncio.wait(
+                    pending,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                # Written in the default executor, so a slow disk does not
+                # block the event loop. One chunk is written at a time.
+                for future in done:
+                    await loop.run_in_executor(
+                        None,
+                        report.add,
+                        future.result()
+                    )
+
+        def submit():
+            pending.add(loop.run_in_executor(
+                self.executor,
+                scan_chunk,
+                chunk
+            ))
+
+        async for msg in messages:
+            report.messages += 1
+            report.names[msg.author_id] = msg.author
+            chunk.append((msg.id, msg.channel_id, msg.author_id, msg.content))
+
+            if len(chunk) >= self.chunk_size:
+                submit()
+                chunk = []
+                await drain(self.workers * 2)
+
+        if chunk:
+            submit()
+
+        await drain(0)
+
+
+def parse_message(obj: Dict, channel_id: int = 0) -> ScannedMessage:
+    """
+    Converts a message object of an export.
+
+    Raises
+    ------
+    KeyError
+        If a required field is missing.
+    """
+    author = obj.get('author')
+    if isinstance(author, dict):
+        author_id = int(author['id'])
+        name = author.get('name', str(author_id))
+    else:
+        author_id = int(obj['author_id'])
+        name = author if isinstance(author, str) else str(author_id)
+
+    return ScannedMessage(
+        int(obj['id']),
+        int(obj.get('channel_id', channel_id)),
+        author_id,
+        name,
+        obj['content'] or ''
+    )
+
+
+def read_export(path: str) -> Iterator[ScannedMessage]:
+    """
+    Reads the messages of an export. JSON Lines files are read one line at a
+    time; JSON files are read whole.
+    """
+    with open(path, encoding='utf-8') as file:
+        if path.endswith('.jsonl'):
+            for line in file:
+                if line.strip():
+                    yield parse_message(json.loads(line))
+            return
+
+        data = json.load(file)
+
+    channel_id = 0
+    if isinstance(data, dict):
+        channel_id = int(data.get('channel', {}).get('id', 0))
+        data = data['messages']
+
+    for obj in data:
+        yield parse_message(obj, channel_id)
+
+
+async def iterate(messages: Iterable[ScannedMessage]):
+    for msg in messages:
+        yield msg
+
+
+def read_exports(paths: Iterable[str]) -> Iterator[ScannedMessage]:
+    for path in paths:
+        log.info(f'Reading {path}.')
+        yield from read_export(path)
+
+
+def main():
+    from brotherchris.config import configuration
+
+    logs.configure(
+        configuration['Logging'] if 'Logging' in configuration else {}
+    )
+
+    parser = argparse.ArgumentParser(
+        prog='python -m brotherchris.scan',
+        description='Finds the Word Police\'s words in exported messages.'
+    )
+    parser.add_argument('exports', nargs='+', help='JSON or JSON Lines files')
+    parser.add_argument(
+        '--report',
+        default='scan.jsonl',
+        help='the JSON Lines file to which to write the report'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='the number of worker processes; by default, one per CPU'
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=CHUNK_SIZE,
+        help='the number of messages matched by a worker at a time'
+    )
+    args = parser.parse_args()
+
+    scanner = Scanner(
+        configuration['WordPolice'],
+        args.workers,
+        args.chunk_size
+    )
+
+    try:
+        with open(args.report, 'w', encoding='utf-8') as file:
+            report = Report(file)
+            asyncio.get_event_loop().run_until_complete(
+                scanner.scan(iterate(read_exports(args.exports)), report)
+            )
+            summary = report.finish()
+    finally:
+        scanner.shutdown()
+
+    log.info(
+        f'Found {summary["hits"]} occurrences in {summary["messages"]} '
+        f'messages in {summary["seconds"]:.1f}s; wrote {args.report}.'
+    )
+    for word, n in list(summary['words'].items())[:10]:
+        log.info(f'{word}: {n}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,505 @@
+import asyncio
+import logging
+import sqlite3
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+)
+
+import discord
+
+from brotherchris import tokens
+
+log: logging.Logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS messages (
+    channel_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    guild_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (channel_id, id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS messages_author
+    ON messages (channel_id, author_id, id);
+
+CREATE TABLE IF NOT EXISTS word_counts (
+    channel_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    word TEXT NOT NULL,
+    guild_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (channel_id, author_id, day, word)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS channels (
+    id INTEGER PRIMARY KEY,
+    newest_id INTEGER NOT NULL,
+    oldest_id INTEGER NOT NULL,
+    complete INTEGER NOT NULL DEFAULT 0
+);
+'''
+
+# The number of messages Discord returns per history request.
+PAGE_SIZE = 100
+
+# Incremented whenever the schema changes in a way that needs a migration.
+SCHEMA_VERSION = 2
+
+# Milliseconds between the Unix epoch and the Discord epoch of snowflake IDs.
+DISCORD_EPOCH = 1420070400000
+DAY = 86400000
+
+
+def get_day(snowflake: int) -> int:
+    """Returns the number of days since the Unix epoch of a snowflake."""
+    return ((snowflake >> 22) + DISCORD_EPOCH) // DAY
+
+
+def get_snowflake(day: int) -> int:
+    """Returns the lowest snowflake of the day since the Unix epoch."""
+    return (day * DAY - DISCORD_EPOCH) << 22
+
+
+class StoredMessage(NamedTuple):
+    id: int
+    channel_id: int
+    guild_id: int
+    author_id: int
+    content: str
+
+    @classmethod
+    def from_message(cls, msg: discord.Message) -> 'StoredMessage':
+        return cls(
+            msg.id,
+            msg.channel.id,
+            msg.guild.id,
+            msg.author.id,
+            msg.content
+        )
+
+
+class ChannelState(NamedTuple):
+    newest_id: int
+    oldest_id: int
+    complete: bool
+
+
+class MessageStore:
+    """
+    A local SQLite copy of channel histories, keyed by channel and message ID.
+
+    Alongside the messages, the store maintains a word frequency index per
+    channel and author, rolled up by day. It allows word clouds to be built from
+    counts rather than from the raw text of every message.
+
+    The store is kept current by feeding it gateway events. Gaps, such as
+    messages sent while the bot was offline, are filled lazily from the API
+    when a channel is next queried. Only the ends of the stored range are ever
+    fetched; the middle is never re-downloaded.
+
+    All database access happens on a single background thread so queries never
+    block the event loop.
+
+    Parameters
+    ----------
+    path: str
+        The path of the SQLite database file.
+    """
+
+    def __init__(self, path: str):
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._migrate()
+
+        # Channels whose stored range is known to extend up to the present,
+        # i.e. no gateway events have been missed since they were synced.
+        self._live: Set[int] = set()
+
+    def _migrate(self):
+        version = self._db.execute('PRAGMA user_version').fetchone()[0]
+
+        with self._db:
+            # Version 1 added the word frequency index. Version 2 strips
+            # mentions, URLs and custom emojis before counting words.
+            if version < 2:
+                log.info('Indexing the words of stored messages.')
+                self._db.execute('DELETE FROM word_counts')
+                rows = self._db.execute(
+                    'SELECT id, channel_id, guild_id, author_id, content '
+                    'FROM messages'
+                )
+                for row in rows.fetchall():
+                    msg = StoredMessage(*row)
+                    self._index(msg, msg.content, 1)
+
+            self._db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    async def _run(self, func: Callable, *args: Any) -> Any:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._db.close()
+
+    def reset(self):
+        """
+        Marks all channels as possibly out of date.
+
+        Should be called when the gateway connection is lost, since events may
+        be missed until the next sync.
+        """
+        self._live.clear()
+
+    async def add(self, msg: discord.Message):
+        """Stores a newly created message."""
+        await self._run(
+            self._add,
+            [StoredMessage.from_message(msg)],
+            msg.channel.id in self._live
+        )
+
+    async def edit(self, channel_id: int, message_id: int, content: str):
+        """Updates the content of a stored message, if it is stored."""
+        await self._run(self._edit, channel_id, message_id, content)
+
+    async def delete(self, channel_id: int, message_ids: Iterable[int]):
+        """Removes messages from the store."""
+        await self._run(self._delete, channel_id, list(message_ids))
+
+    async def messages(
+        self,
+        channel: discord.TextChannel,
+        limit: int,
+        author_id: int = None
+    ) -> List[StoredMessage]:
+        """
+        Retrieves up to `limit` of the most recent messages in `channel`,
+        newest first, optionally only those sent by the given author.
+
+        As when reading from the API, at least the 1000 most recent messages
+        of the channel are searched.
+
+        Parameters
+        ----------
+        channel: discord.TextChannel
+            The channel from which to retrieve messages.
+        limit: int
+            The maximum number of messages to retrieve.
+        author_id: int
+            If specified, only messages by the author with this ID are returned.
+
+        Returns
+        -------
+        List[StoredMessage]
+            The messages, newest first.
+        """
+        scan = max(limit, 1000)
+        await self.sync(channel, scan)
+        return await self._run(
+            self._query,
+            channel.id,
+            scan,
+            limit,
+            author_id
+        )
+
+    async def frequencies(
+        self,
+        channel: discord.TextChannel,
+        limit: int,
+        author_id: int
+    ) -> Tuple[Dict[str, int], Optional[int]]:
+        """
+        Counts the words of the same messages :meth:`messages` would retrieve
+        for the given author.
+
+        Only the messages sent on the day of the oldest retrieved message are
+        tokenized; the counts of all later days come from the index.
+
+        Parameters
+        ----------
+        channel: discord.TextChannel
+            The channel from which to count words.
+        limit: int
+            The maximum number of messages from which to count words.
+        author_id: int
+            The ID of the author whose words to count.
+
+        Returns
+        -------
+        Tuple[Dict[str, int], Optional[int]]
+            The number of occurrences of each word, folded by
+            :func:`tokens.fold`, and the ID of the newest counted message, or
+            None if there are no messages.
+        """
+        scan = max(limit, 1000)
+        await self.sync(channel, scan)
+        counts, newest = await self._run(
+            self._count_words,
+            channel.id,
+            scan,
+            limit,
+            author_id
+        )
+
+        return tokens.fold(counts), newest
+
+    async def sync(self, channel: discord.TextChannel, depth: int):
+        """
+        Ensures the store holds every message sent to `channel` since the
+        previous sync, and at least `depth` messages in total unless the
+        channel has fewer.
+
+        Parameters
+        ----------
+        channel: discord.TextChannel
+            The channel to synchronise.
+        depth: int
+            The minimum number of most recent messages to hold.
+        """
+        state = await self._run(self._get_state, channel.id)
+
+        if state is None:
+            await self._fetch(channel, channel.history(limit=depth), depth)
+        else:
+            if channel.id not in self._live:
+                history = channel.history(
+                    limit=None,
+                    after=discord.Object(state.newest_id),
+                    oldest_first=True
+                )
+                await self._fetch(channel, history)
+
+            count = await self._run(self._count, channel.id)
+            if count < depth and not state.complete:
+                history = channel.history(
+                    limit=depth - count,
+                    before=discord.Object(state.oldest_id)
+                )
+                await self._fetch(channel, history, depth - count)
+
+        self._live.add(channel.id)
+
+    async def _fetch(
+        self,
+        channel: discord.TextChannel,
+        history: discord.iterators.HistoryIterator,
+        limit: int = None
+    ):
+        """
+        Stores the messages produced by `history`, one page at a time.
+
+        If `limit` is specified and `history` produces fewer messages, the
+        beginning of the channel has been reached.
+        """
+        page: List[StoredMessage] = []
+        fetched = 0
+
+        async for msg in history:
+            page.append(StoredMessage.from_message(msg))
+
+            if len(page) == PAGE_SIZE:
+                await self._run(self._add, page, True)
+                fetched += len(page)
+                page = []
+
+        fetched += len(page)
+        await self._run(self._add, page, True)
+
+        if limit is not None and fetched < limit:
+            await self._run(self._mark_complete, channel.id)
+
+        log.info(
+            f'Fetched {fetched} messages from {channel.guild.name} '
+            f'#{channel.name} into the message store.'
+        )
+
+    def _get_state(self, channel_id: int) -> Optional[ChannelState]:
+        row = self._db.execute(
+            'SELECT newest_id, oldest_id, complete FROM channels WHERE id = ?',
+            (channel_id,)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        newest_id, oldest_id, complete = row
+        return ChannelState(newest_id, oldest_id, bool(complete))
+
+    def _count(self, channel_id: int) -> int:
+        return self._db.execute(
+            'SELECT COUNT(*) FROM messages WHERE channel_id = ?',
+            (channel_id,)
+        ).fetchone()[0]
+
+    def _add(self, msgs: List[StoredMessage], extend: bool):
+        """
+        Inserts messages and, if `extend` is True, widens the channel's stored
+        range to include them.
+        """
+        if not msgs:
+            return
+
+        with self._db:
+            for msg in msgs:
+                cursor = self._db.execute(
+                    'INSERT OR IGNORE INTO messages '
+                    '(id, channel_id, guild_id, author_id, content) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    msg
+                )
+
+                # Messages which are already stored have already been counted.
+                if cursor.rowcount:
+                    self._index(msg, msg.content, 1)
+
+            if extend:
+                ids = [m.id for m in msgs]
+                self._db.execute(
+                    'INSERT INTO channels (id, newest_id, oldest_id) '
+                    'VALUES (?, ?, ?) '
+                    'ON CONFLICT (id) DO UPDATE SET '
+                    'newest_id = max(newest_id, excluded.newest_id), '
+                    'oldest_id = min(oldest_id, excluded.oldest_id)',
+                    (msgs[0].channel_id, max(ids), min(ids))
+                )
+
+    def _index(self, msg: StoredMessage, content: str, sign: int):
+        """
+        Adds the words of `content` to, or if `sign` is -1 subtracts them from,
+        the word counts of the message's author and day.
+        """
+        rows = [
+            (msg.channel_id, msg.author_id, get_day(msg.id), word,
+             msg.guild_id, sign * n)
+            for word, n in Counter(tokens.tokenize(content)).items()
+        ]
+
+        self._db.executemany(
+            'INSERT INTO word_counts '
+            '(channel_id, author_id, day, word, guild_id, count) '
+            'VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (channel_id, author_id, day, word) DO UPDATE SET '
+            'count = count + excluded.count',
+            rows
+        )
+
+        if sign < 0:
+            self._db.execute(
+                'DELETE FROM word_counts '
+                'WHERE channel_id = ? AND author_id = ? AND day = ? '
+                'AND count <= 0',
+                (msg.channel_id, msg.author_id, get_day(msg.id))
+            )
+
+    def _get(self, channel_id: int, message_id: int) -> Optional[StoredMessage]:
+        row = self._db.execute(
+            'SELECT id, channel_id, guild_id, author_id, content FROM messages '
+            'WHERE channel_id = ? AND id = ?',
+            (channel_id, message_id)
+        ).fetchone()
+
+        return None if row is None else StoredMessage(*row)
+
+    def _mark_complete(self, channel_id: int):
+        with self._db:
+            self._db.execute(
+                'UPDATE channels SET complete = 1 WHERE id = ?',
+                (channel_id,)
+            )
+
+    def _edit(self, channel_id: int, message_id: int, content: str):
+        with self._db:
+            msg = self._get(channel_id, message_id)
+            if msg is None:
+                return
+
+            self._index(msg, msg.content, -1)
+            self._index(msg, content, 1)
+            self._db.execute(
+                'UPDATE messages SET content = ? '
+                'WHERE channel_id = ? AND id = ?',
+                (content, channel_id, message_id)
+            )
+
+    def _delete(self, channel_id: int, message_ids: List[int]):
+        with self._db:
+            for message_id in message_ids:
+                msg = self._get(channel_id, message_id)
+                if msg is None:
+                    continue
+
+                self._index(msg, msg.content, -1)
+                self._db.execute(
+                    'DELETE FROM messages WHERE channel_id = ? AND id = ?',
+                    (channel_id, message_id)
+                )
+
+    def _query(
+        self,
+        channel_id: int,
+        scan: int,
+        limit: int,
+        author_id: Optional[int]
+    ) -> List[StoredMessage]:
+        # Selects from the `scan` most recent messages of the channel.
+        rows = self._db.execute(
+            'SELECT id, channel_id, guild_id, author_id, content FROM ('
+            '    SELECT * FROM messages WHERE channel_id = ?'
+            '    ORDER BY id DESC LIMIT ?'
+            ') WHERE ? IS NULL OR author_id = ? '
+            'ORDER BY id DESC LIMIT ?',
+            (channel_id, scan, author_id, author_id, limit)
+        )
+
+        return [StoredMessage(*row) for row in rows]
+
+    def _count_words(
+        self,
+        channel_id: int,
+        scan: int,
+        limit: int,
+        author_id: int
+    ) -> Tuple[Counter, Optional[int]]:
+        oldest, newest = self._db.execute(
+            'SELECT MIN(id), MAX(id) FROM ('
+            '    SELECT id FROM ('
+            '        SELECT id, author_id FROM messages WHERE channel_id = ?'
+            '        ORDER BY id DESC LIMIT ?'
+            '    ) WHERE author_id = ? ORDER BY id DESC LIMIT ?'
+            ')',
+            (channel_id, scan, author_id, limit)
+        ).fetchone()
+
+        if oldest is None:
+            return Counter(), None
+
+        # The selected messages are exactly the author's messages from the
+        # oldest one onwards. Only the oldest one's day may be partially
+        # covered, so just that day is counted from the messages themselves.
+        first_day = get_day(oldest)
+        rows = self._db.execute(
+            'SELECT content FROM messages '
+            'WHERE channel_id = ? AND author_id = ? AND id >= ? AND id < ?',
+            (channel_id, author_id, oldest, get_snowflake(first_day + 1))
+        )
+        counts = tokens.count(content for content, in rows)
+
+        rows = self._db.execute(
+            'SELECT word, SUM(count) FROM word_counts '
+            'WHERE channel_id = ? AND author_id = ? AND day > ? '
+            'GROUP BY word',
+            (channel_id, author_id, first_day)
+        )
+
+        for word, n in rows:
+            counts[word] += n
+
+        return counts, newest
@@ -0,0 +1,165 @@
+import importlib.util
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional
+
+# The same word pattern the wordcloud library uses.
+WORD_PATTERN = re.compile(r"\w[\w']+")
+
+# Markup which Discord renders as something other than the words it contains:
+# user, role and channel mentions, custom emojis, and URLs.
+MARKUP_PATTERN = re.compile(
+    r'<(?:@[!&]?|#)\d+>'
+    r'|<a?:\w+:\d+>'
+    r'|@(?:everyone|here)\b'
+    r'|\b(?:https?|ftp)://\S+'
+)
+
+_stopwords: Optional[FrozenSet[str]] = None
+
+
+def get_stopwords() -> FrozenSet[str]:
+    """
+    Retrieves the stopwords of the wordcloud library.
+
+    They are read from the library's data file rather than imported, since
+    importing wordcloud also imports NumPy, PIL and matplotlib.
+    """
+    global _stopwords
+
+    if _stopwords is None:
+        try:
+            spec = importlib.util.find_spec('wordcloud')
+            path = os.path.join(spec.submodule_search_locations[0], 'stopwords')
+            with open(path) as file:
+                _stopwords = frozenset(map(str.strip, file))
+        except (AttributeError, TypeError, ValueError, OSError):
+            # The data file is not where it used to be.
+            from wordcloud import STOPWORDS
+            _stopwords = frozenset(STOPWORDS)
+
+    return _stopwords
+
+
+def clean(text: str) -> str:
+    """
+    Normalises compatibility characters, such as full-width letters and
+    ligatures, and removes markup which is not part of the text's words.
+    """
+    text = unicodedata.normalize('NFKC', text)
+    return MARKUP_PATTERN.sub(' ', text)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits `text` into the words which would appear in its word cloud.
+
+    The text is first cleaned by :func:`clean`. Then, mirroring the processing
+    :meth:`wordcloud.WordCloud.process_text` does before counting, stopwords
+    and numbers are removed and possessive "'s" is stripped. The case of each
+    word is preserved; see :func:`fold`.
+
+    Parameters
+    ----------
+    text: str
+        The text to tokenize.
+
+    Returns
+    -------
+    List[str]
+        The words in order of appearance.
+    """
+    stopwords = get_stopwords()
+    words = []
+
+    for word in WORD_PATTERN.findall(clean(text)):
+        if word.lower().endswith("'s"):
+            word = word[:-2]
+
+        if word.lower() not in stopwords and not word.isdigit():
+            words.append(word)
+
+    return words
+
+
+def count(texts: Iterable[str]) -> Counter:
+    """Counts the words of every text in `texts`."""
+    counts = Counter()
+
+    for text in texts:
+        counts.update(tokenize(text))
+
+    return counts
+
+
+class BoundedCounter:
+    """
+    Counts words while holding at most `capacity` distinct words.
+
+    Whenever the capacity is exceeded, only the most common half of the words
+    are kept. The counts are therefore approximate, but the words common
+    enough to appear in a word cloud survive, and memory does not grow with
+    the amount of text counted.
+
+    Parameters
+    ----------
+    capacity: int
+        The maximum number of distinct words to hold.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity: int = capacity
+        self.counts: Counter = Counter()
+
+        # The number of times words were dropped, for diagnostics.
+        self.prunes: int = 0
+
+    def update(self, words: Iterable[str]):
+        self.counts.update(words)
+
+        if len(self.counts) > self.capacity:
+            self.counts = Counter(
+                dict(self.counts.most_common(self.capacity // 2))
+            )
+            self.prunes += 1
+
+
+def fold(counts: Mapping[str, int]) -> Dict[str, int]:
+    """
+    Merges the counts of words which differ only in case or by a plural "s".
+
+    Each group of case variants is represented by its most common variant. A
+    plural is merged into its singular if the singular also occurs. This is
+    the normalisation the wordcloud library applies to raw text.
+
+    Parameters
+    ----------
+    counts: Mapping[str, int]
+        Word counts as produced by :func:`count`.
+
+    Returns
+    -------
+    Dict[str, int]
+        The folded counts.
+    """
+    variants: Dict[str, Dict[str, int]] = defaultdict(dict)
+    for word, n in counts.items():
+        variants[word.lower()][word] = n
+
+    folded: Dict[str, int] = {}
+    for key, cases in variants.items():
+        folded[key] = sum(cases.values())
+
+    merged: Dict[str, int] = {}
+    for key, n in folded.items():
+        if key.endswith('s') and not key.endswith('ss') and key[:-1] in folded:
+            key = key[:-1]
+
+        merged[key] = merged.get(key, 0) + n
+
+    return {
+        max(variants[key].items(), key=lambda item: item[1])[0]: n
+        for key, n in merged.items()
+    }
@@ -0,0 +1,96 @@
+"""
+Recognises Unicode emojis by looking them up in a set of known emojis.
+
+The set is built on first use, either from a table generated beforehand with
+
+    python -m brotherchris.unicode_emoji
+
+or, if there is no table for the installed version of the emoji package, from
+the package itself.
+"""
+import logging
+import os
+from typing import FrozenSet, Optional
+
+log: logging.Logger = logging.getLogger(__name__)
+
+TABLE_PATH = os.path.join(os.path.dirname(__file__), 'unicode_emoji.txt')
+
+# Variation selector 16 requests emoji presentation. It is optional in
+# practice, so it is ignored when comparing.
+VARIATION_SELECTOR = '\ufe0f'
+
+_emojis: Optional[FrozenSet[str]] = None
+
+
+def normalise(string: str) -> str:
+    """Removes characters which do not affect which emoji a string is."""
+    return string.replace(' ', '').replace(VARIATION_SELECTOR, '')
+
+
+def is_emoji(string: str) -> bool:
+    """
+    Determines whether `string` is exactly one Unicode emoji.
+
+    Parameters
+    ----------
+    string: str
+        The string to check.
+
+    Returns
+    -------
+    bool
+        True if `string` is a Unicode emoji.
+    """
+    return normalise(string) in get_emojis()
+
+
+def get_emojis() -> FrozenSet[str]:
+    """Retrieves the set of normalised emojis, building it if necessary."""
+    global _emojis
+
+    if _emojis is None:
+        _emojis = _load_table() or _build()
+
+    return _emojis
+
+
+def _get_version() -> str:
+    import emoji
+    return emoji.__version__
+
+
+def _build() -> FrozenSet[str]:
+    from emoji import unicode_codes
+    return frozenset(map(normalise, unicode_codes.EMOJI_UNICODE.values()))
+
+
+def _load_table() -> Optional[FrozenSet[str]]:
+    """
+    Reads the table written by :func:`write_table`, unless it is missing or
+    was generated from a different version of the emoji package.
+    """
+    try:
+        with open(TABLE_PATH, encoding='utf-8') as file:
+            version, *emojis = file.read().split('\n')
+    except OSError:
+        return None
+
+    if version != _get_version():
+        log.warning(
+            f'Ignoring {TABLE_PATH}: it was generated for emoji {version} but '
+            f'{_get_version()} is installed.'
+        )
+        return None
+
+    return frozenset(emojis)
+
+
+def write_table():
+    """Writes the normalised emojis to the table file, one per line."""
+    with open(TABLE_PATH, 'w', encoding='utf-8') as file:
+        file.write('\n'.join((_get_version(), *sorted(_build()))))
+
+
+if __name__ == '__main__':
+    write_table()